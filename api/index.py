@@ -7,6 +7,7 @@ from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, File, Up
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 from mangum import Mangum
 import os
 import logging
@@ -20,8 +21,12 @@ from passlib.context import CryptContext
 import pyotp
 import io
 import base64
+import hashlib
 import qrcode
+import asyncio
 from enum import Enum
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -34,6 +39,7 @@ db_name = os.environ.get('DB_NAME', 'safespace_db')
 # Create MongoDB client with connection pooling for serverless
 client = AsyncIOMotorClient(
     mongo_url,
+    tz_aware=True,
     maxPoolSize=10,
     minPoolSize=1,
     maxIdleTimeMS=45000,
@@ -47,6 +53,14 @@ security = HTTPBearer()
 JWT_SECRET = os.environ.get('JWT_SECRET', 'safespace-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION = 24  # hours
+TOTP_REPLAY_WINDOW = 90  # seconds; covers the current TOTP step plus clock drift
+
+# Emergency contacts
+MAX_EMERGENCY_CONTACTS = int(os.environ.get('MAX_EMERGENCY_CONTACTS', '10'))
+
+# Evidence encryption (same keys as the backend; unset stores evidence unencrypted)
+EVIDENCE_MASTER_KEY = os.environ.get('EVIDENCE_MASTER_KEY', '')
+EVIDENCE_OLD_MASTER_KEYS = [key for key in os.environ.get('EVIDENCE_OLD_MASTER_KEYS', '').split(',') if key.strip()]
 
 # Create the main app
 app = FastAPI(title="SafeSpace API", version="1.0.0")
@@ -119,6 +133,9 @@ class EmergencyContact(BaseModel):
     email: Optional[EmailStr] = None
     relationship: str
 
+class EmergencyContactList(BaseModel):
+    contacts: List[EmergencyContact] = Field(..., max_length=MAX_EMERGENCY_CONTACTS)
+
 class SOSAlert(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -211,7 +228,58 @@ def create_access_token(user_id: str, role: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+class UserLoader:
+    """Request-scoped user lookups. Loads requested in the same event-loop tick are
+    batched into one `$in` query, and every result is memoized for the rest of the request."""
+
+    projection = {"_id": 0, "password_hash": 0, "totp_secret": 0}
+
+    def __init__(self, database):
+        self.db = database
+        self._cache = {}
+        self._pending = {}
+
+    async def load(self, user_id: str) -> Optional[dict]:
+        users = await self.load_many([user_id])
+        return users.get(user_id)
+
+    async def load_many(self, user_ids) -> dict:
+        loop = asyncio.get_running_loop()
+        waiting = []
+        for user_id in set(user_ids):
+            if user_id in self._cache:
+                continue
+            if user_id not in self._pending:
+                if not self._pending:
+                    loop.create_task(self._dispatch())
+                self._pending[user_id] = loop.create_future()
+            waiting.append(self._pending[user_id])
+        if waiting:
+            await asyncio.gather(*waiting)
+        return {user_id: self._cache[user_id] for user_id in user_ids if self._cache.get(user_id)}
+
+    async def _dispatch(self):
+        batch, self._pending = self._pending, {}
+        try:
+            users = await self.db.users.find({"id": {"$in": list(batch)}}, self.projection).to_list(None)
+        except Exception as exc:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        found = {user["id"]: user for user in users}
+        for user_id, future in batch.items():
+            self._cache[user_id] = found.get(user_id)
+            if not future.done():
+                future.set_result(None)
+
+def get_user_loader() -> UserLoader:
+    return UserLoader(db)
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    loader: UserLoader = Depends(get_user_loader)
+) -> dict:
     try:
         token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
@@ -221,7 +289,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         if not user_id:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
         
-        user = await db.users.find_one({"id": user_id})
+        user = await loader.load(user_id)
         if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
         
@@ -242,6 +310,91 @@ def serialize_doc(doc):
         doc.pop("_id")
     return doc
 
+# Evidence encryption: each file gets its own AES-256-GCM data key, wrapped by the master key
+def master_key_id(key: bytes) -> str:
+    return hashlib.sha256(key).hexdigest()[:16]
+
+def load_master_keys() -> dict:
+    keys = {}
+    for encoded in filter(None, [EVIDENCE_MASTER_KEY, *EVIDENCE_OLD_MASTER_KEYS]):
+        key = base64.b64decode(encoded)
+        if len(key) != 32:
+            raise RuntimeError("Evidence master keys must be 32 random bytes, base64-encoded")
+        keys[master_key_id(key)] = AESGCM(key)
+    return keys
+
+evidence_master_keys = load_master_keys()
+evidence_key_id = master_key_id(base64.b64decode(EVIDENCE_MASTER_KEY)) if EVIDENCE_MASTER_KEY else None
+
+def seal_evidence(file_id: str, contents: bytes) -> dict:
+    """Fields for an evidence entry; the file id is bound in as associated data so blobs cannot be swapped."""
+    if not evidence_key_id:
+        return {"data": base64.b64encode(contents).decode()}
+    data_key = AESGCM.generate_key(bit_length=256)
+    wrap_nonce, nonce = os.urandom(12), os.urandom(12)
+    wrapped = evidence_master_keys[evidence_key_id].encrypt(wrap_nonce, data_key, file_id.encode())
+    return {
+        "data": base64.b64encode(AESGCM(data_key).encrypt(nonce, contents, file_id.encode())).decode(),
+        "encryption": {
+            "key_id": evidence_key_id,
+            "wrap_nonce": base64.b64encode(wrap_nonce).decode(),
+            "wrapped_key": base64.b64encode(wrapped).decode(),
+            "nonce": base64.b64encode(nonce).decode(),
+        },
+    }
+
+def open_evidence(entry: dict) -> dict:
+    """Return the entry with its data decrypted back to base64; unencrypted entries pass through."""
+    envelope = entry.get("encryption")
+    if not envelope:
+        return entry
+    opened = {key: value for key, value in entry.items() if key != "encryption"}
+    master = evidence_master_keys.get(envelope.get("key_id"))
+    try:
+        if not master:
+            raise InvalidTag()
+        aad = entry["id"].encode()
+        data_key = master.decrypt(base64.b64decode(envelope["wrap_nonce"]), base64.b64decode(envelope["wrapped_key"]), aad)
+        contents = AESGCM(data_key).decrypt(base64.b64decode(envelope["nonce"]), base64.b64decode(entry["data"]), aad)
+    except (InvalidTag, KeyError, ValueError):
+        logger.error(f"Evidence file {entry.get('id')} failed decryption")
+        opened.update(data=None, integrity_error=True)
+        return opened
+    opened["data"] = base64.b64encode(contents).decode()
+    return opened
+
+def open_incident_evidence(incident: dict) -> dict:
+    files = incident.get("evidence_files")
+    if files:
+        incident["evidence_files"] = [open_evidence(entry) if isinstance(entry, dict) else entry for entry in files]
+    return incident
+
+# TOTP codes are single-use. Serverless instances share no memory, so used codes are recorded in
+# MongoDB, where a unique _id rejects a second use and a TTL index removes them afterwards.
+totp_index_ready = False
+
+async def verify_totp(user_id: str, secret: str, code: str) -> bool:
+    global totp_index_ready
+    if not pyotp.TOTP(secret).verify(code):
+        return False
+    if not totp_index_ready:
+        await db.totp_used_codes.create_index("created_at", expireAfterSeconds=TOTP_REPLAY_WINDOW)
+        totp_index_ready = True
+    try:
+        await db.totp_used_codes.insert_one({"_id": f"{user_id}:{code}", "created_at": datetime.now(timezone.utc)})
+    except DuplicateKeyError:
+        return False
+    return True
+
+def render_qr_png(data: str) -> str:
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
 # ==================== AUTH ENDPOINTS ====================
 
 @app.post("/api/auth/register", response_model=TokenResponse)
@@ -282,8 +435,7 @@ async def login(login_data: UserLogin):
         if not login_data.totp_code:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="2FA code required")
         
-        totp = pyotp.TOTP(user["totp_secret"])
-        if not totp.verify(login_data.totp_code):
+        if not await verify_totp(user["id"], user["totp_secret"], login_data.totp_code):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid 2FA code")
     
     access_token = create_access_token(user["id"], user["role"])
@@ -303,15 +455,8 @@ async def setup_2fa(current_user: dict = Depends(get_current_user)):
         issuer_name="SafeSpace"
     )
     
-    # Generate QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(provisioning_uri)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    qr_code_base64 = base64.b64encode(buffer.getvalue()).decode()
+    # Generate QR code off the event loop
+    qr_code_base64 = await asyncio.to_thread(render_qr_png, provisioning_uri)
     
     # Save secret
     await db.users.update_one(
@@ -331,8 +476,7 @@ async def enable_2fa(totp_code: str, current_user: dict = Depends(get_current_us
     if not user.get("totp_secret"):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="2FA not set up")
     
-    totp = pyotp.TOTP(user["totp_secret"])
-    if not totp.verify(totp_code):
+    if not await verify_totp(current_user["id"], user["totp_secret"], totp_code):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid code")
     
     await db.users.update_one(
@@ -354,15 +498,15 @@ async def disable_2fa(current_user: dict = Depends(get_current_user)):
 # ==================== PROFILE ENDPOINTS ====================
 
 @app.get("/api/profile")
-async def get_profile(current_user: dict = Depends(get_current_user)):
+async def get_profile(
+    current_user: dict = Depends(get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
+):
     """Get user profile"""
-    user = await db.users.find_one({"id": current_user["id"]})
+    user = await loader.load(current_user["id"])
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    
-    user_dict = serialize_doc(user)
-    user_dict.pop("password_hash")
-    return user_dict
+    return user
 
 @app.put("/api/profile")
 async def update_profile(
@@ -388,41 +532,107 @@ async def update_profile(
     user_dict.pop("password_hash")
     return user_dict
 
+# Contacts are edited in place by id, so two devices editing at once never overwrite each other
+CONTACT_LIMIT_DETAIL = f"At most {MAX_EMERGENCY_CONTACTS} emergency contacts allowed"
+
+def contact_document(contact: EmergencyContact) -> dict:
+    return {"id": str(uuid.uuid4()), **contact.model_dump()}
+
+async def push_emergency_contacts(user_id: str, contacts: List[dict]) -> bool:
+    """Append contacts in one conditional update; False if the cap would be exceeded"""
+    if len(contacts) > MAX_EMERGENCY_CONTACTS:
+        return False
+    result = await db.users.update_one(
+        {"id": user_id, f"emergency_contacts.{MAX_EMERGENCY_CONTACTS - len(contacts)}": {"$exists": False}},
+        {"$push": {"emergency_contacts": {"$each": contacts}}}
+    )
+    return result.matched_count > 0
+
+@app.get("/api/profile/emergency-contacts")
+async def get_emergency_contacts(current_user: dict = Depends(get_current_user)):
+    """Get emergency contacts"""
+    user = await db.users.find_one({"id": current_user["id"]}, {"_id": 0, "emergency_contacts": 1})
+    contacts = user.get("emergency_contacts", []) if user else []
+    if any("id" not in contact for contact in contacts):
+        # Contacts saved before ids existed get one on first read, unless the list changed meanwhile
+        with_ids = [contact if "id" in contact else {"id": str(uuid.uuid4()), **contact} for contact in contacts]
+        result = await db.users.update_one(
+            {"id": current_user["id"], "emergency_contacts": contacts},
+            {"$set": {"emergency_contacts": with_ids}}
+        )
+        if result.matched_count:
+            contacts = with_ids
+    return contacts
+
 @app.post("/api/profile/emergency-contacts")
 async def add_emergency_contact(
     contact: EmergencyContact,
     current_user: dict = Depends(get_current_user)
 ):
     """Add emergency contact"""
-    await db.users.update_one(
-        {"id": current_user["id"]},
-        {"$push": {"emergency_contacts": contact.model_dump()}}
+    document = contact_document(contact)
+    if not await push_emergency_contacts(current_user["id"], [document]):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=CONTACT_LIMIT_DETAIL)
+    return {"message": "Emergency contact added", "contact": document}
+
+@app.post("/api/profile/emergency-contacts/bulk")
+async def add_emergency_contacts(
+    payload: EmergencyContactList,
+    current_user: dict = Depends(get_current_user)
+):
+    """Add several emergency contacts at once"""
+    documents = [contact_document(contact) for contact in payload.contacts]
+    if not await push_emergency_contacts(current_user["id"], documents):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=CONTACT_LIMIT_DETAIL)
+    return {"message": f"{len(documents)} emergency contacts added", "contacts": documents}
+
+@app.put("/api/profile/emergency-contacts")
+async def replace_emergency_contacts(
+    payload: EmergencyContactList,
+    current_user: dict = Depends(get_current_user)
+):
+    """Replace the whole emergency contact list"""
+    documents = [contact_document(contact) for contact in payload.contacts]
+    await db.users.update_one({"id": current_user["id"]}, {"$set": {"emergency_contacts": documents}})
+    return {"message": "Emergency contacts replaced", "contacts": documents}
+
+@app.put("/api/profile/emergency-contacts/{contact_id}")
+async def update_emergency_contact(
+    contact_id: str,
+    contact: EmergencyContact,
+    current_user: dict = Depends(get_current_user)
+):
+    """Update one emergency contact by id"""
+    result = await db.users.update_one(
+        {"id": current_user["id"], "emergency_contacts.id": contact_id},
+        {"$set": {f"emergency_contacts.$.{field}": value for field, value in contact.model_dump().items()}}
     )
-    return {"message": "Emergency contact added"}
+    if result.matched_count == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    return {"message": "Emergency contact updated", "contact": {"id": contact_id, **contact.model_dump()}}
 
-@app.delete("/api/profile/emergency-contacts/{index}")
+@app.delete("/api/profile/emergency-contacts/{contact_id}")
 async def remove_emergency_contact(
-    index: int,
+    contact_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    """Remove emergency contact by index"""
-    user = await db.users.find_one({"id": current_user["id"]})
-    contacts = user.get("emergency_contacts", [])
-    
-    if 0 <= index < len(contacts):
-        contacts.pop(index)
-        await db.users.update_one(
-            {"id": current_user["id"]},
-            {"$set": {"emergency_contacts": contacts}}
-        )
-        return {"message": "Emergency contact removed"}
-    
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    """Remove emergency contact by id"""
+    result = await db.users.update_one(
+        {"id": current_user["id"]},
+        {"$pull": {"emergency_contacts": {"id": contact_id}}}
+    )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
+    return {"message": "Emergency contact removed"}
 
 # ==================== SOS ENDPOINTS ====================
 
 @app.post("/api/sos")
-async def trigger_sos(sos_data: SOSCreate, current_user: dict = Depends(get_current_user)):
+async def trigger_sos(
+    sos_data: SOSCreate,
+    current_user: dict = Depends(get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
+):
     """Trigger SOS alert"""
     alert = SOSAlert(
         user_id=current_user["id"],
@@ -433,8 +643,8 @@ async def trigger_sos(sos_data: SOSCreate, current_user: dict = Depends(get_curr
     
     await db.sos_alerts.insert_one(alert.model_dump())
     
-    # Get user's emergency contacts
-    user = await db.users.find_one({"id": current_user["id"]})
+    # Get user's emergency contacts (already loaded by get_current_user)
+    user = await loader.load(current_user["id"])
     emergency_contacts = user.get("emergency_contacts", [])
     
     # Note: SMS notifications would be sent here if Twilio is configured
@@ -486,7 +696,7 @@ async def create_incident(
 async def get_incidents(current_user: dict = Depends(get_current_user)):
     """Get user's incidents"""
     incidents = await db.incidents.find({"user_id": current_user["id"]}).sort("created_at", -1).to_list(100)
-    return [serialize_doc(inc) for inc in incidents]
+    return [serialize_doc(open_incident_evidence(inc)) for inc in incidents]
 
 @app.get("/api/incidents/{incident_id}")
 async def get_incident(incident_id: str, current_user: dict = Depends(get_current_user)):
@@ -494,7 +704,7 @@ async def get_incident(incident_id: str, current_user: dict = Depends(get_curren
     incident = await db.incidents.find_one({"id": incident_id, "user_id": current_user["id"]})
     if not incident:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Incident not found")
-    return serialize_doc(incident)
+    return serialize_doc(open_incident_evidence(incident))
 
 @app.post("/api/incidents/{incident_id}/evidence")
 async def upload_evidence(
@@ -515,12 +725,13 @@ async def upload_evidence(
     if len(contents) > 5 * 1024 * 1024:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File too large (max 5MB)")
     
-    file_data = base64.b64encode(contents).decode()
+    file_id = str(uuid.uuid4())
     file_entry = {
+        "id": file_id,
         "filename": file.filename,
         "content_type": file.content_type,
-        "data": file_data,
-        "uploaded_at": datetime.now(timezone.utc).isoformat()
+        **seal_evidence(file_id, contents),
+        "uploaded_at": datetime.now(timezone.utc)
     }
     
     # Add to incident
@@ -529,14 +740,18 @@ async def upload_evidence(
         {"$push": {"evidence_files": file_entry}}
     )
     
-    return {"message": "Evidence uploaded", "filename": file.filename}
+    return {"message": "Evidence uploaded", "filename": file.filename, "file_id": file_id}
 
 # ==================== FORUM ENDPOINTS ====================
 
 @app.post("/api/forum/posts")
-async def create_post(post_data: ForumPostCreate, current_user: dict = Depends(get_current_user)):
+async def create_post(
+    post_data: ForumPostCreate,
+    current_user: dict = Depends(get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
+):
     """Create forum post"""
-    user = await db.users.find_one({"id": current_user["id"]})
+    user = await loader.load(current_user["id"])
     
     post = ForumPost(
         user_id=current_user["id"],
@@ -549,9 +764,18 @@ async def create_post(post_data: ForumPostCreate, current_user: dict = Depends(g
     return serialize_doc(post.model_dump())
 
 @app.get("/api/forum/posts")
-async def get_posts():
+async def get_posts(loader: UserLoader = Depends(get_user_loader)):
     """Get all forum posts"""
     posts = await db.forum_posts.find().sort("created_at", -1).to_list(100)
+    
+    # Resolve current author names for posts and comments in one users query
+    author_ids = {post["user_id"] for post in posts}
+    author_ids.update(comment["user_id"] for post in posts for comment in post.get("comments", []))
+    authors = await loader.load_many(author_ids)
+    for post in posts:
+        for item in [post, *post.get("comments", [])]:
+            if item["user_id"] in authors:
+                item["author_name"] = authors[item["user_id"]]["name"]
     return [serialize_doc(post) for post in posts]
 
 @app.post("/api/forum/posts/{post_id}/upvote")
@@ -567,10 +791,11 @@ async def upvote_post(post_id: str, current_user: dict = Depends(get_current_use
 async def add_comment(
     post_id: str,
     content: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    loader: UserLoader = Depends(get_user_loader)
 ):
     """Add comment to post"""
-    user = await db.users.find_one({"id": current_user["id"]})
+    user = await loader.load(current_user["id"])
     
     comment = ForumComment(
         user_id=current_user["id"],
@@ -625,7 +850,7 @@ async def get_all_incidents(
         query["status"] = status_filter
     
     incidents = await db.incidents.find(query).sort("created_at", -1).to_list(200)
-    return [serialize_doc(inc) for inc in incidents]
+    return [serialize_doc(open_incident_evidence(inc)) for inc in incidents]
 
 @app.put("/api/admin/incidents/{incident_id}")
 async def update_incident_status(
@@ -639,7 +864,7 @@ async def update_incident_status(
         {
             "$set": {
                 "status": update_data.status.value,
-                "updated_at": datetime.now(timezone.utc).isoformat()
+                "updated_at": datetime.now(timezone.utc)
             }
         }
     )
@@ -0,0 +1,36 @@
+"""Enums and scoring formulas shared by the API server and the offline scripts.
+
+Importing this module has no side effects (no database client, directories or worker pools),
+so scripts such as generate_scale_dataset.py can use it without loading server.py.
+"""
+
+import math
+from datetime import datetime
+from enum import Enum
+
+class IncidentType(str, Enum):
+    HARASSMENT = "harassment"
+    ASSAULT = "assault"
+    STALKING = "stalking"
+    DOMESTIC_VIOLENCE = "domestic_violence"
+    WORKPLACE_HARASSMENT = "workplace_harassment"
+    ONLINE_ABUSE = "online_abuse"
+    OTHER = "other"
+
+class CaseStatus(str, Enum):
+    NEW = "new"
+    UNDER_REVIEW = "under_review"
+    IN_PROGRESS = "in_progress"
+    RESOLVED = "resolved"
+    CLOSED = "closed"
+
+# Forum "hot" ranking: log10(activity) + age term, so scores never need decaying in place
+HOT_DECAY_SECONDS = 45000  # a post needs 10x the activity to outrank one posted 12.5 hours later
+HOT_COMMENT_WEIGHT = 2
+
+def hot_score(upvotes: int, comment_count: int, created_at: datetime) -> float:
+    activity = max(1, upvotes + HOT_COMMENT_WEIGHT * comment_count)
+    return math.log10(activity) + hot_base(created_at)
+
+def hot_base(created_at: datetime) -> float:
+    return created_at.timestamp() / HOT_DECAY_SECONDS
@@ -1,13 +1,19 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, File, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, File, UploadFile, Header, BackgroundTasks, Request, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers, MutableHeaders
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne, ReplaceOne, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter, ValidationError
+from typing import List, Optional, Literal, Union, Annotated, Tuple, NamedTuple
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
@@ -16,16 +22,204 @@ import pyotp
 import io
 import base64
 import qrcode
+import re
 import aiofiles
+from PIL import Image, ImageOps, UnidentifiedImageError
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import asyncio
+import contextvars
+import hashlib
+import heapq
+import json
+import math
+import multiprocessing
+import shutil
+import struct
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
+import fastapi.routing
+import numpy as np
+import requests as http_client
+
+from domain import HOT_COMMENT_WEIGHT, CaseStatus, IncidentType, hot_base, hot_score
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Request tracing
+TRACE_EXPORT = os.environ.get('TRACE_EXPORT', '')  # "", "jsonl" or "otlp"
+TRACE_FILE = Path(os.environ.get('TRACE_FILE', ROOT_DIR / 'traces.jsonl'))
+OTLP_ENDPOINT = os.environ.get('OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))  # 0 disables the slow-query log
+
+current_span = contextvars.ContextVar("current_span", default=None)
+
+class Tracer:
+    """Minimal in-process tracer: spans are dicts, finished spans are buffered and exported in batches."""
+
+    def __init__(self, export: str):
+        self.export = export
+        self.finished = deque(maxlen=100000)
+
+    def start(self, name: str, parent: Optional[dict] = None, **attributes) -> dict:
+        parent = parent or current_span.get()
+        return {
+            "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex,
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_id": parent["span_id"] if parent else None,
+            "name": name,
+            "start_ns": time.time_ns(),
+            "attributes": attributes,
+        }
+
+    def finish(self, span: dict, end_ns: Optional[int] = None, error: Optional[str] = None):
+        span["end_ns"] = end_ns or time.time_ns()
+        if error:
+            span["error"] = error
+        self.finished.append(span)
+
+    async def span(self, name: str, awaitable, **attributes):
+        span = self.start(name, **attributes)
+        token = current_span.set(span)
+        try:
+            return await awaitable
+        except Exception as exc:
+            span["error"] = repr(exc)
+            raise
+        finally:
+            current_span.reset(token)
+            self.finish(span)
+
+    async def flush(self):
+        batch = [self.finished.popleft() for _ in range(len(self.finished))]
+        if batch:
+            await asyncio.to_thread(self.write_jsonl if self.export == "jsonl" else self.post_otlp, batch)
+
+    def write_jsonl(self, spans: List[dict]):
+        with open(TRACE_FILE, "a") as f:
+            for span in spans:
+                f.write(json.dumps(span, default=str) + "\n")
+
+    def post_otlp(self, spans: List[dict]):
+        def attribute(key, value):
+            kind = "intValue" if isinstance(value, int) and not isinstance(value, bool) else "stringValue"
+            return {"key": key, "value": {kind: value if kind == "intValue" else str(value)}}
+        
+        otlp_spans = [{
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            **({"parentSpanId": span["parent_id"]} if span["parent_id"] else {}),
+            "name": span["name"],
+            "kind": 2 if span["parent_id"] is None else 1,  # SERVER for request spans, INTERNAL otherwise
+            "startTimeUnixNano": str(span["start_ns"]),
+            "endTimeUnixNano": str(span["end_ns"]),
+            "attributes": [attribute(key, value) for key, value in span["attributes"].items()],
+            "status": {"code": 2, "message": span["error"]} if span.get("error") else {"code": 1},
+        } for span in spans]
+        try:
+            http_client.post(OTLP_ENDPOINT, json={"resourceSpans": [{
+                "resource": {"attributes": [attribute("service.name", "safespace-api")]},
+                "scopeSpans": [{"scope": {"name": "safespace"}, "spans": otlp_spans}],
+            }]}, timeout=5)
+        except http_client.RequestException as exc:
+            logger.warning(f"Dropped {len(spans)} spans, OTLP export failed: {exc}")
+
+tracer = Tracer(TRACE_EXPORT) if TRACE_EXPORT else None
+
+# Where each command keeps the part of its document worth showing in the slow-query log
+COMMAND_FILTER_FIELDS = {
+    "find": "filter", "aggregate": "pipeline", "count": "query", "distinct": "query",
+    "findAndModify": "query", "update": "updates", "delete": "deletes",
+}
+
+def query_shape(value):
+    """Replace literal values with placeholders so the log shows the shape of a filter, not user data."""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [query_shape(item) for item in value[:3]]
+    return "?"
+
+class CommandTracer(monitoring.CommandListener):
+    """Turns Mongo commands into child spans of the current request and logs slow ones.
+    
+    Motor runs commands on its executor with the caller's context copied, so `current_span`
+    is the request span here.
+    """
+
+    def __init__(self):
+        self.pending = {}
+
+    def started(self, event):
+        filter_doc = event.command.get(COMMAND_FILTER_FIELDS.get(event.command_name))
+        if event.command_name in ("update", "delete") and filter_doc:
+            filter_doc = filter_doc[0].get("q")
+        self.pending[(event.request_id, event.connection_id)] = (
+            current_span.get(), event.command_name, event.command.get(event.command_name), filter_doc
+        )
+
+    def succeeded(self, event):
+        self._finish(event, None)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure.get("errmsg", event.failure)))
+
+    def _finish(self, event, error):
+        parent, name, collection, filter_doc = self.pending.pop((event.request_id, event.connection_id), (None, event.command_name, None, None))
+        duration_ms = event.duration_micros / 1000
+        if tracer and parent:
+            end_ns = time.time_ns()
+            span = tracer.start(f"mongo.{name}", parent=parent, collection=str(collection), duration_us=event.duration_micros)
+            span["start_ns"] = end_ns - event.duration_micros * 1000
+            tracer.finish(span, end_ns=end_ns, error=error)
+        if SLOW_QUERY_MS and duration_ms >= SLOW_QUERY_MS:
+            route = parent["attributes"].get("route") if parent else None
+            logger.warning(
+                f"Slow query: {name} {collection} took {duration_ms:.1f} ms"
+                f"{f' in {route}' if route else ''} shape={json.dumps(query_shape(filter_doc), default=str)}"
+            )
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'safespace_db')]
+DB_NAME = os.environ.get('DB_NAME', 'safespace_db')
+# tz_aware so dates read back from Mongo are UTC-aware and serialize with their offset
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[CommandTracer()] if tracer or SLOW_QUERY_MS else [])
+db = client[DB_NAME]
+
+# Read routing: admin/analytics reads may go to secondaries, everything else stays on the primary
+READ_PREFERENCE_MODES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+ANALYTICS_READ_PREFERENCE = os.environ.get('ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+ANALYTICS_MAX_STALENESS_SECONDS = int(os.environ.get('ANALYTICS_MAX_STALENESS_SECONDS', '90'))
+ANALYTICS_READ_TAGS = os.environ.get('ANALYTICS_READ_TAGS', '')  # e.g. "nodeType:ANALYTICS"
+
+def build_read_preference(mode: str, max_staleness: int = -1, tags: str = ""):
+    if mode not in READ_PREFERENCE_MODES:
+        raise ValueError(f"Unknown read preference {mode!r}, expected one of {', '.join(READ_PREFERENCE_MODES)}")
+    if mode == "primary":
+        return Primary()
+    if max_staleness != -1 and max_staleness < 90:
+        raise ValueError("maxStalenessSeconds must be -1 (no limit) or at least 90")
+    tag_set = dict(pair.split(":", 1) for pair in tags.split(",") if pair)
+    tag_sets = [tag_set, {}] if tag_set else None
+    return READ_PREFERENCE_MODES[mode](tag_sets=tag_sets, max_staleness=max_staleness)
+
+analytics_db = client.get_database(
+    DB_NAME,
+    read_preference=build_read_preference(ANALYTICS_READ_PREFERENCE, ANALYTICS_MAX_STALENESS_SECONDS, ANALYTICS_READ_TAGS)
+)
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -34,9 +228,106 @@ JWT_SECRET = os.environ.get('JWT_SECRET', 'safespace-secret-key-change-in-produc
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION = 24  # hours
 
+# Token revocation: revoked token ids live in Mongo until the token would have expired, mirrored in a Bloom filter
+REVOCATION_BLOOM_CAPACITY = int(os.environ.get('REVOCATION_BLOOM_CAPACITY', '100000'))
+REVOCATION_BLOOM_ERROR_RATE = float(os.environ.get('REVOCATION_BLOOM_ERROR_RATE', '0.001'))
+REVOCATION_REBUILD_INTERVAL = int(os.environ.get('REVOCATION_REBUILD_INTERVAL_SECONDS', '3600'))  # drops expired ids
+REVOCATION_POLL_INTERVAL = int(os.environ.get('REVOCATION_POLL_INTERVAL_SECONDS', '5'))  # without change streams
+
+# 2FA
+QR_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+QR_DEFAULT_FORMAT = os.environ.get('QR_FORMAT', 'svg')
+TOTP_SETUP_TTL = int(os.environ.get('TOTP_SETUP_TTL', '300'))  # seconds
+TOTP_REPLAY_WINDOW = 90  # seconds; covers the current TOTP step plus clock drift
+
+# Idempotency keys for retried writes (SOS, incidents, evidence)
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_TTL_HOURS', '24'))
+IDEMPOTENCY_WAIT_SECONDS = 10  # how long a duplicate waits for the original request to finish
+IDEMPOTENCY_LEASE_SECONDS = 30  # a pending key whose owner stops renewing this long is taken over by a retry
+
+# Worker pool for CPU-bound work that must not run on the event loop
+CPU_WORKERS = int(os.environ.get('CPU_WORKERS', '2'))
+# Forking would copy a process that already runs Motor, watchdog and event-loop threads, which can
+# deadlock the child; workers start from a clean interpreter instead and import this module themselves
+CPU_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+cpu_executor = ProcessPoolExecutor(max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context(CPU_START_METHOD))
+
 # File upload directory
-UPLOAD_DIR = Path("/app/backend/uploads")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_DIR = Path("/app/backend/uploads")  # created at startup, so importing this module touches no files
+THUMBNAIL_DIR = UPLOAD_DIR / "thumbnails"
+THUMBNAIL_SIZES = [int(size) for size in os.environ.get('EVIDENCE_THUMBNAIL_SIZES', '128,512').split(',')]
+
+# Resumable evidence uploads
+UPLOAD_SESSION_DIR = UPLOAD_DIR / "sessions"
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+UPLOAD_MIN_CHUNK_SIZE = 256 * 1024
+UPLOAD_MAX_CHUNK_SIZE = 32 * 1024 * 1024
+MAX_EVIDENCE_SIZE = int(os.environ.get('MAX_EVIDENCE_SIZE_MB', '2048')) * 1024 * 1024
+UPLOAD_SESSION_TTL_HOURS = int(os.environ.get('UPLOAD_SESSION_TTL_HOURS', '24'))
+UPLOAD_COPY_BUFFER = 1024 * 1024
+
+# Evidence encryption at rest: AES-256-GCM in fixed-size chunks, a data key per file wrapped by the master key
+EVIDENCE_MASTER_KEY = os.environ.get('EVIDENCE_MASTER_KEY', '')  # base64 of 32 random bytes; unset stores evidence unencrypted
+EVIDENCE_OLD_MASTER_KEYS = [key for key in os.environ.get('EVIDENCE_OLD_MASTER_KEYS', '').split(',') if key.strip()]  # still accepted for reading
+EVIDENCE_CHUNK_SIZE = 1024 * 1024
+EVIDENCE_MAGIC = b"SSEVID1\n"
+EVIDENCE_HEADER = struct.Struct(">8sI8s12s48s8s")  # magic, chunk size, master key id, wrap nonce, wrapped data key, nonce prefix
+EVIDENCE_TAG_SIZE = 16
+
+# Forum "hot" ranking (formula in domain.py)
+HOT_REFRESH_INTERVAL = int(os.environ.get('HOT_REFRESH_INTERVAL_SECONDS', '600'))
+HOT_REFRESH_WINDOW_DAYS = 7
+
+# Public forum feed snapshot
+FEED_CACHE_TTL = float(os.environ.get('FEED_CACHE_TTL_SECONDS', '5'))
+FEED_CACHE_STALE_TTL = float(os.environ.get('FEED_CACHE_STALE_SECONDS', '30'))
+
+# Moderation pre-filter
+MODERATION_TERMS_FILE = Path(os.environ.get('MODERATION_TERMS_FILE', ROOT_DIR / 'moderation_terms.json'))
+MODERATION_RELOAD_INTERVAL = 30  # seconds between checks of the terms file's mtime
+
+# Retention
+SOS_ALERT_RETENTION_DAYS = int(os.environ.get('SOS_ALERT_RETENTION_DAYS', '30'))  # inactive alerts are deleted after this
+INCIDENT_ARCHIVE_AFTER_DAYS = int(os.environ.get('INCIDENT_ARCHIVE_AFTER_DAYS', '180'))  # closed cases move to incidents_archive
+RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', '500'))
+RETENTION_INTERVAL = int(os.environ.get('RETENTION_INTERVAL_SECONDS', '3600'))
+
+# Admin incident search
+ADMIN_SEARCH_MAX_TIME_MS = int(os.environ.get('ADMIN_SEARCH_MAX_TIME_MS', '2000'))
+
+# Event-loop watchdog (opt-in, for development and staging)
+LOOP_WATCHDOG_ENABLED = os.environ.get('LOOP_WATCHDOG', '').lower() in ('1', 'true', 'yes')
+LOOP_WATCHDOG_THRESHOLD_MS = float(os.environ.get('LOOP_WATCHDOG_THRESHOLD_MS', '100'))
+LOOP_WATCHDOG_INTERVAL_MS = float(os.environ.get('LOOP_WATCHDOG_INTERVAL_MS', '20'))
+
+# Emergency contacts
+MAX_EMERGENCY_CONTACTS = int(os.environ.get('MAX_EMERGENCY_CONTACTS', '10'))
+
+# SOS escalation: minutes after the alert for each step, re-notify contacts then notify moderators
+SOS_ESCALATION_MINUTES = [float(m) for m in os.environ.get('SOS_ESCALATION_MINUTES', '5,15').split(',') if m.strip()]
+SOS_ESCALATION_ACTIONS = ["renotify_contacts", "notify_moderators"]
+
+# Route risk scoring: kernel density of incidents by type and local hour
+RISK_CELL_METERS = float(os.environ.get('RISK_CELL_METERS', '150'))
+RISK_BANDWIDTH_METERS = float(os.environ.get('RISK_BANDWIDTH_METERS', '300'))
+RISK_HOUR_BANDWIDTH = float(os.environ.get('RISK_HOUR_BANDWIDTH_HOURS', '1.5'))
+RISK_LOOKBACK_DAYS = int(os.environ.get('RISK_LOOKBACK_DAYS', '365'))
+RISK_REFRESH_INTERVAL = int(os.environ.get('RISK_REFRESH_INTERVAL_SECONDS', '300'))
+RISK_FULL_REBUILD_HOURS = int(os.environ.get('RISK_FULL_REBUILD_HOURS', '24'))
+RISK_REFRESH_OVERLAP = 60  # seconds each incremental pass re-reads, for inserts that committed late
+RISK_TILE_CELLS = 32  # tiles are 32x32 cells, 16 KB per incident type present in the tile
+RISK_HOUR_BANDS = 8  # the smoothed 24-hour profile is kept as 3-hour bands
+RISK_MAX_GRID_MB = float(os.environ.get('RISK_MAX_GRID_MB', '128'))  # per worker; the sparsest tiles are dropped beyond it
+RISK_MAX_SAMPLES = 5000  # sample points per route query
+RISK_TYPE_WEIGHTS = {
+    "assault": 3.0, "stalking": 2.0, "harassment": 1.5, "domestic_violence": 1.0,
+    "workplace_harassment": 1.0, "other": 1.0, "online_abuse": 0.0,  # online abuse says nothing about a place
+}
+
+# Event bus
+EVENT_BUS_MODE = os.environ.get('EVENT_BUS', 'auto')  # "auto", "changestream" or "memory"
+EVENT_BUS_COLLECTIONS = ["sos_alerts", "incidents", "forum_posts", "legal_resources", "revoked_tokens"]
+EVENT_BUS_TOKEN_SAVE_INTERVAL = 5  # seconds between resume-token checkpoints
 
 # Create the main app
 app = FastAPI(title="SafeSpace API")
@@ -48,21 +339,9 @@ class UserRole(str, Enum):
     MODERATOR = "moderator"
     ADMIN = "admin"
 
-class IncidentType(str, Enum):
-    HARASSMENT = "harassment"
-    ASSAULT = "assault"
-    STALKING = "stalking"
-    DOMESTIC_VIOLENCE = "domestic_violence"
-    WORKPLACE_HARASSMENT = "workplace_harassment"
-    ONLINE_ABUSE = "online_abuse"
-    OTHER = "other"
-
-class CaseStatus(str, Enum):
-    NEW = "new"
-    UNDER_REVIEW = "under_review"
-    IN_PROGRESS = "in_progress"
-    RESOLVED = "resolved"
-    CLOSED = "closed"
+class ReadConsistency(str, Enum):
+    STRONG = "strong"        # primary: SOS, auth and anything a user reads back after writing
+    ANALYTICS = "analytics"  # secondaries within ANALYTICS_MAX_STALENESS_SECONDS: admin lists and aggregates
 
 # Models
 class User(BaseModel):
@@ -75,6 +354,7 @@ class User(BaseModel):
     role: UserRole = UserRole.USER
     emergency_contacts: List[dict] = Field(default_factory=list)
     totp_secret: Optional[str] = None
+    totp_setup_expires_at: Optional[datetime] = None  # a secret set up but not yet enabled is reused until then
     totp_enabled: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -100,6 +380,9 @@ class EmergencyContact(BaseModel):
     email: Optional[EmailStr] = None
     relationship: str
 
+class EmergencyContactList(BaseModel):
+    contacts: List[EmergencyContact] = Field(..., max_length=MAX_EMERGENCY_CONTACTS)
+
 class SOSAlert(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -109,6 +392,8 @@ class SOSAlert(BaseModel):
     notes: Optional[str] = None
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     is_active: bool = True
+    escalation_level: int = 0
+    due_at: Optional[datetime] = None  # when the next escalation step fires; None once acknowledged or finished
 
 class SOSCreate(BaseModel):
     latitude: float
@@ -158,11 +443,19 @@ class ForumPostCreate(BaseModel):
     content: str
 
 class ForumComment(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
     author_name: str
     content: str
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int = Field(..., gt=0)
+    content_type: Optional[str] = None
+    chunk_size: Optional[int] = None
+    sha256: Optional[str] = None  # hex digest of the whole file, checked on completion
+
 class LegalResource(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -176,6 +469,424 @@ class LegalResourceCreate(BaseModel):
     content: str
     category: str
 
+class RouteRiskRequest(BaseModel):
+    points: List[Tuple[Annotated[float, Field(ge=-90, le=90)], Annotated[float, Field(ge=-180, le=180)]]] = Field(..., min_length=2, max_length=500)  # [lat, lng]
+    hour: Optional[int] = Field(None, ge=0, le=23)  # local time of day; defaults to now at the route's start
+    incident_types: Optional[List[IncidentType]] = None  # defaults to every type, weighted by RISK_TYPE_WEIGHTS
+
+class BatchCreateIncident(BaseModel):
+    op: Literal["create_incident"]
+    data: IncidentCreate
+
+class BatchAddEmergencyContact(BaseModel):
+    op: Literal["add_emergency_contact"]
+    data: EmergencyContact
+
+class BatchDeactivateSOS(BaseModel):
+    op: Literal["deactivate_sos"]
+    alert_id: str
+
+BatchOperation = TypeAdapter(Annotated[
+    Union[BatchCreateIncident, BatchAddEmergencyContact, BatchDeactivateSOS],
+    Field(discriminator="op")
+])
+
+class BatchRequest(BaseModel):
+    # Operations are validated one by one so a single bad entry does not reject the whole batch
+    operations: List[dict] = Field(..., min_length=1, max_length=100)
+
+# In-process caches
+class TTLCache:
+    """Small LRU cache whose entries expire `ttl` seconds after being set."""
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def add(self, key, value, ttl: Optional[float] = None) -> bool:
+        """Set `key` only if it is not already cached. Returns True if it was added."""
+        if self.get(key) is not None:
+            return False
+        self.set(key, value, ttl)
+        return True
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        if item is None or item[0] < time.monotonic():
+            return default
+        return item[1]
+
+    def clear(self):
+        self._data.clear()
+
+class SnapshotCache:
+    """Per-key snapshots with stale-while-revalidate and single-flight rebuilds.
+    
+    Fresh entries (younger than `ttl`) are served as is. Stale entries (up to `stale_ttl` more)
+    are served while one background task rebuilds them. With no usable entry, every caller
+    awaits the same rebuild, so each process runs at most one build per key at a time.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = {}     # key -> (built_at, value)
+        self._refreshing = {}  # key -> (generation, task)
+        self._generation = 0
+
+    async def get(self, key, build):
+        entry = self._entries.get(key)
+        if entry:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                return entry[1]
+            if age < self.ttl + self.stale_ttl:
+                self._refresh(key, build)
+                return entry[1]
+        return await asyncio.shield(self._refresh(key, build))
+
+    def invalidate(self):
+        # Builds already running belong to the old generation and will not be stored
+        self._generation += 1
+        self._entries.clear()
+
+    def _refresh(self, key, build) -> asyncio.Task:
+        running = self._refreshing.get(key)
+        if running and running[0] == self._generation:
+            return running[1]
+        
+        generation = self._generation
+        
+        async def rebuild():
+            try:
+                value = await build()
+                if generation == self._generation:
+                    self._entries[key] = (time.monotonic(), value)
+                return value
+            finally:
+                if self._refreshing.get(key, (None,))[0] == generation:
+                    del self._refreshing[key]
+        
+        def log_failure(task: asyncio.Task):
+            if not task.cancelled() and task.exception():
+                logger.error(f"Snapshot rebuild for {key!r} failed: {task.exception()!r}")
+        
+        task = asyncio.create_task(rebuild())
+        task.add_done_callback(log_failure)
+        self._refreshing[key] = (generation, task)
+        return task
+
+qr_code_cache = TTLCache(ttl=TOTP_SETUP_TTL, maxsize=10000)      # (provisioning_uri, format) -> data URI
+
+feed_cache = SnapshotCache(ttl=FEED_CACHE_TTL, stale_ttl=FEED_CACHE_STALE_TTL)
+idempotency_cache = TTLCache(ttl=600, maxsize=10000)  # completed responses, in front of db.idempotency_keys
+idempotency_inflight = {}  # key -> (fingerprint, Future) for requests currently executing in this process
+
+# Event bus
+class EventBus:
+    """Delivers writes on EVENT_BUS_COLLECTIONS to subscribers in every worker.
+    
+    On a replica set each worker tails one Mongo change stream, so every process sees every write,
+    including its own. A resume token is checkpointed so a restarted stream continues where it left off.
+    Without a replica set (or with EVENT_BUS=memory) events are dispatched in-process by `emit()`,
+    which write paths call after each change; in change-stream mode `emit()` does nothing.
+    
+    Events are dicts: {"collection", "operation", "id", "document", "updated_fields"}.
+    """
+
+    def __init__(self, database, collections: List[str]):
+        self.db = database
+        self.collections = collections
+        self.mode = "memory"
+        self.subscribers = []  # (collections, handler)
+
+    def subscribe(self, collections: List[str], handler):
+        entry = (set(collections), handler)
+        self.subscribers.append(entry)
+        return lambda: self.subscribers.remove(entry)
+
+    def emit(self, collection: str, operation: str, doc_id: str, document: Optional[dict] = None, updated_fields: Optional[List[str]] = None):
+        if self.mode == "memory":
+            self._dispatch({
+                "collection": collection,
+                "operation": operation,
+                "id": doc_id,
+                "document": document,
+                "updated_fields": updated_fields or []
+            })
+
+    def _dispatch(self, event: dict):
+        for collections, handler in list(self.subscribers):
+            if event["collection"] not in collections:
+                continue
+            try:
+                result = handler(event)
+                if asyncio.iscoroutine(result):
+                    asyncio.create_task(result)
+            except Exception:
+                logger.exception(f"Event handler failed for {event['collection']} {event['operation']}")
+
+    async def start(self):
+        if EVENT_BUS_MODE == "memory":
+            return
+        try:
+            hello = await self.db.command("hello")
+            replicated = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            replicated = False
+        if not replicated and EVENT_BUS_MODE != "changestream":
+            logger.info("No replica set: event bus is in-process only")
+            return
+        self.mode = "changestream"
+        periodic_tasks.append(asyncio.create_task(self._run(), name="event_bus"))
+
+    def _pipeline(self) -> List[dict]:
+        return [
+            {"$match": {"ns.coll": {"$in": self.collections}, "operationType": {"$in": ["insert", "update", "replace", "delete"]}}},
+            # SOS alerts are pushed to live channels whole; everything else only needs its id and changed field names
+            {"$project": {
+                "operationType": 1,
+                "ns": 1,
+                "fullDocument": {"$cond": [{"$eq": ["$ns.coll", "sos_alerts"]}, "$fullDocument", {"id": "$fullDocument.id"}]},
+                "updatedFields": {"$map": {
+                    "input": {"$objectToArray": {"$ifNull": ["$updateDescription.updatedFields", {}]}},
+                    "in": "$$this.k"
+                }}
+            }}
+        ]
+
+    async def _run(self):
+        state = await self.db.event_bus_state.find_one({"_id": "resume_token"})
+        token = state["token"] if state else None
+        backoff = 1
+        while True:
+            try:
+                async with self.db.watch(self._pipeline(), full_document="updateLookup", resume_after=token) as stream:
+                    backoff = 1
+                    saved_at = time.monotonic()
+                    async for change in stream:
+                        document = change.get("fullDocument") or {}
+                        document.pop("_id", None)
+                        self._dispatch({
+                            "collection": change["ns"]["coll"],
+                            "operation": change["operationType"],
+                            "id": document.get("id"),
+                            "document": document if change["ns"]["coll"] == "sos_alerts" else None,
+                            "updated_fields": change.get("updatedFields", [])
+                        })
+                        token = stream.resume_token
+                        if time.monotonic() - saved_at > EVENT_BUS_TOKEN_SAVE_INTERVAL:
+                            await self._save_token(token)
+                            saved_at = time.monotonic()
+            except asyncio.CancelledError:
+                if token:
+                    await self._save_token(token)
+                raise
+            except OperationFailure as exc:
+                if exc.code in (260, 280, 286):  # resume token invalid or no longer in the oplog
+                    logger.warning(f"Event bus cannot resume ({exc}); restarting from now")
+                    token = None
+                else:
+                    logger.error(f"Event bus change stream failed: {exc}")
+            except PyMongoError as exc:
+                logger.error(f"Event bus change stream interrupted: {exc}")
+            # Every consumer restarts with empty state, so anything cached from before the gap is dropped
+            self._dispatch_resync()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _dispatch_resync(self):
+        for collection in self.collections:
+            self._dispatch({"collection": collection, "operation": "resync", "id": None, "document": None, "updated_fields": []})
+
+    async def _save_token(self, token):
+        await self.db.event_bus_state.update_one(
+            {"_id": "resume_token"},
+            {"$set": {"token": token, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+event_bus = EventBus(db, EVENT_BUS_COLLECTIONS)
+
+def invalidate_feed_on_change(event: dict):
+    # Posts changed by any worker must not be served from this worker's feed snapshot.
+    # Upvotes alone are left to the snapshot TTL, as in upvote_post.
+    if event["operation"] != "update" or not set(event["updated_fields"]) <= {"upvotes", "hot_score"}:
+        feed_cache.invalidate()
+
+event_bus.subscribe(["forum_posts"], invalidate_feed_on_change)
+
+periodic_tasks = []
+
+def start_periodic(name: str, interval: float, func):
+    """Run `func()` every `interval` seconds for the lifetime of the app, logging failures."""
+    async def runner():
+        while True:
+            try:
+                await func()
+            except Exception:
+                logger.exception(f"Periodic task {name} failed")
+            await asyncio.sleep(interval)
+    periodic_tasks.append(asyncio.create_task(runner(), name=name))
+
+async def run_cpu_bound(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, func, *args)
+
+# Event-loop watchdog
+class LoopWatchdog:
+    """Detects stretches where something holds the event loop.
+    
+    A heartbeat coroutine stamps the loop every `interval` seconds and records how late each beat was.
+    A separate thread watches the stamp; once it is older than `threshold` the thread snapshots the
+    loop thread's stack and the request whose task is running, and the next beat completes the report
+    with the total blocked time.
+    """
+
+    def __init__(self, threshold: float, interval: float, history: int = 100):
+        self.threshold = threshold
+        self.interval = interval
+        self.reports = deque(maxlen=history)
+        self.lags = deque(maxlen=1000)
+        self.requests = weakref.WeakKeyDictionary()  # task -> ASGI scope of the request it serves
+        self.last_beat = time.monotonic()
+        self.pending = None
+        self.loop = None
+        self.loop_thread_id = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        periodic_tasks.append(asyncio.create_task(self._heartbeat(), name="loop_watchdog"))
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+        logger.info(f"Event-loop watchdog enabled (threshold {self.threshold * 1000:.0f} ms)")
+
+    async def _heartbeat(self):
+        while True:
+            self.last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.lags.append(now - self.last_beat - self.interval)
+            report, self.pending = self.pending, None
+            if report:
+                report["blocked_ms"] = round((now - report.pop("since") - self.interval) * 1000, 1)
+                self.reports.append(report)
+                logger.warning(
+                    f"Event loop blocked for {report['blocked_ms']} ms in {report['route'] or 'no request'}\n"
+                    + "".join(report["stack"])
+                )
+
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            beat = self.last_beat
+            if self.pending or time.monotonic() - beat < self.threshold:
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None or self.last_beat != beat:
+                continue
+            self.pending = {
+                "since": beat,
+                "detected_at": datetime.now(timezone.utc),
+                "route": self._current_route(),
+                "stack": traceback.format_stack(frame)[-15:],
+            }
+
+    def _current_route(self) -> Optional[str]:
+        try:
+            scope = self.requests.get(asyncio.current_task(self.loop))
+        except Exception:
+            return None
+        return route_name(scope) if scope else None
+
+    def summary(self) -> dict:
+        lags = sorted(self.lags)
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "lag_p50_ms": round(lags[len(lags) // 2] * 1000, 2) if lags else None,
+            "lag_p99_ms": round(lags[int(len(lags) * 0.99)] * 1000, 2) if lags else None,
+            "lag_max_ms": round(lags[-1] * 1000, 2) if lags else None,
+            "reports": list(reversed(self.reports)),
+        }
+
+def route_name(scope) -> str:
+    """"METHOD /path/{template}" once routing has run, else the raw path."""
+    endpoint = scope.get("endpoint")
+    path = next((route.path for route in app.routes if endpoint and getattr(route, "endpoint", None) is endpoint), scope["path"])
+    return f"{scope.get('method', 'WS')} {path}"
+
+class TracingMiddleware:
+    """Opens the root span for each HTTP request; FastAPI's request steps become its children."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        span = tracer.start(route_name(scope), method=scope["method"], path=scope["path"], route=route_name(scope))
+        token = current_span.set(span)
+        
+        async def traced_send(message):
+            if message["type"] == "http.response.start":
+                span["attributes"]["status_code"] = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, traced_send)
+        except Exception as exc:
+            span["error"] = repr(exc)
+            raise
+        finally:
+            current_span.reset(token)
+            span["name"] = span["attributes"]["route"] = route_name(scope)
+            tracer.finish(span)
+
+def traced_step(name: str, func):
+    async def wrapper(*args, **kwargs):
+        return await tracer.span(name, func(*args, **kwargs))
+    return wrapper
+
+if tracer:
+    # FastAPI looks these up as module globals on every request, so wrapping them times each step
+    fastapi.routing.solve_dependencies = traced_step("dependencies", fastapi.routing.solve_dependencies)
+    fastapi.routing.run_endpoint_function = traced_step("handler", fastapi.routing.run_endpoint_function)
+    fastapi.routing.serialize_response = traced_step("serialization", fastapi.routing.serialize_response)
+
+class LoopWatchdogMiddleware:
+    """Remembers which request each task serves so a blocked loop can be attributed to a route."""
+
+    def __init__(self, app, watchdog: LoopWatchdog):
+        self.app = app
+        self.watchdog = watchdog
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            self.watchdog.requests[asyncio.current_task()] = scope
+        await self.app(scope, receive, send)
+
+loop_watchdog = LoopWatchdog(LOOP_WATCHDOG_THRESHOLD_MS / 1000, LOOP_WATCHDOG_INTERVAL_MS / 1000) if LOOP_WATCHDOG_ENABLED else None
+
 # Utility functions
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -184,28 +895,714 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def create_access_token(user_id: str, role: str) -> str:
-    expiration = datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION)
+    issued_at = datetime.now(timezone.utc)
     payload = {
         "sub": user_id,
         "role": role,
-        "exp": expiration
+        "jti": uuid.uuid4().hex,
+        "iat": issued_at.timestamp(),  # fractional, so a revoke-all never catches a login in the same second
+        "exp": issued_at + timedelta(hours=JWT_EXPIRATION)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+class UserLoader:
+    """Request-scoped user lookups. Loads requested in the same event-loop tick are
+    batched into one `$in` query, and every result is memoized for the rest of the request."""
+
+    projection = {"_id": 0, "password_hash": 0, "totp_secret": 0}
+
+    def __init__(self, database):
+        self.db = database
+        self._cache = {}
+        self._pending = {}
+
+    async def load(self, user_id: str) -> Optional[dict]:
+        users = await self.load_many([user_id])
+        return users.get(user_id)
+
+    async def load_many(self, user_ids) -> dict:
+        loop = asyncio.get_running_loop()
+        waiting = []
+        for user_id in set(user_ids):
+            if user_id in self._cache:
+                continue
+            if user_id not in self._pending:
+                if not self._pending:
+                    loop.create_task(self._dispatch())
+                self._pending[user_id] = loop.create_future()
+            waiting.append(self._pending[user_id])
+        if waiting:
+            await asyncio.gather(*waiting)
+        return {user_id: self._cache[user_id] for user_id in user_ids if self._cache.get(user_id)}
+
+    async def _dispatch(self):
+        batch, self._pending = self._pending, {}
+        try:
+            users = await self.db.users.find({"id": {"$in": list(batch)}}, self.projection).to_list(None)
+        except Exception as exc:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        found = {user["id"]: user for user in users}
+        for user_id, future in batch.items():
+            self._cache[user_id] = found.get(user_id)
+            if not future.done():
+                future.set_result(None)
+
+def get_user_loader() -> UserLoader:
+    return UserLoader(db)
+
+class BloomFilter:
+    """Set membership with no false negatives and a `error_rate` chance of false positives at `capacity` keys."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class TokenRevocations:
+    """Revoked tokens, checked on every authenticated request.
+    
+    `revoked_tokens` holds one document per logged-out token (id = its jti) and one per user whose
+    sessions were all revoked (id = "user:<user_id>", with `revoked_before`). Each expires with the
+    last token it can affect. Every id is also added to a Bloom filter, so a request only reads the
+    collection when its jti or user id hits the filter. Other workers learn about revocations through
+    the event bus, and the filter is rebuilt every REVOCATION_REBUILD_INTERVAL to drop expired ids.
+    Without change streams the bus only reaches this worker, so `poll` reads revocations made since
+    the last sync instead. Until the first build, every check goes to the database.
+    """
+
+    def __init__(self, database):
+        self.db = database
+        self.bloom = None
+        self._loading = None  # ids noted while a rebuild is reading the collection
+        self.synced_at = None  # revocations made before this are in the filter
+
+    def note(self, key: str):
+        if self.bloom is not None:
+            self.bloom.add(key)
+        if self._loading is not None:
+            self._loading.append(key)
+
+    async def rebuild(self):
+        self._loading = []
+        started = datetime.now(timezone.utc)
+        try:
+            cursor = self.db.revoked_tokens.find({"expires_at": {"$gt": datetime.now(timezone.utc)}}, {"_id": 0, "id": 1})
+            keys = [doc["id"] async for doc in cursor]
+            bloom = BloomFilter(max(REVOCATION_BLOOM_CAPACITY, 2 * len(keys)), REVOCATION_BLOOM_ERROR_RATE)
+            for key in keys + self._loading:
+                bloom.add(key)
+            self.bloom = bloom
+            self.synced_at = started
+        finally:
+            self._loading = None
+
+    async def poll(self):
+        """Note revocations made on other workers since the last sync."""
+        if self.bloom is None:
+            return  # checks still go to the database
+        started = datetime.now(timezone.utc)
+        # Overlap the previous window to cover clock skew between workers and writes still in flight
+        since = self.synced_at - timedelta(seconds=2 * REVOCATION_POLL_INTERVAL)
+        async for doc in self.db.revoked_tokens.find({"revoked_at": {"$gte": since}}, {"_id": 0, "id": 1}):
+            self.note(doc["id"])
+        self.synced_at = started
+
+    def on_event(self, event: dict):
+        if event["operation"] == "resync":
+            # Revocations made while the change stream was down were missed
+            return self.rebuild()
+        if event["operation"] in ("insert", "update", "replace") and event["id"]:
+            self.note(event["id"])
+
+    async def is_revoked(self, claims: dict) -> bool:
+        keys = [claims["jti"], f"user:{claims['user_id']}"]
+        if self.bloom is not None and not any(key in self.bloom for key in keys):
+            return False
+        async for doc in self.db.revoked_tokens.find({"id": {"$in": keys}}, {"_id": 0, "id": 1, "revoked_before": 1}):
+            if doc["id"] == claims["jti"] or claims["issued_at"] < as_utc(doc["revoked_before"]).timestamp():
+                return True
+        return False
+
+    async def revoke(self, claims: dict):
+        await self.db.revoked_tokens.update_one(
+            {"id": claims["jti"]},
+            {"$setOnInsert": {
+                "id": claims["jti"],
+                "user_id": claims["user_id"],
+                "revoked_at": datetime.now(timezone.utc),
+                "expires_at": datetime.fromtimestamp(claims["expires_at"], timezone.utc)
+            }},
+            upsert=True
+        )
+        self.note(claims["jti"])
+        event_bus.emit("revoked_tokens", "insert", claims["jti"])
+
+    async def revoke_user(self, user_id: str):
+        """Revoke every token issued to `user_id` until now; tokens issued afterwards are unaffected."""
+        key = f"user:{user_id}"
+        now = datetime.now(timezone.utc)
+        await self.db.revoked_tokens.update_one(
+            {"id": key},
+            {"$set": {"user_id": user_id, "revoked_before": now, "revoked_at": now, "expires_at": now + timedelta(hours=JWT_EXPIRATION)}},
+            upsert=True
+        )
+        self.note(key)
+        event_bus.emit("revoked_tokens", "update", key, updated_fields=["revoked_before"])
+
+token_revocations = TokenRevocations(db)
+event_bus.subscribe(["revoked_tokens"], token_revocations.on_event)
+
+def decode_access_token(token: str) -> dict:
+    """Verify the signature and expiry; revocation is checked by `authenticate_token`."""
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id = payload.get("sub")
         role = payload.get("role")
         if not user_id:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        return {"user_id": user_id, "role": role}
+        return {
+            "user_id": user_id,
+            "role": role,
+            # Tokens issued before revocation existed have no jti or iat; they are identified by their hash
+            "jti": payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()[:32],
+            "issued_at": payload.get("iat", payload["exp"] - JWT_EXPIRATION * 3600),
+            "expires_at": payload["exp"]
+        }
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
+async def authenticate_token(token: str) -> dict:
+    claims = decode_access_token(token)
+    if await token_revocations.is_revoked(claims):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token revoked")
+    return claims
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    return await authenticate_token(credentials.credentials)
+
+# Conditional GETs: every write to a versioned resource bumps the owner's counter in resource_versions
+VERSIONED_RESOURCES = {
+    "/api/users/profile": ("profile",),
+    "/api/users/emergency-contacts": ("emergency_contacts",),
+    "/api/incidents": ("incidents",),
+    "/api/sos": ("sos",),
+    "/api/me/dashboard": ("incidents", "sos", "emergency_contacts"),
+}
+
+async def bump_versions(user_ids, *resources: str):
+    """Invalidate the ETags of `resources` for one user id or an iterable of them."""
+    user_ids = {user_ids} if isinstance(user_ids, str) else set(user_ids)
+    user_ids.discard("anonymous")
+    if not user_ids:
+        return
+    # The epoch changes if the counters are ever lost, so a restarted count cannot reuse an old ETag
+    await db.resource_versions.bulk_write([
+        UpdateOne({"_id": user_id}, {"$inc": {resource: 1 for resource in resources}, "$setOnInsert": {"epoch": uuid.uuid4().hex}}, upsert=True)
+        for user_id in user_ids
+    ], ordered=False)
+
+def if_none_match(header: str, etag: str) -> bool:
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag.removeprefix("W/") for candidate in candidates)
+
+class ConditionalGetMiddleware:
+    """Adds ETags to the versioned per-user GETs and answers a matching If-None-Match with 304
+    after a single counter lookup, before the route queries or serializes anything."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        resources = VERSIONED_RESOURCES.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "GET" else None
+        if not resources:
+            return await self.app(scope, receive, send)
+        
+        headers = Headers(scope=scope)
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        try:
+            claims = await authenticate_token(token) if scheme.lower() == "bearer" else None
+        except HTTPException:
+            claims = None
+        if not claims:
+            # Let the route produce its usual 401
+            return await self.app(scope, receive, send)
+        
+        # Read before the route runs: writes bump after writing, so the tag can only be older than the body, never newer
+        versions = await db.resource_versions.find_one({"_id": claims["user_id"]}, {**dict.fromkeys(resources, 1), "epoch": 1}) or {}
+        counters = ",".join(f"{resource}={versions.get(resource, 0)}" for resource in resources)
+        tag = hashlib.sha256(
+            f"{claims['user_id']}:{scope['path']}:{versions.get('epoch')}:{counters}:{scope['query_string'].decode()}".encode()
+        ).hexdigest()[:32]
+        etag = f'W/"{tag}"'
+        cache_headers = [(b"etag", etag.encode()), (b"cache-control", b"private, no-cache"), (b"vary", b"Authorization")]
+        
+        if if_none_match(headers.get("if-none-match", ""), etag):
+            await send({"type": "http.response.start", "status": 304, "headers": cache_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                response_headers = MutableHeaders(scope=message)
+                for name, value in cache_headers:
+                    response_headers[name.decode()] = value.decode()
+            await send(message)
+        
+        await self.app(scope, receive, send_with_etag)
+
+def qr_svg(modules: List[List[bool]], border: int, box_size: int) -> str:
+    """Serialize a QR module matrix as a single-path SVG, one subpath per horizontal run."""
+    size = len(modules) + 2 * border
+    runs = []
+    for y, row in enumerate(modules):
+        x = 0
+        while x < len(row):
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < len(row) and row[x]:
+                x += 1
+            runs.append(f"M{start + border} {y + border}h{x - start}v1h-{x - start}z")
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'width="{size * box_size}" height="{size * box_size}" shape-rendering="crispEdges">'
+        f'<rect width="100%" height="100%" fill="#fff"/><path d="{"".join(runs)}" fill="#000"/></svg>'
+    )
+
+def render_qr_code(data: str, fmt: str = "svg") -> str:
+    """Render `data` as a QR code data URI. Runs in the CPU worker pool."""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    
+    if fmt == "svg":
+        content = qr_svg(qr.modules, qr.border, qr.box_size).encode()
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+        buffered = io.BytesIO()
+        img.save(buffered, format="PNG")
+        content = buffered.getvalue()
+    
+    return f"data:{QR_FORMATS[fmt]};base64,{base64.b64encode(content).decode()}"
+
+# Evidence encryption at rest
+class EvidenceIntegrityError(Exception):
+    """An evidence file failed authentication: truncated, reordered, tampered with or under an unknown key."""
+
+def master_key_id(key: bytes) -> bytes:
+    return hashlib.sha256(key).digest()[:8]
+
+def load_master_keys() -> dict:
+    keys = {}
+    for encoded in filter(None, [EVIDENCE_MASTER_KEY, *EVIDENCE_OLD_MASTER_KEYS]):
+        key = base64.b64decode(encoded)
+        if len(key) != 32:
+            raise RuntimeError("Evidence master keys must be 32 random bytes, base64-encoded")
+        keys[master_key_id(key)] = AESGCM(key)
+    return keys
+
+evidence_master_keys = load_master_keys()
+evidence_key_id = master_key_id(base64.b64decode(EVIDENCE_MASTER_KEY)) if EVIDENCE_MASTER_KEY else None
+
+def evidence_nonce(prefix: bytes, index: int) -> bytes:
+    return prefix + struct.pack(">I", index)
+
+def evidence_aad(header: bytes, index: int, last: bool) -> bytes:
+    return header + struct.pack(">QB", index, last)
+
+class EvidenceEncryptor:
+    """Incremental encryptor for the evidence file format; update() returns bytes ready to write.
+    
+    Layout: EVIDENCE_HEADER, then chunks of `chunk_size` plaintext bytes plus a 16-byte GCM tag (the last
+    chunk may be shorter, or empty). Each file has its own data key, wrapped by the master key with the
+    file's name as associated data. Chunk i is sealed under nonce prefix||i and authenticates the header,
+    i and a last-chunk flag, so chunks cannot be reordered, moved between files or cut off the end.
+    Only one chunk is ever buffered. Without a master key the data passes through unchanged.
+    """
+
+    def __init__(self, context: str, chunk_size: int = EVIDENCE_CHUNK_SIZE):
+        self.cipher = None
+        self.header = b""
+        if evidence_key_id:
+            data_key = AESGCM.generate_key(bit_length=256)
+            wrap_nonce = os.urandom(12)
+            wrapped = evidence_master_keys[evidence_key_id].encrypt(wrap_nonce, data_key, EVIDENCE_MAGIC + context.encode())
+            self.header = EVIDENCE_HEADER.pack(EVIDENCE_MAGIC, chunk_size, evidence_key_id, wrap_nonce, wrapped, os.urandom(8))
+            self.cipher = AESGCM(data_key)
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.index = 0
+        self.pending_header = self.header
+
+    def _seal(self, length: int, last: bool) -> bytes:
+        with memoryview(self.buffer) as view:
+            sealed = self.cipher.encrypt(
+                evidence_nonce(self.header[-8:], self.index), view[:length], evidence_aad(self.header, self.index, last)
+            )
+        del self.buffer[:length]
+        self.index += 1
+        return sealed
+
+    def update(self, data) -> bytes:
+        if not self.cipher:
+            return bytes(data)
+        self.buffer += data
+        out = [self.pending_header]
+        self.pending_header = b""
+        # A full chunk stays buffered until more data arrives, since only finalize() knows which chunk is last
+        while len(self.buffer) > self.chunk_size:
+            out.append(self._seal(self.chunk_size, False))
+        return b"".join(out)
+
+    def finalize(self) -> bytes:
+        if not self.cipher:
+            return b""
+        out = self.pending_header + self._seal(len(self.buffer), True)
+        self.pending_header = b""
+        return out
+
+class EvidenceWriter:
+    """Write-only evidence file that encrypts as it goes. `context` defaults to the file name and must be
+    the name the file will finally have (pass it when writing to a temporary path).
+    Deliberately has no fileno(), so libraries like Pillow cannot write around the encryption."""
+
+    def __init__(self, path, context: Optional[str] = None):
+        self.file = open(path, "wb")
+        self.encryptor = EvidenceEncryptor(context or Path(path).name)
+
+    def write(self, data) -> int:
+        self.file.write(self.encryptor.update(data))
+        return len(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.write(self.encryptor.finalize())
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type:
+            self.file.close()
+        else:
+            self.close()
+
+class EvidenceReader(io.RawIOBase):
+    """Seekable plaintext view of an evidence file that decrypts one chunk at a time, so memory stays
+    at one chunk whatever the file size. Files stored before encryption was enabled have no header
+    and are read as they are."""
+
+    def __init__(self, path, context: Optional[str] = None):
+        super().__init__()
+        self.raw = open(path, "rb")
+        self.position = 0
+        self.cached_index, self.cached = None, b""
+        header = self.raw.read(EVIDENCE_HEADER.size)
+        self.encrypted = header[:len(EVIDENCE_MAGIC)] == EVIDENCE_MAGIC
+        total = os.fstat(self.raw.fileno()).st_size
+        if not self.encrypted:
+            self.raw.seek(0)
+            self.size = total
+            return
+        
+        try:
+            _, self.chunk_size, key_id, wrap_nonce, wrapped, _ = EVIDENCE_HEADER.unpack(header)
+            master = evidence_master_keys.get(key_id)
+            if not master:
+                raise EvidenceIntegrityError(f"{Path(path).name} is encrypted under an unknown master key")
+            self.cipher = AESGCM(master.decrypt(wrap_nonce, wrapped, EVIDENCE_MAGIC + (context or Path(path).name).encode()))
+        except (struct.error, InvalidTag):
+            self.raw.close()
+            raise EvidenceIntegrityError(f"{Path(path).name} has an invalid evidence header")
+        except EvidenceIntegrityError:
+            self.raw.close()
+            raise
+        self.header = header
+        stored_chunk = self.chunk_size + EVIDENCE_TAG_SIZE
+        self.chunk_count = max(1, -(-(total - EVIDENCE_HEADER.size) // stored_chunk))
+        self.size = total - EVIDENCE_HEADER.size - self.chunk_count * EVIDENCE_TAG_SIZE
+
+    def _chunk(self, index: int) -> bytes:
+        if index != self.cached_index:
+            self.raw.seek(EVIDENCE_HEADER.size + index * (self.chunk_size + EVIDENCE_TAG_SIZE))
+            sealed = self.raw.read(self.chunk_size + EVIDENCE_TAG_SIZE)
+            last = index == self.chunk_count - 1
+            try:
+                self.cached = self.cipher.decrypt(
+                    evidence_nonce(self.header[-8:], index), sealed, evidence_aad(self.header, index, last)
+                )
+            except InvalidTag:
+                raise EvidenceIntegrityError(f"Evidence chunk {index} failed authentication")
+            self.cached_index = index
+        return self.cached
+
+    def readinto(self, buffer) -> int:
+        if not self.encrypted:
+            count = self.raw.readinto(buffer)
+            self.position += count
+            return count
+        # Fill the whole buffer across chunk boundaries: Pillow's parsers treat a short read as end of file
+        count = 0
+        while count < len(buffer) and self.position < self.size:
+            index, offset = divmod(self.position, self.chunk_size)
+            chunk = self._chunk(index)
+            taken = min(len(buffer) - count, len(chunk) - offset)
+            buffer[count:count + taken] = chunk[offset:offset + taken]
+            count += taken
+            self.position += taken
+        return count
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(0, base + offset)
+        if not self.encrypted:
+            self.raw.seek(self.position)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+def store_evidence(source, target: Path) -> int:
+    """Copy an uploaded file into the evidence store with a fixed-size buffer. Runs in a thread; returns the size."""
+    size = 0
+    with EvidenceWriter(target) as out:
+        while block := source.read(EVIDENCE_CHUNK_SIZE):
+            out.write(block)
+            size += len(block)
+    return size
+
+def evidence_size(path: Path) -> int:
+    """Plaintext size of a stored evidence file; reads its header, so run it in a thread."""
+    with EvidenceReader(path) as reader:
+        return reader.size
+
+def iter_evidence(path: Path, start: int = 0, end: Optional[int] = None):
+    """Plaintext of bytes start..end (inclusive) in EVIDENCE_CHUNK_SIZE blocks; Starlette runs it in a thread."""
+    with EvidenceReader(path) as reader:
+        reader.seek(start)
+        remaining = (reader.size if end is None else end + 1) - start
+        while remaining > 0 and (block := reader.read(min(EVIDENCE_CHUNK_SIZE, remaining))):
+            remaining -= len(block)
+            yield block
+
+# Image formats we re-encode; anything else (GIF animations, HEIC, ...) is left untouched
+REENCODE_OPTIONS = {"JPEG": {"quality": 95}, "PNG": {}, "WEBP": {"quality": 95}}
+KEPT_IMAGE_INFO = ("icc_profile", "transparency")
+
+def process_evidence_image(file_path: str, file_id: str, sizes: List[int]) -> Optional[dict]:
+    """Strip metadata from an uploaded image in place and write WebP thumbnails.
+    Runs in the CPU worker pool; returns None for files Pillow cannot read."""
+    try:
+        with EvidenceReader(file_path) as source, Image.open(source) as original:
+            original.load()
+            image_format = original.format
+            # Bake the EXIF orientation into the pixels before the EXIF block is dropped
+            img = ImageOps.exif_transpose(original)
+    except (UnidentifiedImageError, OSError, EvidenceIntegrityError):
+        return None
+    
+    # Re-encoding without passing exif/comment/xmp drops them; GPS tags go with EXIF
+    img.info = {key: value for key, value in img.info.items() if key in KEPT_IMAGE_INFO}
+    metadata_stripped = image_format in REENCODE_OPTIONS
+    if metadata_stripped:
+        tmp_path = f"{file_path}.tmp"
+        with EvidenceWriter(tmp_path, context=Path(file_path).name) as out:
+            img.save(out, format=image_format, **REENCODE_OPTIONS[image_format])
+        os.replace(tmp_path, file_path)
+    
+    thumbnails = []
+    for size in sorted(sizes):
+        thumb = img.copy()
+        thumb.thumbnail((size, size))
+        if thumb.mode not in ("RGB", "RGBA"):
+            thumb = thumb.convert("RGBA")
+        with EvidenceWriter(THUMBNAIL_DIR / f"{file_id}_{size}.webp") as out:
+            thumb.save(out, format="WEBP", quality=80)
+        thumbnails.append(size)
+    
+    return {
+        "mime_type": Image.MIME.get(image_format),
+        "width": img.width,
+        "height": img.height,
+        "thumbnails": thumbnails,
+        "metadata_stripped": metadata_stripped
+    }
+
+# The same formula as hot_score(), evaluated by Mongo inside update pipelines
+HOT_SCORE_EXPR = {"$add": [
+    "$hot_base",
+    {"$log10": {"$max": [1, {"$add": [
+        {"$ifNull": ["$upvotes", 0]},
+        {"$multiply": [HOT_COMMENT_WEIGHT, {"$size": {"$ifNull": ["$comments", []]}}]}
+    ]}]}}
+]}
+
+def as_utc(value: datetime) -> datetime:
+    """Treat naive datetimes from query strings as UTC."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+async def verify_totp(user_id: str, secret: str, code: str) -> bool:
+    """Verify a TOTP code, rejecting codes that were already accepted for this user on any worker."""
+    if not pyotp.TOTP(secret).verify(code):
+        return False
+    try:
+        # Expired by a TTL index once the code can no longer verify
+        await db.totp_used_codes.insert_one({"_id": f"{user_id}:{code}", "created_at": datetime.now(timezone.utc)})
+    except DuplicateKeyError:
+        return False
+    return True
+
+async def run_idempotent(scope: str, user_id: str, key: Optional[str], fingerprint: str, operation):
+    """Run `operation()` once per (user, scope, Idempotency-Key) and replay its response to retries.
+    
+    Duplicates arriving while the original is still running wait for it instead of writing again:
+    in-process through `idempotency_inflight`, across workers through the pending key document.
+    The worker running the operation renews a lease on that document; if it dies, a retry takes it over
+    once the lease has expired instead of waiting for the key's TTL.
+    """
+    if not key:
+        return await operation()
+    if len(key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+    
+    cache_key = f"{user_id}:{scope}:{key}"
+    cached = idempotency_cache.get(cache_key)
+    if cached is not None:
+        if cached["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        return cached["response"]
+    
+    inflight = idempotency_inflight.get(cache_key)
+    if inflight is not None:
+        inflight_fingerprint, inflight_future = inflight
+        if inflight_fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        return await asyncio.shield(inflight_future)
+    
+    future = asyncio.get_running_loop().create_future()
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())  # waiters are optional
+    idempotency_inflight[cache_key] = (fingerprint, future)
+    try:
+        response = await _run_idempotent_once(cache_key, fingerprint, operation)
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(response)
+    finally:
+        idempotency_inflight.pop(cache_key, None)
+    
+    idempotency_cache.set(cache_key, {"fingerprint": fingerprint, "response": response})
+    return response
+
+def idempotency_lease() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)
+
+async def _acquire_idempotency_key(cache_key: str, fingerprint: str, owner: str) -> Optional[dict]:
+    """Claim the key for `owner`, or return the completed record. Raises 409 if another owner keeps it."""
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        try:
+            await db.idempotency_keys.insert_one({
+                "key": cache_key,
+                "fingerprint": fingerprint,
+                "status": "pending",
+                "owner": owner,
+                "lease_expires_at": idempotency_lease(),
+                "created_at": datetime.now(timezone.utc)
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+        existing = await db.idempotency_keys.find_one({"key": cache_key}, {"_id": 0})
+        if existing and existing["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if existing and existing["status"] == "completed":
+            return existing
+        # The owner crashed or hung: its lease ran out (records from before leases have none)
+        taken = await db.idempotency_keys.find_one_and_update(
+            {"key": cache_key, "status": "pending", "lease_expires_at": {"$not": {"$gte": datetime.now(timezone.utc)}}},
+            {"$set": {"owner": owner, "lease_expires_at": idempotency_lease()}}
+        )
+        if taken:
+            logger.warning(f"Taking over idempotency key {cache_key} after its lease expired")
+            return None
+        if time.monotonic() > deadline:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        await asyncio.sleep(0.1)
+
+async def _run_idempotent_once(cache_key: str, fingerprint: str, operation):
+    owner = uuid.uuid4().hex
+    completed = await _acquire_idempotency_key(cache_key, fingerprint, owner)
+    if completed:
+        return completed["response"]
+    
+    async def renew_lease():
+        while True:
+            await asyncio.sleep(IDEMPOTENCY_LEASE_SECONDS / 3)
+            await db.idempotency_keys.update_one(
+                {"key": cache_key, "owner": owner, "status": "pending"},
+                {"$set": {"lease_expires_at": idempotency_lease()}}
+            )
+    
+    renewal = asyncio.create_task(renew_lease())
+    try:
+        response = jsonable_encoder(await operation())
+    except BaseException:
+        # Failed requests release the key so the client can retry
+        await db.idempotency_keys.delete_one({"key": cache_key, "owner": owner, "status": "pending"})
+        raise
+    finally:
+        renewal.cancel()
+    
+    await db.idempotency_keys.update_one(
+        {"key": cache_key, "owner": owner},
+        {"$set": {"status": "completed", "response": response}, "$unset": {"lease_expires_at": ""}}
+    )
+    return response
+
+def request_fingerprint(*parts) -> str:
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+
+def read_db(consistency: ReadConsistency):
+    """Dependency factory so routes declare their consistency needs: `rdb = Depends(read_db(...))`."""
+    def dependency():
+        return analytics_db if consistency == ReadConsistency.ANALYTICS else db
+    return dependency
+
 def require_admin(current_user: dict = Depends(get_current_user)):
     if current_user["role"] not in ["admin", "moderator"]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
@@ -228,7 +1625,6 @@ async def register(user_data: UserCreate):
     )
     
     user_dict = user.model_dump()
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
     await db.users.insert_one(user_dict)
     
     # Create token
@@ -250,8 +1646,7 @@ async def login(credentials: UserLogin):
         if not credentials.totp_code:
             raise HTTPException(status_code=401, detail="2FA code required")
         
-        totp = pyotp.TOTP(user["totp_secret"])
-        if not totp.verify(credentials.totp_code):
+        if not await verify_totp(user["id"], user["totp_secret"], credentials.totp_code):
             raise HTTPException(status_code=401, detail="Invalid 2FA code")
     
     token = create_access_token(user["id"], user["role"])
@@ -261,37 +1656,48 @@ async def login(credentials: UserLogin):
         user={"id": user["id"], "email": user["email"], "name": user["name"], "role": user["role"]}
     )
 
+@api_router.post("/auth/logout")
+async def logout(all_sessions: bool = False, current_user: dict = Depends(get_current_user)):
+    """Revoke the presented token, or with `all_sessions` every token the user holds."""
+    if all_sessions:
+        await token_revocations.revoke_user(current_user["user_id"])
+    else:
+        await token_revocations.revoke(current_user)
+    return {"message": "Logged out"}
+
 # 2FA Routes
 @api_router.post("/auth/2fa/setup")
-async def setup_2fa(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user["user_id"]})
+async def setup_2fa(qr_format: Optional[Literal["png", "svg"]] = None, current_user: dict = Depends(get_current_user)):
+    fmt = qr_format or QR_DEFAULT_FORMAT
+    
+    projection = {"_id": 0, "email": 1, "totp_secret": 1, "totp_setup_expires_at": 1}
+    user = await db.users.find_one({"id": current_user["user_id"]}, projection)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Generate TOTP secret
-    secret = pyotp.random_base32()
-    
-    # Generate QR code
-    totp = pyotp.TOTP(secret)
-    provisioning_uri = totp.provisioning_uri(name=user["email"], issuer_name="SafeSpace")
-    
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(provisioning_uri)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Convert to base64
-    buffered = io.BytesIO()
-    img.save(buffered, format="PNG")
-    qr_code = base64.b64encode(buffered.getvalue()).decode()
+    # Repeated setup attempts within the window reuse the pending secret, whichever worker they reach
+    now = datetime.now(timezone.utc)
+    pending_until = user.get("totp_setup_expires_at")
+    if user.get("totp_secret") and pending_until and as_utc(pending_until) > now:
+        secret = user["totp_secret"]
+    else:
+        # Save a new secret (not enabled yet), unless another worker started a setup since the read
+        secret = pyotp.random_base32()
+        result = await db.users.update_one(
+            {"id": current_user["user_id"], "totp_setup_expires_at": pending_until},
+            {"$set": {"totp_secret": secret, "totp_setup_expires_at": now + timedelta(seconds=TOTP_SETUP_TTL)}}
+        )
+        if not result.matched_count:
+            secret = (await db.users.find_one({"id": current_user["user_id"]}, projection))["totp_secret"]
+    provisioning_uri = pyotp.TOTP(secret).provisioning_uri(name=user["email"], issuer_name="SafeSpace")
     
-    # Save secret (not enabled yet)
-    await db.users.update_one(
-        {"id": current_user["user_id"]},
-        {"$set": {"totp_secret": secret}}
-    )
+    # Generate QR code off the event loop
+    qr_code = qr_code_cache.get((provisioning_uri, fmt))
+    if not qr_code:
+        qr_code = await run_cpu_bound(render_qr_code, provisioning_uri, fmt)
+        qr_code_cache.set((provisioning_uri, fmt), qr_code)
     
-    return {"secret": secret, "qr_code": f"data:image/png;base64,{qr_code}"}
+    return {"secret": secret, "qr_code": qr_code}
 
 @api_router.post("/auth/2fa/enable")
 async def enable_2fa(totp_code: str, current_user: dict = Depends(get_current_user)):
@@ -299,14 +1705,14 @@ async def enable_2fa(totp_code: str, current_user: dict = Depends(get_current_us
     if not user or not user.get("totp_secret"):
         raise HTTPException(status_code=400, detail="2FA not set up")
     
-    totp = pyotp.TOTP(user["totp_secret"])
-    if not totp.verify(totp_code):
+    if not await verify_totp(current_user["user_id"], user["totp_secret"], totp_code):
         raise HTTPException(status_code=400, detail="Invalid code")
     
     await db.users.update_one(
         {"id": current_user["user_id"]},
-        {"$set": {"totp_enabled": True}}
+        {"$set": {"totp_enabled": True}, "$unset": {"totp_setup_expires_at": ""}}
     )
+    await bump_versions(current_user["user_id"], "profile")
     
     return {"message": "2FA enabled successfully"}
 
@@ -328,66 +1734,271 @@ async def update_profile(name: Optional[str] = None, phone: Optional[str] = None
     
     if update_data:
         await db.users.update_one({"id": current_user["user_id"]}, {"$set": update_data})
+        await bump_versions(current_user["user_id"], "profile")
     
     return {"message": "Profile updated successfully"}
 
+# Emergency contacts are edited in place by their id, so two devices editing at once never overwrite each other
+def contact_document(contact: EmergencyContact) -> dict:
+    return {"id": str(uuid.uuid4()), **contact.model_dump()}
+
+def contacts_room_for(count: int) -> dict:
+    """Filter matching only users who can take `count` more contacts without passing the cap."""
+    return {f"emergency_contacts.{MAX_EMERGENCY_CONTACTS - count}": {"$exists": False}}
+
+async def push_emergency_contacts(user_id: str, contacts: List[dict]) -> bool:
+    """Append contacts in one conditional update; False if the cap would be exceeded."""
+    if len(contacts) > MAX_EMERGENCY_CONTACTS:
+        return False
+    result = await db.users.update_one(
+        {"id": user_id, **contacts_room_for(len(contacts))},
+        {"$push": {"emergency_contacts": {"$each": contacts}}}
+    )
+    if result.matched_count:
+        await bump_contact_versions(user_id)
+    return result.matched_count > 0
+
+async def bump_contact_versions(user_id: str):
+    # The profile response embeds the contact list too
+    await bump_versions(user_id, "emergency_contacts", "profile")
+
+async def load_emergency_contacts(user_id: str) -> List[dict]:
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "emergency_contacts": 1})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    contacts = user.get("emergency_contacts", [])
+    if any("id" not in contact for contact in contacts):
+        # Contacts saved before ids existed get one on first read; the filter skips it if the list changed meanwhile
+        with_ids = [contact if "id" in contact else {"id": str(uuid.uuid4()), **contact} for contact in contacts]
+        result = await db.users.update_one(
+            {"id": user_id, "emergency_contacts": contacts},
+            {"$set": {"emergency_contacts": with_ids}}
+        )
+        if result.matched_count:
+            contacts = with_ids
+            await bump_contact_versions(user_id)
+    return contacts
+
+CONTACT_LIMIT_DETAIL = f"At most {MAX_EMERGENCY_CONTACTS} emergency contacts allowed"
+
 @api_router.post("/users/emergency-contacts")
 async def add_emergency_contact(contact: EmergencyContact, current_user: dict = Depends(get_current_user)):
-    await db.users.update_one(
+    document = contact_document(contact)
+    if not await push_emergency_contacts(current_user["user_id"], [document]):
+        raise HTTPException(status_code=400, detail=CONTACT_LIMIT_DETAIL)
+    return {"message": "Emergency contact added", "contact": document}
+
+@api_router.post("/users/emergency-contacts/bulk")
+async def add_emergency_contacts(payload: EmergencyContactList, current_user: dict = Depends(get_current_user)):
+    documents = [contact_document(contact) for contact in payload.contacts]
+    if not await push_emergency_contacts(current_user["user_id"], documents):
+        raise HTTPException(status_code=400, detail=CONTACT_LIMIT_DETAIL)
+    return {"message": f"{len(documents)} emergency contacts added", "contacts": documents}
+
+@api_router.put("/users/emergency-contacts")
+async def replace_emergency_contacts(payload: EmergencyContactList, current_user: dict = Depends(get_current_user)):
+    documents = [contact_document(contact) for contact in payload.contacts]
+    await db.users.update_one({"id": current_user["user_id"]}, {"$set": {"emergency_contacts": documents}})
+    await bump_contact_versions(current_user["user_id"])
+    return {"message": "Emergency contacts replaced", "contacts": documents}
+
+@api_router.put("/users/emergency-contacts/{contact_id}")
+async def update_emergency_contact(contact_id: str, contact: EmergencyContact, current_user: dict = Depends(get_current_user)):
+    result = await db.users.update_one(
+        {"id": current_user["user_id"], "emergency_contacts.id": contact_id},
+        {"$set": {f"emergency_contacts.$.{field}": value for field, value in contact.model_dump().items()}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Contact not found")
+    await bump_contact_versions(current_user["user_id"])
+    return {"message": "Emergency contact updated", "contact": {"id": contact_id, **contact.model_dump()}}
+
+@api_router.delete("/users/emergency-contacts/{contact_id}")
+async def remove_emergency_contact(contact_id: str, current_user: dict = Depends(get_current_user)):
+    result = await db.users.update_one(
         {"id": current_user["user_id"]},
-        {"$push": {"emergency_contacts": contact.model_dump()}}
+        {"$pull": {"emergency_contacts": {"id": contact_id}}}
     )
-    return {"message": "Emergency contact added"}
+    if result.modified_count == 0:
+        raise HTTPException(status_code=404, detail="Contact not found")
+    await bump_contact_versions(current_user["user_id"])
+    return {"message": "Emergency contact removed"}
 
 @api_router.get("/users/emergency-contacts")
 async def get_emergency_contacts(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user["user_id"]}, {"emergency_contacts": 1, "_id": 0})
-    return user.get("emergency_contacts", [])
+    return await load_emergency_contacts(current_user["user_id"])
+
+# SOS Escalation
+def escalation_due(timestamp: datetime, level: int) -> Optional[datetime]:
+    if level >= min(len(SOS_ESCALATION_MINUTES), len(SOS_ESCALATION_ACTIONS)):
+        return None
+    return timestamp + timedelta(minutes=SOS_ESCALATION_MINUTES[level])
+
+class EscalationScheduler:
+    """Fires SOS escalation steps when their `due_at` passes.
+    
+    Pending steps live in Mongo (`due_at`, indexed) and in a min-heap here, so one task sleeps until
+    the earliest deadline instead of polling. Heap entries are never removed in place: `pending`
+    holds the live (due, level) per alert and anything else popped from the heap is skipped.
+    Every worker keeps the same timers; the conditional update in `fire()` lets exactly one win.
+    """
+
+    def __init__(self):
+        self.heap = []     # (due timestamp, alert_id, level)
+        self.pending = {}  # alert_id -> (due timestamp, level)
+        self.wakeup = asyncio.Event()
+        self.firing = set()
+
+    def schedule(self, alert_id: str, due_at: datetime, level: int):
+        entry = (due_at.timestamp(), level)
+        if self.pending.get(alert_id) == entry:
+            return
+        self.pending[alert_id] = entry
+        heapq.heappush(self.heap, (entry[0], alert_id, level))
+        if self.heap[0][1] == alert_id:
+            self.wakeup.set()
+
+    def cancel(self, alert_id: str):
+        self.pending.pop(alert_id, None)
+
+    def on_event(self, event: dict):
+        document = event["document"]
+        if document:
+            if document.get("is_active") and document.get("due_at"):
+                self.schedule(event["id"], as_utc(document["due_at"]), document.get("escalation_level", 0))
+            else:
+                self.cancel(event["id"])
+        elif event["id"] and {"is_active", "due_at"} & set(event["updated_fields"]):
+            self.cancel(event["id"])
+
+    async def recover(self):
+        async for alert in db.sos_alerts.find({"due_at": {"$type": "date"}}, {"_id": 0, "id": 1, "due_at": 1, "escalation_level": 1}):
+            self.schedule(alert["id"], as_utc(alert["due_at"]), alert.get("escalation_level", 0))
+        logger.info(f"Recovered {len(self.pending)} pending SOS escalations")
+
+    async def run(self):
+        while True:
+            self.wakeup.clear()
+            while self.heap and self.heap[0][0] <= time.time():
+                due, alert_id, level = heapq.heappop(self.heap)
+                if self.pending.get(alert_id) == (due, level):
+                    del self.pending[alert_id]
+                    task = asyncio.create_task(self.fire(alert_id, level))
+                    self.firing.add(task)
+                    task.add_done_callback(self.firing.discard)
+            timeout = self.heap[0][0] - time.time() if self.heap else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def fire(self, alert_id: str, level: int):
+        if level >= len(SOS_ESCALATION_ACTIONS):
+            return
+        now = datetime.now(timezone.utc)
+        alert = await db.sos_alerts.find_one({"id": alert_id}, {"_id": 0, "timestamp": 1})
+        if not alert:
+            return
+        next_due = escalation_due(as_utc(alert["timestamp"]), level + 1)
+        # Only the worker whose update matches performs the step; a deactivated or acknowledged alert matches nobody
+        step = {"action": SOS_ESCALATION_ACTIONS[level], "at": now}
+        alert = await db.sos_alerts.find_one_and_update(
+            {"id": alert_id, "is_active": True, "escalation_level": level, "due_at": {"$lte": now}},
+            {"$set": {"escalation_level": level + 1, "due_at": next_due}, "$push": {"escalations": step}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not alert:
+            return
+        alert.update(escalation_level=level + 1, due_at=next_due, escalations=[*alert.get("escalations", []), step])
+        
+        try:
+            await self.perform(SOS_ESCALATION_ACTIONS[level], alert)
+        except Exception:
+            logger.exception(f"SOS escalation {SOS_ESCALATION_ACTIONS[level]} for {alert_id} failed")
+        event_bus.emit("sos_alerts", "update", alert_id, alert, ["escalation_level", "due_at", "escalations"])
+        await bump_versions(alert["user_id"], "sos")
+        if next_due:
+            self.schedule(alert_id, next_due, level + 1)
+
+    async def perform(self, action: str, alert: dict):
+        user = await db.users.find_one({"id": alert["user_id"]}, {"_id": 0, "name": 1, "emergency_contacts": 1})
+        name = user["name"] if user else alert["user_id"]
+        # In production, send SMS/push notifications here
+        if action == "renotify_contacts":
+            contacts = user.get("emergency_contacts", []) if user else []
+            logger.warning(f"SOS from {name} unacknowledged, re-notifying {len(contacts)} emergency contacts")
+        else:
+            moderators = await db.users.count_documents({"role": {"$in": ["admin", "moderator"]}})
+            logger.warning(f"SOS from {name} still unacknowledged, notifying {moderators} moderators")
+
+escalations = EscalationScheduler()
+event_bus.subscribe(["sos_alerts"], escalations.on_event)
 
 # SOS Routes
 @api_router.post("/sos")
-async def trigger_sos(sos_data: SOSCreate, current_user: dict = Depends(get_current_user)):
-    # Create SOS alert
-    alert = SOSAlert(
-        user_id=current_user["user_id"],
-        latitude=sos_data.latitude,
-        longitude=sos_data.longitude,
-        notes=sos_data.notes
-    )
-    
-    alert_dict = alert.model_dump()
-    alert_dict['timestamp'] = alert_dict['timestamp'].isoformat()
-    await db.sos_alerts.insert_one(alert_dict)
-    
-    # Get emergency contacts
-    user = await db.users.find_one({"id": current_user["user_id"]})
-    emergency_contacts = user.get("emergency_contacts", [])
-    
-    # In production, send SMS/push notifications here
-    # For now, we'll just log it
-    logger.info(f"SOS triggered by {user['name']} at {sos_data.latitude}, {sos_data.longitude}")
-    logger.info(f"Emergency contacts: {emergency_contacts}")
+async def trigger_sos(
+    sos_data: SOSCreate,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    async def create_alert():
+        # Get emergency contacts before writing anything, so a deleted user leaves no alert for escalation to fire;
+        # the projection keeps the rest of the user document off the SOS path
+        user = await db.users.find_one({"id": current_user["user_id"]}, {"_id": 0, "name": 1, "emergency_contacts": 1})
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        emergency_contacts = user.get("emergency_contacts", [])
+        
+        # Create SOS alert
+        alert = SOSAlert(
+            user_id=current_user["user_id"],
+            latitude=sos_data.latitude,
+            longitude=sos_data.longitude,
+            notes=sos_data.notes
+        )
+        alert.due_at = escalation_due(alert.timestamp, 0)
+        
+        alert_dict = alert.model_dump()
+        await db.sos_alerts.insert_one(alert_dict)
+        event_bus.emit("sos_alerts", "insert", alert.id, alert.model_dump())
+        await bump_versions(current_user["user_id"], "sos")
+        
+        # In production, send SMS/push notifications here
+        # For now, we'll just log it
+        logger.info(f"SOS triggered by {user['name']} at {sos_data.latitude}, {sos_data.longitude}")
+        logger.info(f"Emergency contacts: {emergency_contacts}")
+        
+        return {"message": "SOS alert triggered", "alert_id": alert.id, "contacts_notified": len(emergency_contacts)}
     
-    return {"message": "SOS alert triggered", "alert_id": alert.id, "contacts_notified": len(emergency_contacts)}
+    fingerprint = request_fingerprint(sos_data.model_dump_json())
+    return await run_idempotent("sos", current_user["user_id"], idempotency_key, fingerprint, create_alert)
 
 @api_router.get("/sos")
 async def get_active_sos(current_user: dict = Depends(get_current_user)):
     alerts = await db.sos_alerts.find({"user_id": current_user["user_id"], "is_active": True}, {"_id": 0}).to_list(100)
     return alerts
 
+def sos_deactivation() -> dict:
+    # expires_at drives the TTL index on sos_alerts; it is only ever set on inactive alerts
+    # due_at is cleared so no escalation fires for an alert the user has ended
+    return {"is_active": False, "due_at": None, "expires_at": datetime.now(timezone.utc) + timedelta(days=SOS_ALERT_RETENTION_DAYS)}
+
 @api_router.post("/sos/{alert_id}/deactivate")
 async def deactivate_sos(alert_id: str, current_user: dict = Depends(get_current_user)):
-    await db.sos_alerts.update_one(
+    result = await db.sos_alerts.update_one(
         {"id": alert_id, "user_id": current_user["user_id"]},
-        {"$set": {"is_active": False}}
+        {"$set": sos_deactivation()}
     )
+    if result.modified_count:
+        event_bus.emit("sos_alerts", "update", alert_id, updated_fields=["is_active", "due_at", "expires_at"])
+        await bump_versions(current_user["user_id"], "sos")
     return {"message": "SOS alert deactivated"}
 
 # Incident Reporting Routes
-@api_router.post("/incidents")
-async def create_incident(incident_data: IncidentCreate, current_user: dict = Depends(get_current_user)):
+def build_incident_document(incident_data: IncidentCreate, user_id: str) -> dict:
     incident = IncidentReport(
-        user_id=current_user["user_id"] if not incident_data.is_anonymous else "anonymous",
+        user_id=user_id if not incident_data.is_anonymous else "anonymous",
         incident_type=incident_data.incident_type,
         description=incident_data.description,
         location=incident_data.location,
@@ -397,47 +2008,290 @@ async def create_incident(incident_data: IncidentCreate, current_user: dict = De
     )
     
     incident_dict = incident.model_dump()
-    incident_dict['created_at'] = incident_dict['created_at'].isoformat()
-    incident_dict['updated_at'] = incident_dict['updated_at'].isoformat()
-    await db.incidents.insert_one(incident_dict)
+    return incident_dict
+
+@api_router.post("/incidents")
+async def create_incident(
+    incident_data: IncidentCreate,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    async def insert_incident():
+        incident_dict = build_incident_document(incident_data, current_user["user_id"])
+        await db.incidents.insert_one(incident_dict)
+        event_bus.emit("incidents", "insert", incident_dict["id"])
+        await bump_versions(incident_dict["user_id"], "incidents")
+        
+        return {"message": "Incident reported successfully", "incident_id": incident_dict["id"]}
     
-    return {"message": "Incident reported successfully", "incident_id": incident.id}
+    fingerprint = request_fingerprint(incident_data.model_dump_json())
+    return await run_idempotent("incident", current_user["user_id"], idempotency_key, fingerprint, insert_incident)
 
-@api_router.post("/incidents/{incident_id}/evidence")
-async def upload_evidence(incident_id: str, file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
+async def get_incident_for_upload(incident_id: str, current_user: dict) -> dict:
     # Verify incident ownership
-    incident = await db.incidents.find_one({"id": incident_id})
+    incident = await db.incidents.find_one({"id": incident_id}, {"_id": 0, "id": 1, "user_id": 1})
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
     if incident["user_id"] != current_user["user_id"] and incident["user_id"] != "anonymous":
         raise HTTPException(status_code=403, detail="Access denied")
+    return incident
+
+async def process_evidence(incident_id: str, file_id: str, file_path: Path, content_type: Optional[str]):
+    """Background step after upload: strip image metadata, build thumbnails, record what we learned."""
+    try:
+        info = await run_cpu_bound(process_evidence_image, str(file_path), file_id, THUMBNAIL_SIZES)
+        size = await asyncio.to_thread(evidence_size, file_path)
+    except Exception:
+        logger.exception(f"Processing evidence {file_id} failed")
+        return
     
-    # Save file
-    file_id = str(uuid.uuid4())
-    file_extension = Path(file.filename).suffix
-    file_path = UPLOAD_DIR / f"{file_id}{file_extension}"
+    meta = {"file_id": file_id, "mime_type": content_type, "size_bytes": size}
+    meta.update(info or {})
+    meta["processed_at"] = datetime.now(timezone.utc)
+    incident = await db.incidents.find_one_and_update(
+        {"id": incident_id}, {"$push": {"evidence_meta": meta}}, projection={"_id": 0, "user_id": 1}
+    )
+    if incident:
+        await bump_versions(incident["user_id"], "incidents")
+
+@api_router.post("/incidents/{incident_id}/evidence")
+async def upload_evidence(
+    incident_id: str,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    incident = await get_incident_for_upload(incident_id, current_user)
+    
+    async def save_evidence():
+        # Save file
+        file_id = str(uuid.uuid4())
+        file_extension = Path(file.filename).suffix
+        file_path = UPLOAD_DIR / f"{file_id}{file_extension}"
+        
+        await asyncio.to_thread(store_evidence, file.file, file_path)
+        
+        # Update incident
+        await db.incidents.update_one(
+            {"id": incident_id},
+            {"$push": {"evidence_files": str(file_path)}}
+        )
+        await bump_versions(incident["user_id"], "incidents")
+        background_tasks.add_task(process_evidence, incident_id, file_id, file_path, file.content_type)
+        
+        return {"message": "Evidence uploaded", "file_id": file_id}
     
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    fingerprint = request_fingerprint(incident_id, file.filename, file.size)
+    return await run_idempotent("evidence", current_user["user_id"], idempotency_key, fingerprint, save_evidence)
+
+# Resumable Evidence Upload Routes
+def upload_session_progress(session: dict) -> dict:
+    received = sorted(session["received"])
+    received_set = set(received)
+    contiguous = 0
+    while contiguous in received_set:
+        contiguous += 1
     
-    # Update incident
-    await db.incidents.update_one(
-        {"id": incident_id},
-        {"$push": {"evidence_files": str(file_path)}}
+    return {
+        "upload_id": session["id"],
+        "status": session["status"],
+        "chunk_size": session["chunk_size"],
+        "total_chunks": session["total_chunks"],
+        "received_chunks": received,
+        "missing_chunks": [i for i in range(session["total_chunks"]) if i not in received_set],
+        # Bytes the client can treat as durably stored from the start of the file
+        "offset": min(contiguous * session["chunk_size"], session["size"])
+    }
+
+def chunk_context(session_dir: Path, index: int) -> str:
+    # Parts share names across sessions, so their keys are bound to the upload id as well
+    return f"{session_dir.name}/{index}.part"
+
+def assemble_upload(session_dir: Path, total_chunks: int, target: Path) -> str:
+    """Concatenate chunk files into `target` with a fixed-size buffer. Runs in a thread; returns the SHA-256."""
+    digest = hashlib.sha256()
+    with EvidenceWriter(target) as out:
+        for index in range(total_chunks):
+            with EvidenceReader(session_dir / f"{index}.part", context=chunk_context(session_dir, index)) as part:
+                while block := part.read(UPLOAD_COPY_BUFFER):
+                    digest.update(block)
+                    out.write(block)
+    return digest.hexdigest()
+
+async def get_upload_session(upload_id: str, current_user: dict) -> dict:
+    session = await db.upload_sessions.find_one({"id": upload_id, "user_id": current_user["user_id"]}, {"_id": 0})
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+@api_router.post("/incidents/{incident_id}/evidence/uploads")
+async def create_upload_session(incident_id: str, upload: UploadSessionCreate, current_user: dict = Depends(get_current_user)):
+    await get_incident_for_upload(incident_id, current_user)
+    
+    if upload.size > MAX_EVIDENCE_SIZE:
+        raise HTTPException(status_code=413, detail="File too large")
+    chunk_size = upload.chunk_size or UPLOAD_CHUNK_SIZE
+    if not UPLOAD_MIN_CHUNK_SIZE <= chunk_size <= UPLOAD_MAX_CHUNK_SIZE:
+        raise HTTPException(status_code=400, detail=f"chunk_size must be between {UPLOAD_MIN_CHUNK_SIZE} and {UPLOAD_MAX_CHUNK_SIZE} bytes")
+    
+    now = datetime.now(timezone.utc)
+    session = {
+        "id": str(uuid.uuid4()),
+        "incident_id": incident_id,
+        "user_id": current_user["user_id"],
+        "filename": upload.filename,
+        "content_type": upload.content_type,
+        "size": upload.size,
+        "sha256": upload.sha256.lower() if upload.sha256 else None,
+        "chunk_size": chunk_size,
+        "total_chunks": -(-upload.size // chunk_size),
+        "received": [],
+        "status": "open",
+        "created_at": now,
+        "expires_at": now + timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+    }
+    (UPLOAD_SESSION_DIR / session["id"]).mkdir()
+    await db.upload_sessions.insert_one(session)
+    
+    return upload_session_progress(session)
+
+@api_router.put("/uploads/{upload_id}/chunks/{index}")
+async def upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    chunk_sha256: str = Header(..., alias="Content-SHA256"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Store one chunk. Chunks are independent files, so clients may send them in parallel and in any order."""
+    session = await get_upload_session(upload_id, current_user)
+    if session["status"] != "open":
+        raise HTTPException(status_code=409, detail="Upload is no longer accepting chunks")
+    if not 0 <= index < session["total_chunks"]:
+        raise HTTPException(status_code=400, detail="Chunk index out of range")
+    
+    expected_size = min(session["chunk_size"], session["size"] - index * session["chunk_size"])
+    session_dir = UPLOAD_SESSION_DIR / upload_id
+    tmp_path = session_dir / f"{index}.part.{uuid.uuid4().hex}"
+    digest = hashlib.sha256()
+    # Parts are evidence too, so they are encrypted on the way to disk like the assembled file
+    encryptor = EvidenceEncryptor(chunk_context(session_dir, index))
+    received = 0
+    try:
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            async for block in request.stream():
+                received += len(block)
+                if received > expected_size:
+                    raise HTTPException(status_code=400, detail="Chunk is larger than expected")
+                digest.update(block)
+                await f.write(encryptor.update(block))
+            await f.write(encryptor.finalize())
+        if received != expected_size:
+            raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected_size} bytes")
+        if digest.hexdigest() != chunk_sha256.lower():
+            raise HTTPException(status_code=400, detail="Chunk checksum mismatch")
+        os.replace(tmp_path, session_dir / f"{index}.part")
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    
+    await db.upload_sessions.update_one({"id": upload_id}, {"$addToSet": {"received": index}})
+    return {"index": index, "size": received}
+
+@api_router.get("/uploads/{upload_id}")
+async def get_upload_status(upload_id: str, current_user: dict = Depends(get_current_user)):
+    session = await get_upload_session(upload_id, current_user)
+    return upload_session_progress(session)
+
+@api_router.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
+    session = await get_upload_session(upload_id, current_user)
+    if session["status"] == "completed":
+        return {"message": "Evidence uploaded", "file_id": session["file_id"]}
+    
+    missing = upload_session_progress(session)["missing_chunks"]
+    if missing:
+        raise HTTPException(status_code=409, detail={"message": "Upload is incomplete", "missing_chunks": missing})
+    
+    # Claim the session so concurrent completion calls do not assemble twice
+    claimed = await db.upload_sessions.find_one_and_update(
+        {"id": upload_id, "status": "open"},
+        {"$set": {"status": "assembling"}}
     )
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Upload is already being completed")
+    
+    file_id = str(uuid.uuid4())
+    file_path = UPLOAD_DIR / f"{file_id}{Path(session['filename']).suffix}"
+    session_dir = UPLOAD_SESSION_DIR / upload_id
+    try:
+        checksum = await asyncio.to_thread(assemble_upload, session_dir, session["total_chunks"], file_path)
+        if session["sha256"] and checksum != session["sha256"]:
+            raise HTTPException(status_code=400, detail="File checksum mismatch")
+    except EvidenceIntegrityError:
+        file_path.unlink(missing_ok=True)
+        logger.exception(f"Upload {upload_id} has a damaged chunk")
+        # The stored part cannot be trusted; drop it so the client resends it
+        await db.upload_sessions.update_one({"id": upload_id}, {"$set": {"status": "open", "received": []}})
+        raise HTTPException(status_code=409, detail="Stored chunks failed verification, please upload them again")
+    except BaseException:
+        file_path.unlink(missing_ok=True)
+        await db.upload_sessions.update_one({"id": upload_id}, {"$set": {"status": "open"}})
+        raise
+    
+    incident = await db.incidents.find_one_and_update(
+        {"id": session["incident_id"]},
+        {"$push": {"evidence_files": str(file_path)}},
+        projection={"_id": 0, "user_id": 1}
+    )
+    if incident:
+        await bump_versions(incident["user_id"], "incidents")
+    await db.upload_sessions.update_one(
+        {"id": upload_id},
+        {"$set": {"status": "completed", "file_id": file_id, "sha256": checksum}}
+    )
+    await asyncio.to_thread(shutil.rmtree, session_dir, True)
+    background_tasks.add_task(process_evidence, session["incident_id"], file_id, file_path, session["content_type"])
     
     return {"message": "Evidence uploaded", "file_id": file_id}
 
+@api_router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str, current_user: dict = Depends(get_current_user)):
+    session = await get_upload_session(upload_id, current_user)
+    if session["status"] != "completed":
+        await db.upload_sessions.delete_one({"id": upload_id, "status": {"$ne": "completed"}})
+        await asyncio.to_thread(shutil.rmtree, UPLOAD_SESSION_DIR / upload_id, True)
+    return {"message": "Upload aborted"}
+
+async def collect_abandoned_uploads():
+    """Delete expired upload sessions and any chunk directory without a live session."""
+    now = datetime.now(timezone.utc)
+    await db.upload_sessions.delete_many({"expires_at": {"$lt": now}})
+    live = set(await db.upload_sessions.distinct("id", {"status": {"$ne": "completed"}}))
+    cutoff = time.time() - 3600  # leave directories of sessions still being created alone
+    for session_dir in UPLOAD_SESSION_DIR.iterdir():
+        if session_dir.name not in live and session_dir.stat().st_mtime < cutoff:
+            await asyncio.to_thread(shutil.rmtree, session_dir, True)
+            logger.info(f"Removed abandoned upload {session_dir.name}")
+
 @api_router.get("/incidents")
 async def get_incidents(current_user: dict = Depends(get_current_user)):
-    incidents = await db.incidents.find({"user_id": current_user["user_id"]}, {"_id": 0}).to_list(100)
+    # Closed cases moved to the archive are still the owner's; they are listed after the open ones
+    owner = {"user_id": current_user["user_id"]}
+    incidents = await db.incidents.find(owner, {"_id": 0}).to_list(100)
+    if len(incidents) < 100:
+        # $nin skips a case caught between the archive copy and the delete
+        live_ids = [incident["id"] for incident in incidents]
+        incidents += await db.incidents_archive.find({**owner, "id": {"$nin": live_ids}}, {"_id": 0}).to_list(100 - len(incidents))
     return incidents
 
 @api_router.get("/incidents/{incident_id}")
 async def get_incident(incident_id: str, current_user: dict = Depends(get_current_user)):
     incident = await db.incidents.find_one({"id": incident_id}, {"_id": 0})
+    if not incident:
+        incident = await db.incidents_archive.find_one({"id": incident_id}, {"_id": 0})
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
@@ -446,10 +2300,486 @@ async def get_incident(incident_id: str, current_user: dict = Depends(get_curren
     
     return incident
 
+def parse_range(range_header: str, size: int) -> tuple:
+    """(start, end) of a single "bytes=" range, inclusive; raises 416 if it cannot be served."""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if match and match.group(1):
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    elif match and match.group(2):
+        start, end = max(0, size - int(match.group(2))), size - 1
+    else:
+        start, end = size, -1
+    if start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+@api_router.get("/incidents/{incident_id}/evidence/{file_id}")
+async def download_evidence(
+    incident_id: str,
+    file_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream one evidence file, decrypted a chunk at a time; a single byte range is honoured for media players."""
+    projection = {"_id": 0, "user_id": 1, "evidence_files": 1, "evidence_meta": {"$elemMatch": {"file_id": file_id}}}
+    incident = await db.incidents.find_one({"id": incident_id}, projection)
+    if not incident:
+        incident = await db.incidents_archive.find_one({"id": incident_id}, projection)
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    
+    if incident["user_id"] != current_user["user_id"] and current_user["role"] not in ["admin", "moderator"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    path = next((Path(stored) for stored in incident.get("evidence_files", []) if isinstance(stored, str) and Path(stored).stem == file_id), None)
+    if not path or not path.exists():
+        raise HTTPException(status_code=404, detail="Evidence not found")
+    try:
+        # Opening unwraps the data key, so a wrong master key or damaged header fails before any byte is sent
+        with await asyncio.to_thread(EvidenceReader, path) as reader:
+            size = reader.size
+    except EvidenceIntegrityError:
+        logger.exception(f"Evidence {file_id} failed verification")
+        raise HTTPException(status_code=500, detail="Evidence file failed verification")
+    
+    start, end, status_code = 0, size - 1, 200
+    headers = {"Accept-Ranges": "bytes", "Content-Disposition": f'attachment; filename="{path.name}"'}
+    if range_header and size:
+        start, end = parse_range(range_header, size)
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    media_type = (incident.get("evidence_meta") or [{}])[0].get("mime_type") or "application/octet-stream"
+    return StreamingResponse(iter_evidence(path, start, end), status_code=status_code, media_type=media_type, headers=headers)
+
+# Route risk scoring
+EARTH_RADIUS_M = 6378137.0
+RISK_TYPES = [incident_type.value for incident_type in IncidentType]
+
+def mercator_cells(lats, lngs, cell_m: float):
+    """Web Mercator grid cell of each point; a cell is `cell_m` wide at the equator and cos(latitude) times that elsewhere."""
+    lats = np.radians(np.clip(np.asarray(lats, dtype=np.float64), -85.0, 85.0))
+    x = np.radians(np.asarray(lngs, dtype=np.float64)) * EARTH_RADIUS_M
+    y = np.log(np.tan(np.pi / 4 + lats / 2)) * EARTH_RADIUS_M
+    return np.floor(x / cell_m).astype(np.int64), np.floor(y / cell_m).astype(np.int64)
+
+def gaussian_taps(sigma: float) -> np.ndarray:
+    """Normalized Gaussian kernel out to three sigma, float32 so smoothing keeps tiles in float32."""
+    radius = max(1, math.ceil(3 * sigma))
+    offsets = np.arange(-radius, radius + 1)
+    taps = np.exp(-0.5 * (offsets / max(sigma, 1e-6)) ** 2)
+    return (taps / taps.sum()).astype(np.float32)
+
+class RiskTile(NamedTuple):
+    """Density of one tile, stored only for the incident types that occur near it."""
+    types: np.ndarray    # int8 indexes into RISK_TYPES
+    density: np.ndarray  # float16[len(types), RISK_HOUR_BANDS, y, x]
+    incidents: int       # incidents that contributed, used to decide which tiles to drop first
+
+def merge_risk_tiles(first: RiskTile, second: RiskTile) -> RiskTile:
+    types = np.union1d(first.types, second.types).astype(np.int8)
+    density = np.zeros((len(types),) + first.density.shape[1:], dtype=np.float32)
+    for tile in (first, second):
+        density[np.searchsorted(types, tile.types)] += tile.density
+    return RiskTile(types, density.astype(np.float16), first.incidents + second.incidents)
+
+def build_risk_tiles(lats, lngs, types, hours, cell_m: float, bandwidth_m: float, hour_bandwidth: float, tile_cells: int) -> dict:
+    """Kernel density of incidents as {(tile_x, tile_y): RiskTile}.
+    
+    Each tile is histogrammed with a halo as wide as the kernel, so points just outside it still
+    contribute, then smoothed with separable Gaussians: circularly over the 24 hours, then along y and x.
+    The hours are averaged into RISK_HOUR_BANDS bands and only types with incidents nearby are kept,
+    in float16. Densities add up, so tiles built from new incidents can be merged into existing ones.
+    """
+    spatial = gaussian_taps(bandwidth_m / cell_m)
+    hourly = gaussian_taps(hour_bandwidth)
+    radius, hour_radius = len(spatial) // 2, len(hourly) // 2
+    ix, iy = mercator_cells(lats, lngs, cell_m)
+    
+    # Every (point, tile) pair where the tile's haloed extent contains the point
+    first_x, first_y = (ix - radius) // tile_cells, (iy - radius) // tile_cells
+    last_x, last_y = (ix + radius) // tile_cells, (iy + radius) // tile_cells
+    span = 2 * radius // tile_cells + 2
+    pairs = []
+    for dx in range(span):
+        for dy in range(span):
+            points = np.nonzero((first_x + dx <= last_x) & (first_y + dy <= last_y))[0]
+            pairs.append(np.stack([points, first_x[points] + dx, first_y[points] + dy], axis=1))
+    pairs = np.concatenate(pairs)
+    pairs = pairs[np.lexsort((pairs[:, 2], pairs[:, 1]))]
+    boundaries = np.nonzero(np.any(np.diff(pairs[:, 1:], axis=0), axis=1))[0] + 1
+    
+    tiles = {}
+    for group in np.split(pairs, boundaries):
+        if not len(group):
+            continue
+        tile_x, tile_y, points = int(group[0, 1]), int(group[0, 2]), group[:, 0]
+        hist = np.zeros((len(RISK_TYPES), 24, tile_cells + 2 * radius, tile_cells + 2 * radius), dtype=np.float32)
+        np.add.at(hist, (
+            types[points], hours[points],
+            iy[points] - tile_y * tile_cells + radius, ix[points] - tile_x * tile_cells + radius
+        ), 1.0)
+        density = sum(weight * np.roll(hist, hour_radius - offset, axis=1) for offset, weight in enumerate(hourly))
+        density = sum(weight * density[:, :, offset:offset + tile_cells, :] for offset, weight in enumerate(spatial))
+        density = sum(weight * density[:, :, :, offset:offset + tile_cells] for offset, weight in enumerate(spatial))
+        density = density.reshape(len(RISK_TYPES), RISK_HOUR_BANDS, 24 // RISK_HOUR_BANDS, tile_cells, tile_cells).mean(axis=2)
+        present = np.unique(types[points]).astype(np.int8)
+        tiles[(tile_x, tile_y)] = RiskTile(present, density[present].astype(np.float16), len(points))
+    return tiles
+
+def hour_band(hour: int) -> int:
+    return hour * RISK_HOUR_BANDS // 24
+
+def local_hour(timestamp: datetime, longitude: float) -> int:
+    # Solar time from longitude: close enough to the local clock for hour-of-day patterns, with no timezone lookup
+    return (timestamp.hour + round(longitude / 15)) % 24
+
+def risk_weights(incident_types: Optional[List[IncidentType]]) -> np.ndarray:
+    selected = {incident_type.value for incident_type in incident_types} if incident_types else set(RISK_TYPES)
+    return np.array([RISK_TYPE_WEIGHTS.get(name, 1.0) if name in selected else 0.0 for name in RISK_TYPES], dtype=np.float32)
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = (np.radians(value) for value in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+def risk_level(score: float) -> str:
+    return "high" if score >= 0.66 else "moderate" if score >= 0.33 else "low"
+
+class RiskGrid:
+    """Kernel-density grid of incidents by type and local hour band, held in memory as sparse Mercator tiles.
+    
+    refresh() runs in the background. Every RISK_FULL_REBUILD_HOURS it rebuilds from scratch, which
+    also drops incidents older than RISK_LOOKBACK_DAYS; in between it only splats incidents created
+    since the previous pass onto the existing tiles. Past RISK_MAX_GRID_MB the tiles with the fewest
+    incidents are dropped (they score as zero). Queries are array lookups and never touch Mongo.
+    """
+
+    def __init__(self):
+        self.tiles = {}
+        self.reference = np.ones(RISK_HOUR_BANDS, dtype=np.float32)
+        self.incidents = 0
+        self.built_at = None
+        self.full_built_at = None
+        self.watermark = None
+        self.recent_ids = {}  # id -> created_at of incidents inside the overlap window, so none is counted twice
+
+    async def load_points(self, since: datetime, collections, skip_ids) -> dict:
+        query = {"latitude": {"$type": "number"}, "longitude": {"$type": "number"}, "created_at": {"$gte": since}}
+        projection = {"_id": 0, "id": 1, "incident_type": 1, "latitude": 1, "longitude": 1, "created_at": 1}
+        points = {"ids": [], "created": [], "lats": [], "lngs": [], "types": [], "hours": []}
+        for collection in collections:
+            async for incident in collection.find(query, projection).batch_size(5000):
+                if incident["id"] in skip_ids or incident.get("incident_type") not in RISK_TYPES:
+                    continue
+                created_at = parse_timestamp(incident["created_at"])
+                points["ids"].append(incident["id"])
+                points["created"].append(created_at)
+                points["lats"].append(incident["latitude"])
+                points["lngs"].append(incident["longitude"])
+                points["types"].append(RISK_TYPES.index(incident["incident_type"]))
+                points["hours"].append(local_hour(created_at, incident["longitude"]))
+        return points
+
+    async def refresh(self):
+        now = datetime.now(timezone.utc)
+        full = not self.full_built_at or now - self.full_built_at >= timedelta(hours=RISK_FULL_REBUILD_HOURS)
+        if full:
+            since = now - timedelta(days=RISK_LOOKBACK_DAYS)
+            points = await self.load_points(since, [analytics_db.incidents, analytics_db.incidents_archive], {})
+        else:
+            # Overlap the previous pass so an insert that committed late is still picked up
+            since = self.watermark - timedelta(seconds=RISK_REFRESH_OVERLAP)
+            points = await self.load_points(since, [analytics_db.incidents], self.recent_ids)
+        
+        tiles = {}
+        if points["ids"]:
+            tiles = await run_cpu_bound(
+                build_risk_tiles,
+                np.array(points["lats"]), np.array(points["lngs"]),
+                np.array(points["types"], dtype=np.int64), np.array(points["hours"], dtype=np.int64),
+                RISK_CELL_METERS, RISK_BANDWIDTH_METERS, RISK_HOUR_BANDWIDTH, RISK_TILE_CELLS
+            )
+        
+        if full:
+            self.tiles, self.incidents, self.recent_ids, self.full_built_at = self.within_budget(tiles), len(points["ids"]), {}, now
+        else:
+            for key, tile in tiles.items():
+                self.tiles[key] = merge_risk_tiles(self.tiles[key], tile) if key in self.tiles else tile
+            self.tiles = self.within_budget(self.tiles)
+            self.incidents += len(points["ids"])
+        
+        window_start = now - timedelta(seconds=2 * RISK_REFRESH_OVERLAP)
+        self.recent_ids.update(zip(points["ids"], points["created"]))
+        self.recent_ids = {incident_id: created for incident_id, created in self.recent_ids.items() if created >= window_start}
+        self.watermark = now
+        if full or tiles:
+            self.reference = await asyncio.to_thread(self.reference_levels)
+        self.built_at = now
+        if full or points["ids"]:
+            logger.info(f"Risk grid {'rebuilt' if full else 'updated'}: {len(points['ids'])} incidents, {len(self.tiles)} tiles")
+
+    @staticmethod
+    def within_budget(tiles: dict) -> dict:
+        budget, used, kept = RISK_MAX_GRID_MB * 2**20, 0, {}
+        for key, tile in sorted(tiles.items(), key=lambda item: item[1].incidents, reverse=True):
+            used += tile.density.nbytes
+            if used > budget:
+                logger.warning(f"Risk grid over RISK_MAX_GRID_MB: dropped {len(tiles) - len(kept)} of {len(tiles)} tiles with the fewest incidents")
+                break
+            kept[key] = tile
+        return kept
+
+    def reference_levels(self) -> np.ndarray:
+        """Per-band 99th percentile of the default-weighted density over occupied cells; a score of 1 means that level."""
+        reference = np.ones(RISK_HOUR_BANDS, dtype=np.float32)
+        if not self.tiles:
+            return reference
+        weights = risk_weights(None)
+        # Only occupied cells are collected, in float16, so this never needs more memory than the grid itself
+        occupied = [[] for _ in range(RISK_HOUR_BANDS)]
+        for tile in list(self.tiles.values()):
+            layer = np.tensordot(weights[tile.types], tile.density.astype(np.float32), axes=1)
+            for band in range(RISK_HOUR_BANDS):
+                values = layer[band]
+                occupied[band].append(values[values > 1e-6].astype(np.float16))
+        for band, values in enumerate(occupied):
+            values = np.concatenate(values)
+            if len(values):
+                reference[band] = np.percentile(values.astype(np.float32), 99)
+        return reference
+
+    def density(self, lats, lngs, hour: int, weights: np.ndarray) -> np.ndarray:
+        ix, iy = mercator_cells(lats, lngs, RISK_CELL_METERS)
+        tile_x, tile_y = ix // RISK_TILE_CELLS, iy // RISK_TILE_CELLS
+        values = np.zeros(len(ix), dtype=np.float32)
+        keys, inverse = np.unique(np.stack([tile_x, tile_y], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        for index, (key_x, key_y) in enumerate(keys):
+            tile = self.tiles.get((int(key_x), int(key_y)))
+            if tile is None:
+                continue
+            in_tile = inverse == index
+            layer = np.tensordot(weights[tile.types], tile.density[:, hour_band(hour)].astype(np.float32), axes=1)
+            values[in_tile] = layer[iy[in_tile] - key_y * RISK_TILE_CELLS, ix[in_tile] - key_x * RISK_TILE_CELLS]
+        return values
+
+risk_grid = RiskGrid()
+
+@api_router.post("/routes/risk")
+async def score_route(route: RouteRiskRequest, current_user: dict = Depends(get_current_user)):
+    """Risk per polyline segment from the incident density grid: one vectorized pass over sample points, no queries."""
+    if not risk_grid.built_at:
+        raise HTTPException(status_code=503, detail="Risk grid is still being built, try again shortly")
+    
+    points = np.array(route.points, dtype=np.float64)
+    hour = route.hour if route.hour is not None else local_hour(datetime.now(timezone.utc), points[0, 1])
+    lengths = haversine_m(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1])
+    
+    # Sample every half cell along each segment, coarser for very long routes so work stays bounded
+    step = max(RISK_CELL_METERS / 2, lengths.sum() / RISK_MAX_SAMPLES)
+    counts = np.maximum(1, np.ceil(lengths / step).astype(np.int64)) + 1
+    segment = np.repeat(np.arange(len(lengths)), counts)
+    fraction = (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)) / np.repeat(counts - 1, counts)
+    lats = points[segment, 0] + fraction * (points[segment + 1, 0] - points[segment, 0])
+    lngs = points[segment, 1] + fraction * (points[segment + 1, 1] - points[segment, 1])
+    
+    scores = risk_grid.density(lats, lngs, hour, risk_weights(route.incident_types)) / risk_grid.reference[hour_band(hour)]
+    mean = np.bincount(segment, weights=scores) / counts
+    peak = np.full(len(lengths), 0.0)
+    np.maximum.at(peak, segment, scores)
+    mean, peak = np.minimum(mean, 1.0), np.minimum(peak, 1.0)
+    
+    total = float(lengths.sum())
+    route_score = float((mean * lengths).sum() / total) if total else float(mean.mean())
+    return {
+        "hour": hour,
+        "segments": [
+            {
+                "start": route.points[index], "end": route.points[index + 1],
+                "length_m": round(float(lengths[index]), 1),
+                "score": round(float(mean[index]), 3), "peak": round(float(peak[index]), 3),
+                "level": risk_level(mean[index])
+            }
+            for index in range(len(lengths))
+        ],
+        "route": {"length_m": round(total, 1), "score": round(route_score, 3), "peak": round(float(peak.max()), 3), "level": risk_level(route_score)},
+        "grid": {"incidents": risk_grid.incidents, "built_at": risk_grid.built_at}
+    }
+
+# Content moderation
+class AhoCorasick:
+    """Aho-Corasick automaton: finds every occurrence of every term in one pass over the text."""
+
+    def __init__(self, terms: dict):
+        # terms: lowercase term -> category
+        self.terms = list(terms.items())
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        
+        for term_id, (term, _) in enumerate(self.terms):
+            node = 0
+            for char in term:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.output[node].append(term_id)
+        
+        # Breadth-first failure links; each node inherits the outputs of its failure node
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0) if node else 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def search(self, text: str):
+        """Yield (start, end, term, category) for each match in `text` (expected lowercase)."""
+        goto, fail, output, terms = self.goto, self.fail, self.output, self.terms
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for term_id in output[node]:
+                term, category = terms[term_id]
+                yield end - len(term), end, term, category
+
+PHONE_SEPARATORS = set(" -.()/")
+# Dates inside a digit run ("12/03/2024 10:30", "2024-03-12") are cut out before counting digits
+DATE_PATTERN = re.compile(
+    r"(?<!\d)(?:(\d{1,2})/(\d{1,2})/(?:\d{4}|\d{2})|(\d{1,2})([.-])(\d{1,2})\4\d{4}|\d{4}([/.-])(\d{1,2})\6(\d{1,2}))(?!\d)"
+)
+
+def is_date(match: re.Match) -> bool:
+    groups = [int(group) for group in match.group(1, 2, 3, 5, 7, 8) if group]
+    return all(1 <= value <= 31 for value in groups) and min(groups) <= 12
+
+def find_phone_numbers(text: str):
+    """Yield (start, end) of digit runs that look like phone numbers (10-15 digits, common separators)."""
+    start, last_digit = None, None
+    for i, char in enumerate(text + "\0"):
+        if char.isdigit():
+            if start is None:
+                start = i - 1 if i and text[i - 1] == "+" else i
+            last_digit = i
+        elif start is not None and char in PHONE_SEPARATORS:
+            continue
+        elif start is not None:
+            run, piece_start = text[start:last_digit + 1], 0
+            for date in DATE_PATTERN.finditer(run):
+                if is_date(date):
+                    yield from phone_piece(run, start, piece_start, date.start())
+                    piece_start = date.end()
+            yield from phone_piece(run, start, piece_start, len(run))
+            start = None
+
+def phone_piece(run: str, offset: int, begin: int, end: int):
+    digits = [i for i in range(begin, end) if run[i].isdigit()]
+    if 10 <= len(digits) <= 15:
+        first = digits[0] - 1 if digits[0] > begin and run[digits[0] - 1] == "+" else digits[0]
+        yield offset + first, offset + digits[-1] + 1
+
+def find_emails(text: str):
+    """Yield (start, end) around each '@' that has a plausible local part and dotted domain."""
+    at = text.find("@")
+    while at != -1:
+        left = at
+        while left and (text[left - 1].isalnum() or text[left - 1] in "._%+-"):
+            left -= 1
+        right = at + 1
+        while right < len(text) and (text[right].isalnum() or text[right] in ".-"):
+            right += 1
+        domain = text[at + 1:right].rstrip(".")
+        if left < at and "." in domain:
+            yield left, at + 1 + len(domain)
+        at = text.find("@", right)
+
+class ModerationEngine:
+    """Scans forum content against the configured term list. `reload()` swaps in a new automaton atomically."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.mtime = None
+        self.automaton = AhoCorasick({})
+        self.severity = {}
+        self.detect_phone_numbers = False
+        self.detect_emails = False
+
+    def reload(self):
+        with open(self.path) as f:
+            config = json.load(f)
+        terms, severity = {}, {}
+        for category, spec in config.get("categories", {}).items():
+            severity[category] = spec.get("severity", 1)
+            for term in spec.get("terms", []):
+                terms[term.lower()] = category
+        severity.setdefault("phone_number", 3)
+        severity.setdefault("email", 2)
+        
+        automaton = AhoCorasick(terms)
+        self.automaton, self.severity = automaton, severity
+        self.detect_phone_numbers = config.get("detect_phone_numbers", True)
+        self.detect_emails = config.get("detect_emails", True)
+        self.mtime = self.path.stat().st_mtime
+        logger.info(f"Loaded {len(terms)} moderation terms from {self.path}")
+
+    def reload_if_changed(self):
+        if self.path.stat().st_mtime != self.mtime:
+            self.reload()
+
+    def scan(self, text: str) -> List[dict]:
+        lowered = text.lower()
+        matches = []
+        for start, end, term, category in self.automaton.search(lowered):
+            # Whole words only, so short terms do not fire inside longer words
+            if (start and lowered[start - 1].isalnum()) or (end < len(lowered) and lowered[end].isalnum()):
+                continue
+            matches.append({"category": category, "term": term, "start": start, "end": end})
+        if self.detect_phone_numbers:
+            matches.extend({"category": "phone_number", "term": text[a:b], "start": a, "end": b} for a, b in find_phone_numbers(text))
+        if self.detect_emails:
+            matches.extend({"category": "email", "term": text[a:b], "start": a, "end": b} for a, b in find_emails(text))
+        return matches
+
+    def priority(self, matches: List[dict]) -> int:
+        return max((self.severity.get(match["category"], 1) for match in matches), default=0)
+
+moderation = ModerationEngine(MODERATION_TERMS_FILE)
+
+async def flag_for_moderation(target_type: str, post_id: str, comment_id: Optional[str], user_id: str, text: str):
+    matches = moderation.scan(text)
+    if not matches:
+        return
+    await db.moderation_queue.insert_one({
+        "id": str(uuid.uuid4()),
+        "target_type": target_type,
+        "post_id": post_id,
+        "comment_id": comment_id,
+        "user_id": user_id,
+        "matches": [{"category": m["category"], "term": m["term"]} for m in matches],
+        "priority": moderation.priority(matches),
+        "excerpt": text[:280],
+        "status": "pending",
+        "created_at": datetime.now(timezone.utc)
+    })
+
 # Forum Routes
 @api_router.post("/forum/posts")
-async def create_post(post_data: ForumPostCreate, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user["user_id"]})
+async def create_post(post_data: ForumPostCreate, current_user: dict = Depends(get_current_user), loader: UserLoader = Depends(get_user_loader)):
+    user = await loader.load(current_user["user_id"])
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     
     post = ForumPost(
         user_id=current_user["user_id"],
@@ -459,24 +2789,49 @@ async def create_post(post_data: ForumPostCreate, current_user: dict = Depends(g
     )
     
     post_dict = post.model_dump()
-    post_dict['created_at'] = post_dict['created_at'].isoformat()
+    post_dict['hot_base'] = hot_base(post.created_at)
+    post_dict['hot_score'] = hot_score(0, 0, post.created_at)
     await db.forum_posts.insert_one(post_dict)
+    feed_cache.invalidate()
+    event_bus.emit("forum_posts", "insert", post.id)
+    await flag_for_moderation("post", post.id, None, current_user["user_id"], f"{post.title}\n{post.content}")
     
     return {"message": "Post created", "post_id": post.id}
 
-@api_router.get("/forum/posts")
-async def get_posts():
-    posts = await db.forum_posts.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
+async def build_feed(sort: str) -> list:
+    sort_field = "hot_score" if sort == "hot" else "created_at"
+    posts = await db.forum_posts.find({}, {"_id": 0, "hot_base": 0}).sort(sort_field, -1).to_list(100)
+    
+    # Resolve current author names for posts and comments in one users query
+    author_ids = {post["user_id"] for post in posts}
+    author_ids.update(comment["user_id"] for post in posts for comment in post.get("comments", []))
+    authors = await UserLoader(db).load_many(author_ids)
+    for post in posts:
+        for item in [post, *post.get("comments", [])]:
+            if item["user_id"] in authors:
+                item["author_name"] = authors[item["user_id"]]["name"]
     return posts
 
+@api_router.get("/forum/posts")
+async def get_posts(sort: Literal["new", "hot"] = "new"):
+    # Identical for every visitor, so all requests share one snapshot per sort order
+    return await feed_cache.get(sort, lambda: build_feed(sort))
+
 @api_router.post("/forum/posts/{post_id}/upvote")
 async def upvote_post(post_id: str, current_user: dict = Depends(get_current_user)):
-    await db.forum_posts.update_one({"id": post_id}, {"$inc": {"upvotes": 1}})
+    # Increment and re-score in one atomic pipeline update
+    await db.forum_posts.update_one({"id": post_id}, [
+        {"$set": {"upvotes": {"$add": [{"$ifNull": ["$upvotes", 0]}, 1]}}},
+        {"$set": {"hot_score": HOT_SCORE_EXPR}}
+    ])
+    event_bus.emit("forum_posts", "update", post_id, updated_fields=["upvotes", "hot_score"])
     return {"message": "Post upvoted"}
 
 @api_router.post("/forum/posts/{post_id}/comments")
-async def add_comment(post_id: str, content: str, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user["user_id"]})
+async def add_comment(post_id: str, content: str, current_user: dict = Depends(get_current_user), loader: UserLoader = Depends(get_user_loader)):
+    user = await loader.load(current_user["user_id"])
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
     
     comment = ForumComment(
         user_id=current_user["user_id"],
@@ -485,23 +2840,48 @@ async def add_comment(post_id: str, content: str, current_user: dict = Depends(g
     )
     
     comment_dict = comment.model_dump()
-    comment_dict['timestamp'] = comment_dict['timestamp'].isoformat()
     
-    await db.forum_posts.update_one(
-        {"id": post_id},
-        {"$push": {"comments": comment_dict}}
-    )
+    # Append and re-score in one atomic pipeline update; $literal keeps user text from being read as expressions
+    await db.forum_posts.update_one({"id": post_id}, [
+        {"$set": {"comments": {"$concatArrays": [{"$ifNull": ["$comments", []]}, {"$literal": [comment_dict]}]}}},
+        {"$set": {"hot_score": HOT_SCORE_EXPR}}
+    ])
+    feed_cache.invalidate()
+    event_bus.emit("forum_posts", "update", post_id, updated_fields=["comments", "hot_score"])
+    await flag_for_moderation("comment", post_id, comment.id, current_user["user_id"], content)
     
     return {"message": "Comment added"}
 
+def parse_timestamp(value) -> datetime:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return as_utc(datetime.fromisoformat(value))
+
+async def refresh_hot_scores():
+    """Backfill scores for posts created before ranking existed and re-score the recent window."""
+    backfill = []
+    async for post in db.forum_posts.find({"hot_base": {"$exists": False}}, {"_id": 0, "id": 1, "created_at": 1}):
+        backfill.append(UpdateOne({"id": post["id"]}, {"$set": {"hot_base": hot_base(parse_timestamp(post["created_at"]))}}))
+        if len(backfill) >= 1000:
+            await db.forum_posts.bulk_write(backfill, ordered=False)
+            backfill = []
+    if backfill:
+        await db.forum_posts.bulk_write(backfill, ordered=False)
+    
+    window_start = hot_base(datetime.now(timezone.utc) - timedelta(days=HOT_REFRESH_WINDOW_DAYS))
+    await db.forum_posts.update_many(
+        {"$or": [{"hot_base": {"$gte": window_start}}, {"hot_score": {"$exists": False}}]},
+        [{"$set": {"hot_score": HOT_SCORE_EXPR}}]
+    )
+
 # Legal Resources Routes
 @api_router.post("/legal/resources", dependencies=[Depends(require_admin)])
 async def create_legal_resource(resource_data: LegalResourceCreate):
     resource = LegalResource(**resource_data.model_dump())
     
     resource_dict = resource.model_dump()
-    resource_dict['created_at'] = resource_dict['created_at'].isoformat()
     await db.legal_resources.insert_one(resource_dict)
+    event_bus.emit("legal_resources", "insert", resource.id)
     
     return {"message": "Resource created", "resource_id": resource.id}
 
@@ -511,58 +2891,385 @@ async def get_legal_resources(category: Optional[str] = None):
     resources = await db.legal_resources.find(query, {"_id": 0}).to_list(100)
     return resources
 
+# Dashboard Routes
+@api_router.get("/me/dashboard")
+async def get_my_dashboard(current_user: dict = Depends(get_current_user)):
+    """Everything the dashboard shows in one round trip: counts only, computed concurrently."""
+    user_id = current_user["user_id"]
+    status_pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]
+    incidents_by_status, archived_by_status, active_sos, contacts = await asyncio.gather(
+        db.incidents.aggregate(status_pipeline).to_list(None),
+        db.incidents_archive.aggregate(status_pipeline).to_list(None),
+        db.sos_alerts.count_documents({"user_id": user_id, "is_active": True}),
+        db.users.aggregate([
+            {"$match": {"id": user_id}},
+            {"$project": {"_id": 0, "count": {"$size": {"$ifNull": ["$emergency_contacts", []]}}}}
+        ]).to_list(1)
+    )
+    by_status = {}
+    for bucket in incidents_by_status + archived_by_status:
+        by_status[bucket["_id"]] = by_status.get(bucket["_id"], 0) + bucket["count"]
+    return {
+        "incidents": {"total": sum(by_status.values()), "by_status": by_status},
+        "active_sos_alerts": active_sos,
+        "emergency_contacts": contacts[0]["count"] if contacts else 0
+    }
+
+# Batch Routes
+async def bulk_write_results(collection, requests: List[tuple], results: dict):
+    """Run (index, request) pairs as one unordered bulk_write and record a result per index."""
+    if not requests:
+        return
+    failed = {}
+    try:
+        await collection.bulk_write([request for _, request in requests], ordered=False)
+    except BulkWriteError as exc:
+        failed = {error["index"]: error.get("errmsg", "Write failed") for error in exc.details["writeErrors"]}
+    for position, (index, _) in enumerate(requests):
+        if position in failed:
+            results[index] = {"status": "error", "detail": failed[position]}
+        else:
+            results[index].setdefault("status", "ok")
+
+@api_router.post("/batch")
+async def run_batch(
+    batch: BatchRequest,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Apply queued offline operations in one round trip, grouped into one bulk write per collection."""
+    async def execute():
+        results = {}
+        incident_writes, alert_ids, contacts = [], {}, []
+        
+        for index, raw in enumerate(batch.operations):
+            try:
+                operation = BatchOperation.validate_python(raw)
+            except ValidationError as exc:
+                results[index] = {"op": raw.get("op"), "status": "invalid", "detail": jsonable_encoder(exc.errors(include_url=False))}
+                continue
+            
+            results[index] = {"op": operation.op}
+            if isinstance(operation, BatchCreateIncident):
+                incident_dict = build_incident_document(operation.data, current_user["user_id"])
+                results[index]["incident_id"] = incident_dict["id"]
+                incident_writes.append((index, InsertOne(incident_dict)))
+            elif isinstance(operation, BatchAddEmergencyContact):
+                contacts.append((index, contact_document(operation.data)))
+            else:
+                alert_ids[index] = operation.alert_id
+        
+        async def deactivate_alerts():
+            if not alert_ids:
+                return
+            owned = await db.sos_alerts.distinct("id", {"id": {"$in": list(alert_ids.values())}, "user_id": current_user["user_id"]})
+            updates = []
+            for index, alert_id in alert_ids.items():
+                if alert_id in owned:
+                    updates.append((index, UpdateOne({"id": alert_id, "user_id": current_user["user_id"]}, {"$set": sos_deactivation()})))
+                else:
+                    results[index].update(status="error", detail="Alert not found")
+            await bulk_write_results(db.sos_alerts, updates, results)
+            for index, alert_id in alert_ids.items():
+                if results[index]["status"] == "ok":
+                    event_bus.emit("sos_alerts", "update", alert_id, updated_fields=["is_active", "due_at", "expires_at"])
+        
+        async def add_contacts():
+            if not contacts:
+                return
+            # Every contact targets the same user document, so one capped $push covers them all
+            added = await push_emergency_contacts(current_user["user_id"], [contact for _, contact in contacts])
+            for index, contact in contacts:
+                if added:
+                    results[index].update(status="ok", contact_id=contact["id"])
+                else:
+                    results[index].update(status="error", detail=CONTACT_LIMIT_DETAIL)
+        
+        async def insert_incidents():
+            await bulk_write_results(db.incidents, incident_writes, results)
+            for index, _ in incident_writes:
+                if results[index]["status"] == "ok":
+                    event_bus.emit("incidents", "insert", results[index]["incident_id"])
+        
+        await asyncio.gather(
+            insert_incidents(),
+            deactivate_alerts(),
+            add_contacts()
+        )
+        # Contacts bump their own versions in push_emergency_contacts
+        changed = [
+            resource for resource, indexes in (("incidents", [index for index, _ in incident_writes]), ("sos", list(alert_ids)))
+            if any(results[index].get("status") == "ok" for index in indexes)
+        ]
+        if changed:
+            await bump_versions(current_user["user_id"], *changed)
+        
+        return {"results": [{"index": index, **results[index]} for index in range(len(batch.operations))]}
+    
+    fingerprint = request_fingerprint(batch.model_dump_json())
+    return await run_idempotent("batch", current_user["user_id"], idempotency_key, fingerprint, execute)
+
 # Admin Routes
 @api_router.get("/admin/incidents", dependencies=[Depends(require_admin)])
-async def get_all_incidents(status_filter: Optional[CaseStatus] = None):
+async def get_all_incidents(status_filter: Optional[CaseStatus] = None, rdb=Depends(read_db(ReadConsistency.ANALYTICS))):
     query = {"status": status_filter} if status_filter else {}
-    incidents = await db.incidents.find(query, {"_id": 0}).to_list(1000)
+    incidents = await rdb.incidents.find(query, {"_id": 0}).to_list(1000)
     return incidents
 
+def parse_bbox(bbox: str) -> dict:
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lng,min_lat,max_lng,max_lat")
+    return {
+        "longitude": {"$gte": min_lng, "$lte": max_lng},
+        "latitude": {"$gte": min_lat, "$lte": max_lat}
+    }
+
+@api_router.get("/admin/incidents/search", dependencies=[Depends(require_admin)])
+async def search_incidents(
+    incident_type: Optional[List[IncidentType]] = Query(None),
+    status_filter: Optional[List[CaseStatus]] = Query(None),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    bbox: Optional[str] = Query(None, description="min_lng,min_lat,max_lng,max_lat"),
+    q: Optional[str] = Query(None, max_length=200),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    rdb=Depends(read_db(ReadConsistency.ANALYTICS))
+):
+    """Filtered incident page plus per-type and per-status counts.
+    
+    Query budget: exactly one aggregate round trip, capped at ADMIN_SEARCH_MAX_TIME_MS
+    (default 2000 ms), returning at most `page_size` documents. The $match and $sort run
+    before $facet so they can use the (status|incident_type, created_at) indexes; free
+    text goes through the incidents text index. Facet counts cover every filter.
+    """
+    match = {}
+    if q:
+        match["$text"] = {"$search": q}
+    if incident_type:
+        match["incident_type"] = {"$in": [t.value for t in incident_type]}
+    if status_filter:
+        match["status"] = {"$in": [s.value for s in status_filter]}
+    if date_from or date_to:
+        match["created_at"] = {}
+        if date_from:
+            match["created_at"]["$gte"] = as_utc(date_from)
+        if date_to:
+            match["created_at"]["$lte"] = as_utc(date_to)
+    if bbox:
+        match.update(parse_bbox(bbox))
+    
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"created_at": -1}},
+        {"$facet": {
+            "results": [
+                {"$skip": (page - 1) * page_size},
+                {"$limit": page_size},
+                {"$project": {"_id": 0}}
+            ],
+            "total": [{"$count": "count"}],
+            "incident_type": [{"$group": {"_id": "$incident_type", "count": {"$sum": 1}}}],
+            "status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+        }}
+    ]
+    [result] = await rdb.incidents.aggregate(pipeline, maxTimeMS=ADMIN_SEARCH_MAX_TIME_MS).to_list(1)
+    
+    return {
+        "results": result["results"],
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "page": page,
+        "page_size": page_size,
+        "facets": {
+            "incident_type": {bucket["_id"]: bucket["count"] for bucket in result["incident_type"]},
+            "status": {bucket["_id"]: bucket["count"] for bucket in result["status"]}
+        }
+    }
+
 @api_router.put("/admin/incidents/{incident_id}", dependencies=[Depends(require_admin)])
 async def update_incident_status(incident_id: str, update_data: IncidentUpdate):
-    update_dict = {"status": update_data.status, "updated_at": datetime.now(timezone.utc).isoformat()}
+    update_dict = {"status": update_data.status, "updated_at": datetime.now(timezone.utc)}
     
-    result = await db.incidents.update_one({"id": incident_id}, {"$set": update_dict})
+    incident = await db.incidents.find_one_and_update({"id": incident_id}, {"$set": update_dict}, projection={"_id": 0, "user_id": 1})
     
-    if result.matched_count == 0:
+    if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     
+    event_bus.emit("incidents", "update", incident_id, updated_fields=list(update_dict))
+    await bump_versions(incident["user_id"], "incidents")
     return {"message": "Incident updated"}
 
-@api_router.get("/admin/analytics/hotspots", dependencies=[Depends(require_admin)])
-async def get_hotspots():
-    # Get all incidents with location data
-    incidents = await db.incidents.find(
-        {"latitude": {"$exists": True}, "longitude": {"$exists": True}},
+@api_router.get("/admin/incidents/{incident_id}/evidence/{file_id}/thumbnail", dependencies=[Depends(require_admin)])
+async def get_evidence_thumbnail(incident_id: str, file_id: str, size: Optional[int] = None):
+    projection = {"_id": 0, "evidence_meta": {"$elemMatch": {"file_id": file_id}}}
+    incident = await db.incidents.find_one({"id": incident_id}, projection)
+    if not incident:
+        incident = await db.incidents_archive.find_one({"id": incident_id}, projection)
+    if not incident or not incident.get("evidence_meta") or not incident["evidence_meta"][0].get("thumbnails"):
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    
+    available = incident["evidence_meta"][0]["thumbnails"]
+    # Smallest thumbnail that is at least the requested size, else the largest we have
+    chosen = next((s for s in available if size is None or s >= size), available[-1])
+    path = THUMBNAIL_DIR / f"{file_id}_{chosen}.webp"
+    # Once streaming starts a failure can only cut the response short, so check the file first
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    return StreamingResponse(iter_evidence(path), media_type="image/webp")
+
+@api_router.get("/admin/moderation/queue", dependencies=[Depends(require_admin)])
+async def get_moderation_queue(status_filter: Literal["pending", "dismissed", "removed"] = "pending", limit: int = Query(50, ge=1, le=200)):
+    items = await db.moderation_queue.find(
+        {"status": status_filter}, {"_id": 0}
+    ).sort([("priority", -1), ("created_at", 1)]).to_list(limit)
+    return items
+
+@api_router.post("/admin/moderation/queue/{item_id}/resolve")
+async def resolve_moderation_item(item_id: str, action: Literal["dismiss", "remove"], current_user: dict = Depends(require_admin)):
+    item = await db.moderation_queue.find_one({"id": item_id}, {"_id": 0})
+    if not item:
+        raise HTTPException(status_code=404, detail="Queue item not found")
+    
+    if action == "remove":
+        if item["target_type"] == "post":
+            await db.forum_posts.delete_one({"id": item["post_id"]})
+            event_bus.emit("forum_posts", "delete", item["post_id"])
+        else:
+            await db.forum_posts.update_one({"id": item["post_id"]}, {"$pull": {"comments": {"id": item["comment_id"]}}})
+            event_bus.emit("forum_posts", "update", item["post_id"], updated_fields=["comments"])
+        feed_cache.invalidate()
+    
+    await db.moderation_queue.update_one({"id": item_id}, {"$set": {
+        "status": "removed" if action == "remove" else "dismissed",
+        "resolved_by": current_user["user_id"],
+        "resolved_at": datetime.now(timezone.utc)
+    }})
+    return {"message": "Queue item resolved"}
+
+@api_router.post("/admin/moderation/reload", dependencies=[Depends(require_admin)])
+async def reload_moderation_terms():
+    try:
+        await asyncio.to_thread(moderation.reload)
+    except (OSError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=f"Could not load moderation terms: {exc}")
+    return {"message": "Moderation terms reloaded", "terms": len(moderation.automaton.terms)}
+
+@api_router.post("/admin/sos/{alert_id}/acknowledge")
+async def acknowledge_sos(alert_id: str, current_user: dict = Depends(require_admin)):
+    update = {"acknowledged_by": current_user["user_id"], "acknowledged_at": datetime.now(timezone.utc), "due_at": None}
+    alert = await db.sos_alerts.find_one_and_update({"id": alert_id, "is_active": True}, {"$set": update}, projection={"_id": 0, "user_id": 1})
+    if not alert:
+        raise HTTPException(status_code=404, detail="Active SOS alert not found")
+    
+    event_bus.emit("sos_alerts", "update", alert_id, updated_fields=list(update))
+    await bump_versions(alert["user_id"], "sos")
+    return {"message": "SOS alert acknowledged"}
+
+@api_router.websocket("/ws/admin/sos")
+async def admin_sos_feed(websocket: WebSocket, token: str = Query(...)):
+    """Push SOS alert inserts and updates from every worker to a connected admin dashboard."""
+    try:
+        user = await authenticate_token(token)
+    except HTTPException:
+        await websocket.close(code=4401)
+        return
+    if user["role"] not in ["admin", "moderator"]:
+        await websocket.close(code=4403)
+        return
+    
+    await websocket.accept()
+    events = asyncio.Queue(maxsize=100)
+    
+    def enqueue(event: dict):
+        if not events.full():  # a stalled client loses events rather than growing the queue
+            events.put_nowait(event)
+    
+    unsubscribe = event_bus.subscribe(["sos_alerts"], enqueue)
+    try:
+        while True:
+            await websocket.send_json(jsonable_encoder(await events.get()))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        unsubscribe()
+
+@api_router.post("/admin/users/{user_id}/revoke-sessions", dependencies=[Depends(require_admin)])
+async def revoke_user_sessions(user_id: str):
+    """Sign a user out everywhere, e.g. after a lost or stolen phone."""
+    if not await db.users.find_one({"id": user_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="User not found")
+    await token_revocations.revoke_user(user_id)
+    return {"message": "All sessions revoked"}
+
+@api_router.get("/admin/loop-watchdog", dependencies=[Depends(require_admin)])
+async def get_loop_watchdog_reports():
+    if not loop_watchdog:
+        return {"enabled": False}
+    return {"enabled": True, **loop_watchdog.summary()}
+
+async def hotspot_points(rdb) -> List[dict]:
+    return await rdb.incidents.find(
+        {"latitude": {"$type": "number"}, "longitude": {"$type": "number"}},
         {"_id": 0, "latitude": 1, "longitude": 1, "incident_type": 1}
     ).to_list(1000)
-    
+
+@api_router.get("/admin/analytics/hotspots", dependencies=[Depends(require_admin)])
+async def get_hotspots(rdb=Depends(read_db(ReadConsistency.ANALYTICS))):
+    incidents = await hotspot_points(rdb)
     return {"hotspots": incidents, "total": len(incidents)}
 
-@api_router.get("/admin/analytics/stats", dependencies=[Depends(require_admin)])
-async def get_stats():
-    total_users = await db.users.count_documents({})
-    total_incidents = await db.incidents.count_documents({})
-    total_sos = await db.sos_alerts.count_documents({})
-    active_sos = await db.sos_alerts.count_documents({"is_active": True})
-    
-    # Incidents by status
-    incidents_by_status = {}
-    for status in CaseStatus:
-        count = await db.incidents.count_documents({"status": status.value})
-        incidents_by_status[status.value] = count
+async def analytics_stats(rdb) -> dict:
+    # Independent counts run concurrently; per-status counts come from one $group instead of a query per status
+    total_users, total_incidents, total_sos, active_sos, by_status = await asyncio.gather(
+        rdb.users.count_documents({}),
+        rdb.incidents.count_documents({}),
+        rdb.sos_alerts.count_documents({}),
+        rdb.sos_alerts.count_documents({"is_active": True}),
+        rdb.incidents.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]).to_list(None)
+    )
+    counts = {bucket["_id"]: bucket["count"] for bucket in by_status}
     
     return {
         "total_users": total_users,
         "total_incidents": total_incidents,
         "total_sos_alerts": total_sos,
         "active_sos_alerts": active_sos,
-        "incidents_by_status": incidents_by_status
+        "incidents_by_status": {status.value: counts.get(status.value, 0) for status in CaseStatus}
     }
 
+@api_router.get("/admin/analytics/stats", dependencies=[Depends(require_admin)])
+async def get_stats(rdb=Depends(read_db(ReadConsistency.ANALYTICS))):
+    return await analytics_stats(rdb)
+
+# Fields the admin incident list renders; descriptions stay, full evidence metadata does not
+ADMIN_DASHBOARD_INCIDENT_FIELDS = {
+    "_id": 0, "id": 1, "incident_type": 1, "status": 1, "is_anonymous": 1, "created_at": 1, "location": 1,
+    "description": 1, "evidence_files": 1, "evidence_meta.file_id": 1, "evidence_meta.thumbnails": 1
+}
+
+@api_router.get("/admin/dashboard", dependencies=[Depends(require_admin)])
+async def get_admin_dashboard(
+    incident_limit: int = Query(1000, ge=1, le=1000),
+    rdb=Depends(read_db(ReadConsistency.ANALYTICS))
+):
+    """Stats, the incident list and map points for the admin page in one round trip."""
+    stats, incidents, hotspots = await asyncio.gather(
+        analytics_stats(rdb),
+        rdb.incidents.find({}, ADMIN_DASHBOARD_INCIDENT_FIELDS).sort("created_at", -1).to_list(incident_limit),
+        hotspot_points(rdb)
+    )
+    return {"stats": stats, "incidents": incidents, "hotspots": hotspots}
+
 # Include the router
 app.include_router(api_router)
 
+app.add_middleware(ConditionalGetMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -571,6 +3278,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if loop_watchdog:
+    app.add_middleware(LoopWatchdogMiddleware, watchdog=loop_watchdog)
+if tracer:
+    app.add_middleware(TracingMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -578,6 +3290,100 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def ensure_indexes():
+    await db.idempotency_keys.create_index("key", unique=True)
+    await db.revoked_tokens.create_index("id", unique=True)
+    await db.revoked_tokens.create_index("revoked_at")
+    await db.revoked_tokens.create_index("expires_at", expireAfterSeconds=0)
+    await db.idempotency_keys.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL_HOURS * 3600)
+    await db.totp_used_codes.create_index("created_at", expireAfterSeconds=TOTP_REPLAY_WINDOW)
+    await db.upload_sessions.create_index("id", unique=True)
+    await db.upload_sessions.create_index("expires_at")
+    await db.forum_posts.create_index("id", unique=True)
+    await db.forum_posts.create_index([("created_at", -1)])
+    await db.forum_posts.create_index([("hot_score", -1)])
+    await db.forum_posts.create_index("hot_base")
+    await db.legal_resources.create_index("key", unique=True, partialFilterExpression={"key": {"$exists": True}})
+    await db.moderation_queue.create_index([("status", 1), ("priority", -1), ("created_at", 1)])
+    await db.incidents.create_index("id", unique=True)
+    await db.incidents.create_index([("status", 1), ("created_at", -1)])
+    await db.incidents.create_index([("incident_type", 1), ("created_at", -1)])
+    await db.incidents.create_index([("created_at", -1)])
+    await db.incidents.create_index([("latitude", 1), ("longitude", 1)])
+    await db.incidents.create_index([("description", "text"), ("location", "text")])
+    await db.incidents.create_index([("status", 1), ("updated_at", 1)])
+    await db.incidents_archive.create_index("id", unique=True)
+    await db.incidents_archive.create_index("user_id")
+    await db.sos_alerts.create_index("expires_at", expireAfterSeconds=0, partialFilterExpression={"is_active": False})
+    await db.sos_alerts.create_index("due_at", partialFilterExpression={"due_at": {"$type": "date"}})
+
+# Retention
+async def archive_closed_incidents():
+    """Move closed incidents untouched for INCIDENT_ARCHIVE_AFTER_DAYS into incidents_archive, a batch at a time."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=INCIDENT_ARCHIVE_AFTER_DAYS)
+    query = {"status": CaseStatus.CLOSED, "updated_at": {"$lt": cutoff}}
+    archived = 0
+    while True:
+        batch = await db.incidents.find(query, {"_id": 0}).sort("updated_at", 1).limit(RETENTION_BATCH_SIZE).to_list(RETENTION_BATCH_SIZE)
+        if not batch:
+            break
+        
+        archived_at = datetime.now(timezone.utc)
+        # Upserts make a rerun after a crash between the two writes harmless
+        await db.incidents_archive.bulk_write(
+            [ReplaceOne({"id": incident["id"]}, {**incident, "archived_at": archived_at}, upsert=True) for incident in batch],
+            ordered=False
+        )
+        # Re-check the policy so a case reopened in the meantime stays live
+        await db.incidents.delete_many({**query, "id": {"$in": [incident["id"] for incident in batch]}})
+        await bump_versions([incident["user_id"] for incident in batch], "incidents")
+        archived += len(batch)
+        if len(batch) < RETENTION_BATCH_SIZE:
+            break
+    
+    if archived:
+        logger.info(f"Archived {archived} closed incidents")
+
+async def apply_retention():
+    # Alerts deactivated before expires_at existed would otherwise never expire
+    await db.sos_alerts.update_many(
+        {"is_active": False, "expires_at": {"$exists": False}},
+        {"$set": sos_deactivation()}
+    )
+    await archive_closed_incidents()
+
+@app.on_event("startup")
+async def start_background_jobs():
+    for directory in (UPLOAD_DIR, THUMBNAIL_DIR, UPLOAD_SESSION_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+    if not evidence_key_id:
+        logger.warning("EVIDENCE_MASTER_KEY is not set; evidence files are stored unencrypted")
+    if loop_watchdog:
+        loop_watchdog.start()
+    if tracer:
+        start_periodic("export_traces", 1, tracer.flush)
+    await event_bus.start()
+    start_periodic("rebuild_revocation_filter", REVOCATION_REBUILD_INTERVAL, token_revocations.rebuild)
+    if event_bus.mode != "changestream":
+        start_periodic("poll_revoked_tokens", REVOCATION_POLL_INTERVAL, token_revocations.poll)
+    await escalations.recover()
+    periodic_tasks.append(asyncio.create_task(escalations.run(), name="sos_escalations"))
+    moderation.reload()
+    
+    async def reload_moderation_terms_if_changed():
+        await asyncio.to_thread(moderation.reload_if_changed)
+    start_periodic("reload_moderation_terms", MODERATION_RELOAD_INTERVAL, reload_moderation_terms_if_changed)
+    start_periodic("collect_abandoned_uploads", 3600, collect_abandoned_uploads)
+    start_periodic("refresh_hot_scores", HOT_REFRESH_INTERVAL, refresh_hot_scores)
+    start_periodic("apply_retention", RETENTION_INTERVAL, apply_retention)
+    start_periodic("refresh_risk_grid", RISK_REFRESH_INTERVAL, risk_grid.refresh)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    for task in periodic_tasks:
+        task.cancel()
+    if tracer:
+        await tracer.flush()
+    client.close()
+    cpu_executor.shutdown(wait=False, cancel_futures=True)
\ No newline at end of file
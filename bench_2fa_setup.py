@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark 2FA setup for SafeSpace
+
+Measures QR rendering cost (PNG vs SVG) and, when a running backend is given,
+the throughput of POST /api/auth/2fa/setup for fresh and repeated attempts.
+
+Usage:
+    python3 bench_2fa_setup.py
+    python3 bench_2fa_setup.py --url http://localhost:8001 --users 50 --concurrency 10
+
+Requirements:
+    pip install -r backend/requirements.txt
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+from server import render_qr_code  # noqa: E402
+
+SAMPLE_URI = "otpauth://totp/SafeSpace:someone%40example.com?secret=JBSWY3DPEHPK3PXPJBSWY3DPEHPK3PXP&issuer=SafeSpace"
+
+def bench_render(iterations: int):
+    print("🖼️  QR rendering (per call)")
+    for fmt in ("png", "svg"):
+        render_qr_code(SAMPLE_URI, fmt)  # warm up
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            render_qr_code(SAMPLE_URI, fmt)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"  • {fmt}: mean {statistics.mean(timings):.2f} ms, p95 {percentile(timings, 95):.2f} ms")
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def register_user(base_url: str) -> str:
+    response = requests.post(f"{base_url}/api/auth/register", json={
+        "email": f"bench-{uuid.uuid4().hex[:12]}@example.com",
+        "name": "Bench User",
+        "password": uuid.uuid4().hex,
+    }, timeout=30)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+def call_setup(base_url: str, token: str, fmt: str) -> float:
+    start = time.perf_counter()
+    response = requests.post(
+        f"{base_url}/api/auth/2fa/setup",
+        params={"qr_format": fmt},
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=30,
+    )
+    response.raise_for_status()
+    return (time.perf_counter() - start) * 1000
+
+def bench_endpoint(base_url: str, users: int, concurrency: int, fmt: str):
+    print()
+    print(f"🌐 POST /api/auth/2fa/setup ({fmt}, {users} users, concurrency {concurrency})")
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        tokens = list(pool.map(lambda _: register_user(base_url), range(users)))
+
+        for label in ("fresh", "repeat"):
+            start = time.perf_counter()
+            timings = list(pool.map(lambda token: call_setup(base_url, token, fmt), tokens))
+            elapsed = time.perf_counter() - start
+            print(f"  • {label}: {len(timings) / elapsed:.1f} req/s, "
+                  f"p50 {percentile(timings, 50):.1f} ms, p95 {percentile(timings, 95):.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SafeSpace 2FA setup")
+    parser.add_argument("--iterations", type=int, default=200, help="render iterations per format")
+    parser.add_argument("--url", help="base URL of a running backend, e.g. http://localhost:8001")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--format", choices=["png", "svg"], default="svg")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⏱️  SafeSpace 2FA Setup Benchmark")
+    print("=" * 60)
+    print()
+
+    bench_render(args.iterations)
+    if args.url:
+        bench_endpoint(args.url.rstrip("/"), args.users, args.concurrency, args.format)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark the SafeSpace moderation pre-filter
+
+Builds the Aho-Corasick automaton from the configured term list (optionally
+padded with synthetic terms) and measures the cost of scanning forum posts.
+
+Usage:
+    python3 bench_moderation.py
+    python3 bench_moderation.py --extra-terms 20000 --posts 5000
+
+Requirements:
+    pip install -r backend/requirements.txt
+"""
+
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+from server import AhoCorasick, moderation  # noqa: E402
+
+WORDS = ("the", "walk", "home", "station", "late", "felt", "safe", "street", "light", "bus",
+         "group", "friend", "night", "park", "report", "police", "help", "thank", "you", "everyone")
+
+def random_word(rng, length):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+def make_post(rng, words):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    if rng.random() < 0.05:
+        text += " she lives at the corner, call 555-201-3344"
+    return text
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SafeSpace moderation scanning")
+    parser.add_argument("--extra-terms", type=int, default=10000, help="synthetic terms added to the configured list")
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=120, help="words per post")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print("=" * 60)
+    print("⏱️  SafeSpace Moderation Benchmark")
+    print("=" * 60)
+    print()
+
+    moderation.reload()
+    terms = {term: category for term, category in moderation.automaton.terms}
+    for _ in range(args.extra_terms):
+        terms[f"{random_word(rng, rng.randint(4, 9))} {random_word(rng, rng.randint(3, 8))}"] = "synthetic"
+
+    start = time.perf_counter()
+    moderation.automaton = AhoCorasick(terms)
+    print(f"🏗️  Built automaton: {len(terms)} terms, {len(moderation.automaton.goto)} states "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    posts = [make_post(rng, args.words) for _ in range(args.posts)]
+    timings, flagged = [], 0
+    for post in posts:
+        start = time.perf_counter()
+        matches = moderation.scan(post)
+        timings.append((time.perf_counter() - start) * 1_000_000)
+        flagged += bool(matches)
+
+    print(f"🔎 Scanned {len(posts)} posts of ~{sum(map(len, posts)) // len(posts)} chars, {flagged} flagged")
+    print(f"  • mean {statistics.mean(timings):.1f} µs, p50 {percentile(timings, 50):.1f} µs, "
+          f"p99 {percentile(timings, 99):.1f} µs per post")
+
+if __name__ == "__main__":
+    main()
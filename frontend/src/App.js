@@ -47,6 +47,11 @@ function App() {
   };
 
   const handleLogout = () => {
+    const token = localStorage.getItem('token');
+    if (token) {
+      // Revoke the token server-side; the local session ends either way
+      axios.post(`${API}/auth/logout`, null, { headers: { Authorization: `Bearer ${token}` } }).catch(() => {});
+    }
     localStorage.removeItem('token');
     localStorage.removeItem('user');
     setUser(null);
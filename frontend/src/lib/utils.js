@@ -1,6 +1,26 @@
+import axios from "axios";
 import { clsx } from "clsx";
 import { twMerge } from "tailwind-merge"
 
 export function cn(...inputs) {
   return twMerge(clsx(inputs));
 }
+
+// POST with an Idempotency-Key, retrying network failures with the same key
+// so flaky connections never create duplicate SOS alerts or reports.
+export async function postIdempotent(url, data, config = {}, retries = 3) {
+  const key = crypto.randomUUID();
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await axios.post(url, data, {
+        ...config,
+        headers: { ...config.headers, 'Idempotency-Key': key }
+      });
+    } catch (error) {
+      if (error.response || attempt >= retries) {
+        throw error;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** attempt));
+    }
+  }
+}
@@ -20,6 +20,29 @@ L.Icon.Default.mergeOptions({
   shadowUrl: require('leaflet/dist/images/marker-shadow.png'),
 });
 
+// Thumbnails need the auth header, so fetch them as blobs instead of plain <img src>
+const EvidenceThumbnail = ({ incidentId, fileId }) => {
+  const [src, setSrc] = useState(null);
+
+  useEffect(() => {
+    let objectUrl;
+    axios
+      .get(`${API}/admin/incidents/${incidentId}/evidence/${fileId}/thumbnail`, {
+        params: { size: 128 },
+        responseType: 'blob'
+      })
+      .then((response) => {
+        objectUrl = URL.createObjectURL(response.data);
+        setSrc(objectUrl);
+      })
+      .catch(() => setSrc(null));
+    return () => objectUrl && URL.revokeObjectURL(objectUrl);
+  }, [incidentId, fileId]);
+
+  if (!src) return null;
+  return <img src={src} alt="Evidence thumbnail" className="w-24 h-24 object-cover rounded border" />;
+};
+
 const AdminPage = ({ user, onLogout }) => {
   const [stats, setStats] = useState(null);
   const [incidents, setIncidents] = useState([]);
@@ -28,35 +51,17 @@ const AdminPage = ({ user, onLogout }) => {
   const [viewMode, setViewMode] = useState('stats'); // stats, incidents, map
 
   useEffect(() => {
-    fetchStats();
-    fetchIncidents();
-    fetchHotspots();
+    fetchDashboard();
   }, []);
 
-  const fetchStats = async () => {
+  const fetchDashboard = async () => {
     try {
-      const response = await axios.get(`${API}/admin/analytics/stats`);
-      setStats(response.data);
-    } catch (error) {
-      console.error('Error fetching stats:', error);
-    }
-  };
-
-  const fetchIncidents = async () => {
-    try {
-      const response = await axios.get(`${API}/admin/incidents`);
-      setIncidents(response.data);
-    } catch (error) {
-      console.error('Error fetching incidents:', error);
-    }
-  };
-
-  const fetchHotspots = async () => {
-    try {
-      const response = await axios.get(`${API}/admin/analytics/hotspots`);
+      const response = await axios.get(`${API}/admin/dashboard`);
+      setStats(response.data.stats);
+      setIncidents(response.data.incidents);
       setHotspots(response.data.hotspots || []);
     } catch (error) {
-      console.error('Error fetching hotspots:', error);
+      console.error('Error fetching dashboard:', error);
     }
   };
 
@@ -64,8 +69,7 @@ const AdminPage = ({ user, onLogout }) => {
     try {
       await axios.put(`${API}/admin/incidents/${incidentId}`, { status: newStatus });
       toast.success('Incident status updated');
-      fetchIncidents();
-      fetchStats();
+      fetchDashboard();
     } catch (error) {
       toast.error('Failed to update incident');
     }
@@ -305,6 +309,15 @@ const AdminPage = ({ user, onLogout }) => {
                           Evidence: {incident.evidence_files.length} file(s) attached
                         </p>
                       )}
+                      {incident.evidence_meta?.some((meta) => meta.thumbnails?.length) && (
+                        <div className="flex flex-wrap gap-2 mt-3" data-testid="evidence-thumbnails">
+                          {incident.evidence_meta
+                            .filter((meta) => meta.thumbnails?.length)
+                            .map((meta) => (
+                              <EvidenceThumbnail key={meta.file_id} incidentId={incident.id} fileId={meta.file_id} />
+                            ))}
+                        </div>
+                      )}
                     </CardContent>
                   </Card>
                 ))}
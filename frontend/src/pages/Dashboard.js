@@ -22,16 +22,12 @@ const Dashboard = ({ user, onLogout }) => {
 
   const fetchStats = async () => {
     try {
-      const [incidents, sosAlerts, contacts] = await Promise.all([
-        axios.get(`${API}/incidents`),
-        axios.get(`${API}/sos`),
-        axios.get(`${API}/users/emergency-contacts`)
-      ]);
+      const response = await axios.get(`${API}/me/dashboard`);
 
       setStats({
-        myIncidents: incidents.data.length,
-        activeSOS: sosAlerts.data.length,
-        emergencyContacts: contacts.data.length
+        myIncidents: response.data.incidents.total,
+        activeSOS: response.data.active_sos_alerts,
+        emergencyContacts: response.data.emergency_contacts
       });
     } catch (error) {
       console.error('Error fetching stats:', error);
@@ -18,14 +18,15 @@ const ForumPage = ({ user, onLogout }) => {
   const [newComment, setNewComment] = useState({});
   const [dialogOpen, setDialogOpen] = useState(false);
   const [loading, setLoading] = useState(false);
+  const [sort, setSort] = useState('new');
 
   useEffect(() => {
     fetchPosts();
-  }, []);
+  }, [sort]);
 
   const fetchPosts = async () => {
     try {
-      const response = await axios.get(`${API}/forum/posts`);
+      const response = await axios.get(`${API}/forum/posts`, { params: { sort } });
       setPosts(response.data);
     } catch (error) {
       console.error('Error fetching posts:', error);
@@ -93,6 +94,18 @@ const ForumPage = ({ user, onLogout }) => {
             </div>
           </div>
 
+          <div className="ml-4 flex gap-1" data-testid="forum-sort">
+            {['new', 'hot'].map((mode) => (
+              <Button
+                key={mode}
+                variant={sort === mode ? 'default' : 'outline'}
+                onClick={() => setSort(mode)}
+              >
+                {mode === 'hot' ? 'Hot' : 'New'}
+              </Button>
+            ))}
+          </div>
+
           <Dialog open={dialogOpen} onOpenChange={setDialogOpen}>
             <DialogTrigger asChild>
               <Button
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { API } from '../App';
+import { postIdempotent } from '../lib/utils';
 import { Button } from '../components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '../components/ui/card';
 import { Input } from '../components/ui/input';
@@ -13,6 +14,56 @@ import Layout from '../components/Layout';
 import { FileText, Upload, MapPin, Eye } from 'lucide-react';
 import { Badge } from '../components/ui/badge';
 
+const CHUNK_SIZE = 5 * 1024 * 1024;
+const PARALLEL_CHUNKS = 3;
+
+const sha256Hex = async (blob) => {
+  const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest)).map((b) => b.toString(16).padStart(2, '0')).join('');
+};
+
+// Large files go through the resumable upload API: chunks are sent in parallel,
+// and a failed chunk is retried on its own instead of restarting the whole file.
+const uploadEvidence = async (incidentId, file) => {
+  if (file.size <= CHUNK_SIZE) {
+    const fileFormData = new FormData();
+    fileFormData.append('file', file);
+    return postIdempotent(`${API}/incidents/${incidentId}/evidence`, fileFormData, {
+      headers: { 'Content-Type': 'multipart/form-data' }
+    });
+  }
+
+  const { data: session } = await axios.post(`${API}/incidents/${incidentId}/evidence/uploads`, {
+    filename: file.name,
+    size: file.size,
+    content_type: file.type,
+    chunk_size: CHUNK_SIZE
+  });
+
+  const queue = [...session.missing_chunks];
+  const worker = async () => {
+    while (queue.length > 0) {
+      const index = queue.shift();
+      const chunk = file.slice(index * session.chunk_size, (index + 1) * session.chunk_size);
+      const checksum = await sha256Hex(chunk);
+      for (let attempt = 0; ; attempt++) {
+        try {
+          await axios.put(`${API}/uploads/${session.upload_id}/chunks/${index}`, chunk, {
+            headers: { 'Content-Type': 'application/octet-stream', 'Content-SHA256': checksum }
+          });
+          break;
+        } catch (error) {
+          if (attempt >= 3) throw error;
+          await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** attempt));
+        }
+      }
+    }
+  };
+  await Promise.all(Array.from({ length: PARALLEL_CHUNKS }, worker));
+
+  return axios.post(`${API}/uploads/${session.upload_id}/complete`);
+};
+
 const IncidentReportPage = ({ user, onLogout }) => {
   const [formData, setFormData] = useState({
     incident_type: '',
@@ -66,17 +117,13 @@ const IncidentReportPage = ({ user, onLogout }) => {
 
     setLoading(true);
     try {
-      const response = await axios.post(`${API}/incidents`, formData);
+      const response = await postIdempotent(`${API}/incidents`, formData);
       const incidentId = response.data.incident_id;
 
       // Upload files if any
       if (files.length > 0) {
         for (const file of files) {
-          const fileFormData = new FormData();
-          fileFormData.append('file', file);
-          await axios.post(`${API}/incidents/${incidentId}/evidence`, fileFormData, {
-            headers: { 'Content-Type': 'multipart/form-data' }
-          });
+          await uploadEvidence(incidentId, file);
         }
       }
 
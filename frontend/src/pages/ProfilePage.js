@@ -66,7 +66,7 @@ const ProfilePage = ({ user, onLogout }) => {
       setDialogOpen(false);
       fetchEmergencyContacts();
     } catch (error) {
-      toast.error('Failed to add contact');
+      toast.error(error.response?.data?.detail || 'Failed to add contact');
     }
   };
 
@@ -321,7 +321,7 @@ const ProfilePage = ({ user, onLogout }) => {
             ) : (
               <div className="space-y-3">
                 {emergencyContacts.map((contact, index) => (
-                  <div key={index} className="flex items-center justify-between p-4 bg-gray-50 rounded-lg" data-testid="emergency-contact-item">
+                  <div key={contact.id || index} className="flex items-center justify-between p-4 bg-gray-50 rounded-lg" data-testid="emergency-contact-item">
                     <div>
                       <p className="font-medium">{contact.name}</p>
                       <p className="text-sm text-gray-600">{contact.phone}</p>
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { API } from '../App';
+import { postIdempotent } from '../lib/utils';
 import { Button } from '../components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '../components/ui/card';
 import { Textarea } from '../components/ui/textarea';
@@ -79,7 +80,7 @@ const SOSPage = ({ user, onLogout }) => {
 
     setLoading(true);
     try {
-      const response = await axios.post(`${API}/sos`, {
+      const response = await postIdempotent(`${API}/sos`, {
         latitude: location.latitude,
         longitude: location.longitude,
         notes
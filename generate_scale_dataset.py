@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic SafeSpace dataset for capacity testing
+
+Creates users, incidents clustered around a set of cities, SOS alerts and
+forum posts with comments, shaped like production data: weighted incident
+types, statuses that depend on case age, and daytime/evening peaks in the
+timestamps. Every chunk is generated from its own seed, so the same
+arguments always produce the same documents regardless of worker count.
+
+Usage:
+    python3 generate_scale_dataset.py
+    python3 generate_scale_dataset.py --users 1000000 --incidents 5000000 --workers 8
+    python3 generate_scale_dataset.py --drop --seed 42 --db-name safespace_load
+
+All generated users share the password "loadtest123".
+
+Requirements:
+    pip install -r backend/requirements.txt
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from passlib.context import CryptContext
+from pymongo import MongoClient
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from domain import CaseStatus, IncidentType, hot_base, hot_score  # noqa: E402
+
+PASSWORD = "loadtest123"
+FIXED_CLOCK = datetime(2025, 1, 1, tzinfo=timezone.utc)  # "now" for generated timestamps unless --live-clock
+
+# (name, latitude, longitude, share of incidents)
+CITIES = [
+    ("Delhi", 28.6139, 77.2090, 0.22),
+    ("Mumbai", 19.0760, 72.8777, 0.20),
+    ("Bengaluru", 12.9716, 77.5946, 0.15),
+    ("Kolkata", 22.5726, 88.3639, 0.12),
+    ("Chennai", 13.0827, 80.2707, 0.10),
+    ("Hyderabad", 17.3850, 78.4867, 0.09),
+    ("Pune", 18.5204, 73.8567, 0.07),
+    ("Jaipur", 26.9124, 75.7873, 0.05),
+]
+CITY_WEIGHTS = [city[3] for city in CITIES]
+CLUSTER_SPREAD = 0.06  # degrees, roughly a 6-7 km standard deviation
+
+INCIDENT_WEIGHTS = {
+    IncidentType.HARASSMENT: 0.30,
+    IncidentType.STALKING: 0.18,
+    IncidentType.ONLINE_ABUSE: 0.16,
+    IncidentType.WORKPLACE_HARASSMENT: 0.12,
+    IncidentType.DOMESTIC_VIOLENCE: 0.11,
+    IncidentType.ASSAULT: 0.08,
+    IncidentType.OTHER: 0.05,
+}
+INCIDENT_TYPES = list(INCIDENT_WEIGHTS)
+INCIDENT_TYPE_WEIGHTS = list(INCIDENT_WEIGHTS.values())
+
+# Share of each hour of the day, peaking in the evening commute
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 1, 2, 4, 6, 5, 4, 4, 4, 4, 4, 5, 6, 8, 9, 9, 7, 5, 3, 2]
+
+FIRST_NAMES = ["Aisha", "Priya", "Sara", "Meera", "Ananya", "Fatima", "Riya", "Kavya", "Neha", "Zoya",
+               "Divya", "Ishita", "Nisha", "Pooja", "Sneha", "Tara", "Leela", "Maya", "Noor", "Asha"]
+LAST_NAMES = ["Sharma", "Khan", "Patel", "Iyer", "Reddy", "Das", "Singh", "Nair", "Gupta", "Mehta",
+              "Bose", "Kapoor", "Joshi", "Rao", "Verma", "Ali", "Menon", "Chopra", "Shah", "Pillai"]
+PLACES = ["bus stop", "metro station", "market", "office parking", "college gate", "park",
+          "railway platform", "shared auto", "apartment lift", "street corner"]
+DESCRIPTIONS = [
+    "A man followed me from the {place} for several minutes.",
+    "Someone kept passing comments at the {place} and would not stop.",
+    "I was touched inappropriately near the {place}.",
+    "A group blocked my way at the {place} late in the evening.",
+    "The same person has been waiting for me at the {place} every day this week.",
+    "I received threatening messages after an argument at the {place}.",
+]
+POST_TITLES = [
+    "Is the {place} near {city} safe at night?",
+    "Tips for commuting alone in {city}",
+    "Had a scary experience at the {place}",
+    "Looking for a walking group in {city}",
+    "How do I report harassment at the {place}?",
+]
+POST_BODIES = [
+    "I have to pass the {place} on my way home and it gets very dark. Any advice?",
+    "Sharing what happened so others can be careful around the {place} in {city}.",
+    "Does anyone know which helpline responds fastest in {city}?",
+    "Thank you all for the support on my last post, it really helped.",
+]
+COMMENTS = [
+    "Stay safe, and keep the SOS button ready.",
+    "Same thing happened to me, please report it.",
+    "The police station near there was helpful for me.",
+    "Try travelling with someone if you can.",
+    "Sending you strength.",
+]
+
+def user_id(seed: int, index: int) -> str:
+    """Deterministic id for user `index`, computable from any chunk without a lookup."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"safespace-load/{seed}/user/{index}"))
+
+def user_name(index: int) -> str:
+    return f"{FIRST_NAMES[index % len(FIRST_NAMES)]} {LAST_NAMES[index // len(FIRST_NAMES) % len(LAST_NAMES)]}"
+
+def random_id(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+def random_timestamp(rng: random.Random, now: datetime, days: int) -> datetime:
+    # Skewed towards recent days, with the hour drawn from the daily profile
+    day = int(days * rng.random() ** 1.5)
+    hour = rng.choices(range(24), HOUR_WEIGHTS)[0]
+    moment = (now - timedelta(days=day)).replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60), microsecond=0)
+    return moment - timedelta(days=1) if moment > now else moment
+
+def clustered_point(rng: random.Random):
+    city = rng.choices(CITIES, CITY_WEIGHTS)[0]
+    return city[0], round(rng.gauss(city[1], CLUSTER_SPREAD), 6), round(rng.gauss(city[2], CLUSTER_SPREAD), 6)
+
+def incident_status(rng: random.Random, age_days: float) -> CaseStatus:
+    # Older cases are more likely to have moved through the workflow
+    progress = 1 - math.exp(-age_days / 45)
+    roll = rng.random()
+    if roll > progress:
+        return rng.choice([CaseStatus.NEW, CaseStatus.UNDER_REVIEW])
+    if roll > progress * 0.6:
+        return CaseStatus.IN_PROGRESS
+    return rng.choice([CaseStatus.RESOLVED, CaseStatus.CLOSED])
+
+def make_users(rng, start, count, ctx):
+    docs = []
+    for index in range(start, start + count):
+        docs.append({
+            "id": user_id(ctx["seed"], index),
+            "email": f"user{index}@load.safespace.test",
+            "phone": f"+91{9000000000 + index}",
+            "name": user_name(index),
+            "password_hash": ctx["password_hash"],
+            "role": "user",
+            "emergency_contacts": [
+                {"id": random_id(rng), "name": user_name(index + 7), "phone": f"+91{8000000000 + index}", "email": None, "relationship": "friend"}
+            ] if rng.random() < 0.6 else [],
+            "totp_secret": None,
+            "totp_enabled": False,
+            "created_at": random_timestamp(rng, ctx["now"], ctx["days"]),
+        })
+    return docs
+
+def make_incidents(rng, start, count, ctx):
+    docs = []
+    for _ in range(count):
+        created_at = random_timestamp(rng, ctx["now"], ctx["days"])
+        age_days = (ctx["now"] - created_at).total_seconds() / 86400
+        status = incident_status(rng, age_days)
+        city, latitude, longitude = clustered_point(rng)
+        place = rng.choice(PLACES)
+        anonymous = rng.random() < 0.25
+        docs.append({
+            "id": random_id(rng),
+            "user_id": "anonymous" if anonymous else user_id(ctx["seed"], rng.randrange(ctx["users"])),
+            "incident_type": rng.choices(INCIDENT_TYPES, INCIDENT_TYPE_WEIGHTS)[0],
+            "description": rng.choice(DESCRIPTIONS).format(place=place),
+            "location": f"{place.title()}, {city}",
+            "latitude": latitude,
+            "longitude": longitude,
+            "is_anonymous": anonymous,
+            "evidence_files": [],
+            "status": status,
+            "created_at": created_at,
+            "updated_at": created_at if status == CaseStatus.NEW else min(ctx["now"], created_at + timedelta(hours=rng.uniform(1, age_days * 24 + 1))),
+        })
+    return docs
+
+def make_sos_alerts(rng, start, count, ctx):
+    docs = []
+    for _ in range(count):
+        timestamp = random_timestamp(rng, ctx["now"], ctx["days"])
+        _, latitude, longitude = clustered_point(rng)
+        active = (ctx["now"] - timestamp) < timedelta(hours=2) and rng.random() < 0.5
+        alert = {
+            "id": random_id(rng),
+            "user_id": user_id(ctx["seed"], rng.randrange(ctx["users"])),
+            "latitude": latitude,
+            "longitude": longitude,
+            "notes": None,
+            "timestamp": timestamp,
+            "is_active": active,
+        }
+        if not active:
+            alert["expires_at"] = timestamp + timedelta(days=30)
+        docs.append(alert)
+    return docs
+
+def make_posts(rng, start, count, ctx):
+    docs = []
+    for _ in range(count):
+        created_at = random_timestamp(rng, ctx["now"], ctx["days"])
+        author = rng.randrange(ctx["users"])
+        city = rng.choices(CITIES, CITY_WEIGHTS)[0][0]
+        place = rng.choice(PLACES)
+        comments = []
+        for _ in range(min(50, int(rng.expovariate(1 / ctx["comments"])))):
+            commenter = rng.randrange(ctx["users"])
+            comments.append({
+                "id": random_id(rng),
+                "user_id": user_id(ctx["seed"], commenter),
+                "author_name": user_name(commenter),
+                "content": rng.choice(COMMENTS),
+                "timestamp": created_at + timedelta(minutes=rng.uniform(1, 72 * 60)),
+            })
+        upvotes = int(rng.paretovariate(1.5)) - 1
+        docs.append({
+            "id": random_id(rng),
+            "user_id": user_id(ctx["seed"], author),
+            "author_name": user_name(author),
+            "title": rng.choice(POST_TITLES).format(place=place, city=city),
+            "content": rng.choice(POST_BODIES).format(place=place, city=city),
+            "upvotes": upvotes,
+            "comments": comments,
+            "created_at": created_at,
+            "hot_base": hot_base(created_at),
+            "hot_score": hot_score(upvotes, len(comments), created_at),
+        })
+    return docs
+
+GENERATORS = {
+    "users": make_users,
+    "incidents": make_incidents,
+    "sos_alerts": make_sos_alerts,
+    "forum_posts": make_posts,
+}
+
+_worker_db = None
+
+def init_worker(mongo_url: str, db_name: str):
+    global _worker_db
+    _worker_db = MongoClient(mongo_url)[db_name]
+
+def write_chunk(collection: str, chunk: int, start: int, count: int, ctx: dict) -> int:
+    rng = random.Random(f"{ctx['seed']}/{collection}/{chunk}")
+    docs = GENERATORS[collection](rng, start, count, ctx)
+    _worker_db[collection].insert_many(docs, ordered=False)
+    return len(docs)
+
+def generate(args):
+    print("=" * 60)
+    print("🏗️  SafeSpace Scale Dataset Generator")
+    print("=" * 60)
+    print()
+
+    db = MongoClient(args.mongo_url, serverSelectionTimeoutMS=5000)[args.db_name]
+    db.command("ping")
+    print(f"✅ Connected to MongoDB! (database: {args.db_name}, seed: {args.seed})")
+    if args.drop:
+        for collection in GENERATORS:
+            db.drop_collection(collection)
+        print("🗑️  Existing collections dropped.")
+    print()
+
+    ctx = {
+        "seed": args.seed,
+        "users": args.users,
+        "days": args.days,
+        "comments": args.comments,
+        # Fixed reference time so a seed reproduces the same timestamps on any day
+        "now": datetime.now(timezone.utc) if args.live_clock else FIXED_CLOCK,
+        # bcrypt is deliberately slow, so every generated user shares one hash
+        "password_hash": CryptContext(schemes=["bcrypt"], deprecated="auto").hash(PASSWORD),
+    }
+    totals = {
+        "users": args.users,
+        "incidents": args.incidents,
+        "sos_alerts": args.sos,
+        "forum_posts": args.posts,
+    }
+
+    overall = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(args.mongo_url, args.db_name)) as pool:
+        for collection, total in totals.items():
+            if not total:
+                continue
+            start = time.perf_counter()
+            futures = [
+                pool.submit(write_chunk, collection, chunk, offset, min(args.batch_size, total - offset), ctx)
+                for chunk, offset in enumerate(range(0, total, args.batch_size))
+            ]
+            written = 0
+            for future in as_completed(futures):
+                written += future.result()
+                print(f"\r  • {collection}: {written}/{total}", end="", flush=True)
+            elapsed = time.perf_counter() - start
+            print(f"\r  • {collection}: {written} documents in {elapsed:.1f}s ({written / elapsed:,.0f} docs/s)")
+
+    print()
+    print(f"✅ Done in {time.perf_counter() - overall:.1f}s. Start the backend once to build its indexes.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic SafeSpace dataset")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    # Deliberately not DB_NAME: a generator run should never land in the live database by accident
+    parser.add_argument("--db-name", default="safespace_load")
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--incidents", type=int, default=1_000_000)
+    parser.add_argument("--sos", type=int, default=500_000)
+    parser.add_argument("--posts", type=int, default=200_000)
+    parser.add_argument("--comments", type=float, default=3, help="mean comments per post")
+    parser.add_argument("--days", type=int, default=730, help="spread timestamps over this many days")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--live-clock", action="store_true", help="anchor timestamps to now instead of 2025-01-01 (not reproducible)")
+    parser.add_argument("--drop", action="store_true", help="drop the generated collections first")
+    generate(parser.parse_args())
+
+if __name__ == "__main__":
+    main()
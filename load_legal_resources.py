@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Bulk load legal resources into MongoDB for SafeSpace
+
+Reads resources with title, content and category (plus an optional key) from
+JSON, JSON Lines or CSV files, or from stdin, and upserts them by a stable
+key. Re-running with the same input changes nothing; edited entries are
+updated in place and keep their id. Resources created without a key (by
+seed_legal_resources.py or the API) are given their derived key first, so
+loading the same content again updates them instead of duplicating them.
+
+Usage:
+    python3 load_legal_resources.py resources.csv more.json
+    cat resources.jsonl | python3 load_legal_resources.py --format jsonl
+    python3 load_legal_resources.py resources.json --batch-size 2000 --concurrency 4
+
+Requirements:
+    pip install motor
+"""
+
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+REQUIRED_FIELDS = ("title", "content", "category")
+
+def resource_key(entry: dict) -> str:
+    """Explicit key if given, else a slug of category and title."""
+    if entry.get("key"):
+        return str(entry["key"]).strip()
+    return re.sub(r"[^a-z0-9]+", "-", f"{entry['category']} {entry['title']}".lower()).strip("-")
+
+def detect_format(path: str, override: str) -> str:
+    if override:
+        return override
+    suffix = os.path.splitext(path)[1].lower().lstrip(".")
+    return {"ndjson": "jsonl"}.get(suffix, suffix) if suffix in ("json", "jsonl", "ndjson", "csv") else "json"
+
+def read_entries(stream, fmt: str):
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "jsonl":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        data = json.load(stream)
+        yield from data.get("resources", []) if isinstance(data, dict) else data
+
+def iter_sources(paths, fmt):
+    if not paths or paths == ["-"]:
+        yield from read_entries(io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8"), fmt or "json")
+        return
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from read_entries(f, detect_format(path, fmt))
+
+def is_valid(entry) -> bool:
+    return isinstance(entry, dict) and all(str(entry.get(field) or "").strip() for field in REQUIRED_FIELDS)
+
+def to_update(key: str, entry: dict) -> UpdateOne:
+    # Unchanged fields make $set a no-op, so modified_count only counts real edits
+    return UpdateOne(
+        {"key": key},
+        {
+            "$set": {field: str(entry[field]).strip() for field in REQUIRED_FIELDS},
+            "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc)},
+        },
+        upsert=True,
+    )
+
+async def backfill_keys(db) -> int:
+    """Give keyless resources the key their title and category derive, so upserts match them."""
+    updates, seen = [], set()
+    async for doc in db.legal_resources.find({"key": {"$exists": False}}, {"_id": 1, "title": 1, "category": 1}):
+        if not doc.get("title") or not doc.get("category"):
+            continue
+        key = resource_key(doc)
+        # Only the first of several identical resources can own the key; the others stay as they are
+        if key in seen or await db.legal_resources.count_documents({"key": key}, limit=1):
+            continue
+        seen.add(key)
+        updates.append(UpdateOne({"_id": doc["_id"], "key": {"$exists": False}}, {"$set": {"key": key}}))
+    if updates:
+        await db.legal_resources.bulk_write(updates, ordered=False)
+    return len(updates)
+
+async def load(args):
+    print("=" * 60)
+    print("📚 SafeSpace Legal Resources Loader")
+    print("=" * 60)
+    print()
+
+    client = AsyncIOMotorClient(args.mongo_url, serverSelectionTimeoutMS=5000)
+    db = client[args.db_name]
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "invalid": 0, "duplicate": 0, "failed": 0}
+    errors = []
+    try:
+        await db.command("ping")
+        print("✅ Connected to MongoDB!")
+        await db.legal_resources.create_index(
+            "key", unique=True, partialFilterExpression={"key": {"$exists": True}}
+        )
+        backfilled = await backfill_keys(db)
+        if backfilled:
+            print(f"🔑 Added keys to {backfilled} existing resources")
+
+        pending = set()
+
+        async def write(batch):
+            try:
+                result = (await db.legal_resources.bulk_write(batch, ordered=False)).bulk_api_result
+            except BulkWriteError as exc:
+                # Unordered: the rest of the batch was still written
+                result = exc.details
+                counts["failed"] += len(result["writeErrors"])
+                errors.extend(error["errmsg"] for error in result["writeErrors"][:3])
+            except Exception as exc:
+                counts["failed"] += len(batch)
+                errors.append(str(exc))
+                return
+            counts["inserted"] += result["nUpserted"]
+            counts["updated"] += result["nModified"]
+            counts["unchanged"] += result["nMatched"] - result["nModified"]
+
+        def submit(batch):
+            task = asyncio.create_task(write(batch))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+        start = time.perf_counter()
+        batch, seen = [], set()
+        for entry in iter_sources(args.files, args.format):
+            if not is_valid(entry):
+                counts["invalid"] += 1
+                continue
+            # Two upserts of one key in flight at once would race on the unique index; first entry wins
+            key = resource_key(entry)
+            if key in seen:
+                counts["duplicate"] += 1
+                continue
+            seen.add(key)
+            batch.append(to_update(key, entry))
+            if len(batch) >= args.batch_size:
+                submit(batch)
+                batch = []
+                # Keep at most `concurrency` batches in flight so memory stays bounded
+                while len(pending) >= args.concurrency:
+                    await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        if batch:
+            submit(batch)
+        if pending:
+            await asyncio.wait(pending)
+
+        elapsed = time.perf_counter() - start
+        total = counts["inserted"] + counts["updated"] + counts["unchanged"]
+        print()
+        print(f"{'❌' if errors else '✅'} Loaded {total} resources in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f}/s)")
+        for label, count in counts.items():
+            print(f"  • {label}: {count}")
+        if errors:
+            for error in errors[:5]:
+                print(f"❌ {error}")
+            sys.exit(1)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load SafeSpace legal resources")
+    parser.add_argument("files", nargs="*", help="JSON, JSON Lines or CSV files; omit or '-' for stdin")
+    parser.add_argument("--format", choices=["json", "jsonl", "csv"], help="input format (default: by file extension)")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.environ.get("DB_NAME", "safespace_db"))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4, help="batches written in parallel")
+    asyncio.run(load(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
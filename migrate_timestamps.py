@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Convert string timestamps to native BSON dates for SafeSpace
+
+Older versions of the backend stored created_at, updated_at and timestamp
+fields as ISO strings. This streams every affected collection, rewrites the
+strings as dates in batched bulk writes and records a checkpoint after each
+batch, so an interrupted run picks up where it stopped.
+
+Usage:
+    python3 migrate_timestamps.py
+    python3 migrate_timestamps.py --batch-size 2000 --collections incidents forum_posts
+    python3 migrate_timestamps.py --restart
+
+Requirements:
+    pip install motor
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+MIGRATION_ID = "timestamps_to_dates"
+
+# Dotted paths go through an array of subdocuments (e.g. every comment's timestamp)
+TIMESTAMP_FIELDS = {
+    "users": ["created_at"],
+    "sos_alerts": ["timestamp"],
+    "incidents": ["created_at", "updated_at", "evidence_files.uploaded_at", "evidence_meta.processed_at"],
+    "incidents_archive": ["created_at", "updated_at", "archived_at", "evidence_files.uploaded_at", "evidence_meta.processed_at"],
+    "forum_posts": ["created_at", "comments.timestamp"],
+    "legal_resources": ["created_at"],
+    "moderation_queue": ["created_at", "resolved_at"],
+}
+
+def parse(value):
+    """Return the value as an aware UTC datetime, or None if it is not an ISO string."""
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed.astimezone(timezone.utc)
+
+def convert(doc, fields):
+    """Build the $set for one document; array fields are rewritten whole."""
+    changes = {}
+    for field in fields:
+        top, _, nested = field.partition(".")
+        if not nested:
+            parsed = parse(doc.get(top))
+            if parsed:
+                changes[top] = parsed
+            continue
+
+        items = changes.get(top, doc.get(top))
+        if not isinstance(items, list):
+            continue
+        converted, changed = [], False
+        for item in items:
+            parsed = parse(item.get(nested)) if isinstance(item, dict) else None
+            if parsed:
+                item = {**item, nested: parsed}
+                changed = True
+            converted.append(item)
+        if changed:
+            changes[top] = converted
+    return changes
+
+async def migrate_collection(db, name, fields, batch_size, dry_run, checkpoint):
+    query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    if checkpoint.get(name) is not None:
+        query["_id"] = {"$gt": checkpoint[name]}
+    projection = {field.split(".")[0]: 1 for field in fields}
+
+    scanned = updated = 0
+    start = time.perf_counter()
+    batch, last_id = [], None
+
+    async def flush():
+        nonlocal updated, batch
+        if batch and not dry_run:
+            result = await db[name].bulk_write(batch, ordered=False)
+            updated += result.modified_count
+            await db.migrations.update_one(
+                {"_id": MIGRATION_ID}, {"$set": {f"checkpoints.{name}": last_id}}, upsert=True
+            )
+        elif dry_run:
+            updated += len(batch)
+        batch = []
+
+    cursor = db[name].find(query, projection).sort("_id", 1).batch_size(batch_size)
+    async for doc in cursor:
+        scanned += 1
+        last_id = doc["_id"]
+        changes = convert(doc, fields)
+        if changes:
+            batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": changes}))
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+
+    elapsed = time.perf_counter() - start
+    rate = scanned / elapsed if elapsed else 0
+    print(f"  • {name}: {scanned} scanned, {updated} converted in {elapsed:.1f}s ({rate:,.0f} docs/s)")
+    return scanned, updated
+
+async def migrate(args):
+    print("=" * 60)
+    print("🕒 SafeSpace Timestamp Migration")
+    print("=" * 60)
+    print()
+
+    client = AsyncIOMotorClient(args.mongo_url, serverSelectionTimeoutMS=5000)
+    db = client[args.db_name]
+    try:
+        await db.command("ping")
+        print("✅ Connected to MongoDB!")
+
+        if args.restart and not args.dry_run:
+            await db.migrations.delete_one({"_id": MIGRATION_ID})
+        state = await db.migrations.find_one({"_id": MIGRATION_ID}) or {}
+        checkpoint = state.get("checkpoints", {})
+        if checkpoint:
+            print(f"↩️  Resuming from checkpoint ({', '.join(checkpoint)})")
+        if args.dry_run:
+            print("🧪 Dry run: nothing will be written")
+        print()
+
+        collections = args.collections or list(TIMESTAMP_FIELDS)
+        total_scanned = total_updated = 0
+        start = time.perf_counter()
+        for name in collections:
+            scanned, updated = await migrate_collection(
+                db, name, TIMESTAMP_FIELDS[name], args.batch_size, args.dry_run, checkpoint
+            )
+            total_scanned += scanned
+            total_updated += updated
+
+        elapsed = time.perf_counter() - start
+        print()
+        print(f"✅ Done: {total_scanned} scanned, {total_updated} converted in {elapsed:.1f}s "
+              f"({total_scanned / elapsed if elapsed else 0:,.0f} docs/s)")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    finally:
+        client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert SafeSpace string timestamps to BSON dates")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.environ.get("DB_NAME", "safespace_db"))
+    parser.add_argument("--collections", nargs="+", choices=list(TIMESTAMP_FIELDS))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true", help="ignore any saved checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="count what would change without writing")
+    asyncio.run(migrate(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
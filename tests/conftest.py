@@ -0,0 +1,7 @@
+import os
+import sys
+from pathlib import Path
+
+# server.py reads its configuration at import; no database is contacted until a query runs
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
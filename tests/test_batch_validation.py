@@ -0,0 +1,37 @@
+import pytest
+from pydantic import ValidationError
+
+from server import BatchAddEmergencyContact, BatchCreateIncident, BatchDeactivateSOS, BatchOperation, BatchRequest
+
+INCIDENT = {"incident_type": "harassment", "description": "Followed home", "location": "Station road"}
+CONTACT = {"name": "Asha", "phone": "+91 98765 43210", "relationship": "sister"}
+
+@pytest.mark.parametrize("raw,expected", [
+    ({"op": "create_incident", "data": INCIDENT}, BatchCreateIncident),
+    ({"op": "add_emergency_contact", "data": CONTACT}, BatchAddEmergencyContact),
+    ({"op": "deactivate_sos", "alert_id": "a1"}, BatchDeactivateSOS),
+])
+def test_operations_dispatch_on_op(raw, expected):
+    assert isinstance(BatchOperation.validate_python(raw), expected)
+
+@pytest.mark.parametrize("raw", [
+    {"op": "delete_account"},
+    {"data": INCIDENT},
+    {"op": "create_incident", "data": {**INCIDENT, "incident_type": "unknown"}},
+    {"op": "create_incident", "data": {"description": "missing type and location"}},
+    {"op": "add_emergency_contact", "data": {**CONTACT, "email": "not-an-email"}},
+    {"op": "deactivate_sos"},
+])
+def test_invalid_operations_are_rejected(raw):
+    with pytest.raises(ValidationError):
+        BatchOperation.validate_python(raw)
+
+def test_bad_entries_do_not_reject_the_batch():
+    # Entries are validated one by one in run_batch, so the envelope accepts any objects
+    batch = BatchRequest(operations=[{"op": "create_incident", "data": INCIDENT}, {"op": "delete_account"}])
+    assert len(batch.operations) == 2
+
+@pytest.mark.parametrize("count", [0, 101])
+def test_batch_size_is_bounded(count):
+    with pytest.raises(ValidationError):
+        BatchRequest(operations=[{"op": "deactivate_sos", "alert_id": str(i)} for i in range(count)])
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+import server
+from server import MAX_EMERGENCY_CONTACTS, EmergencyContact, EmergencyContactList, contact_document, contacts_room_for
+
+CONTACT = {"name": "Asha", "phone": "+91 98765 43210", "relationship": "sister"}
+
+def has_room(existing: int, adding: int) -> bool:
+    """Evaluate the contacts_room_for filter the way Mongo does: index N missing means at most N elements."""
+    (field, condition), = contacts_room_for(adding).items()
+    assert condition == {"$exists": False}
+    return existing <= int(field.split(".")[1])
+
+@pytest.mark.parametrize("existing,adding", [
+    (0, 1), (0, MAX_EMERGENCY_CONTACTS), (MAX_EMERGENCY_CONTACTS - 1, 1), (MAX_EMERGENCY_CONTACTS, 1),
+    (MAX_EMERGENCY_CONTACTS - 2, 3), (3, 2),
+])
+def test_room_filter_enforces_the_cap(existing, adding):
+    assert has_room(existing, adding) == (existing + adding <= MAX_EMERGENCY_CONTACTS)
+
+def test_oversized_push_is_refused_without_a_write(monkeypatch):
+    class NoDatabase:
+        def __getattr__(self, name):
+            raise AssertionError("push_emergency_contacts should not reach the database")
+    monkeypatch.setattr(server, "db", NoDatabase())
+    contacts = [contact_document(EmergencyContact(**CONTACT)) for _ in range(MAX_EMERGENCY_CONTACTS + 1)]
+    assert asyncio.run(server.push_emergency_contacts("u1", contacts)) is False
+
+def test_replacement_list_is_capped():
+    EmergencyContactList(contacts=[CONTACT] * MAX_EMERGENCY_CONTACTS)
+    with pytest.raises(ValidationError):
+        EmergencyContactList(contacts=[CONTACT] * (MAX_EMERGENCY_CONTACTS + 1))
+
+def test_contact_documents_get_unique_ids():
+    first, second = (contact_document(EmergencyContact(**CONTACT)) for _ in range(2))
+    assert first["id"] != second["id"]
+    assert {key: first[key] for key in CONTACT} == CONTACT
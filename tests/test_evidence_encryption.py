@@ -0,0 +1,169 @@
+import base64
+import os
+
+import pytest
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from fastapi import HTTPException
+
+import server
+from server import (
+    EVIDENCE_CHUNK_SIZE, EVIDENCE_HEADER, EVIDENCE_TAG_SIZE,
+    EvidenceIntegrityError, EvidenceReader, EvidenceWriter, iter_evidence, parse_range,
+)
+
+CHUNK = EVIDENCE_CHUNK_SIZE
+
+@pytest.fixture
+def master_key(monkeypatch):
+    key = os.urandom(32)
+    key_id = server.master_key_id(key)
+    monkeypatch.setattr(server, "evidence_master_keys", {key_id: AESGCM(key)})
+    monkeypatch.setattr(server, "evidence_key_id", key_id)
+    return key
+
+def write_evidence(path, data: bytes, pieces: int = 3):
+    # Several uneven writes, as the upload paths produce
+    step = max(1, len(data) // pieces)
+    with EvidenceWriter(path) as out:
+        for offset in range(0, len(data), step):
+            out.write(data[offset:offset + step])
+        if not data:
+            out.write(b"")
+
+def read_all(path) -> bytes:
+    with EvidenceReader(path) as reader:
+        return reader.read()
+
+@pytest.mark.parametrize("size", [0, 1, CHUNK - 1, CHUNK, CHUNK + 1, 2 * CHUNK, 2 * CHUNK + 5])
+def test_round_trip_at_chunk_boundaries(tmp_path, master_key, size):
+    data = os.urandom(size)
+    path = tmp_path / "evidence.bin"
+    write_evidence(path, data)
+    
+    chunks = max(1, -(-size // CHUNK))
+    assert path.stat().st_size == EVIDENCE_HEADER.size + size + chunks * EVIDENCE_TAG_SIZE
+    with EvidenceReader(path) as reader:
+        assert reader.encrypted
+        assert reader.size == size
+        assert reader.read() == data
+
+def test_plaintext_is_not_on_disk(tmp_path, master_key):
+    data = b"GPS 28.6139,77.2090 " * 1000
+    path = tmp_path / "evidence.bin"
+    write_evidence(path, data)
+    assert b"GPS 28.6139" not in path.read_bytes()
+
+@pytest.mark.parametrize("start,end", [(0, 0), (CHUNK - 10, CHUNK + 9), (5, 2 * CHUNK + 3), (2 * CHUNK, 2 * CHUNK + 99)])
+def test_ranged_reads_span_chunks(tmp_path, master_key, start, end):
+    data = os.urandom(2 * CHUNK + 100)
+    path = tmp_path / "evidence.bin"
+    write_evidence(path, data)
+    
+    assert b"".join(iter_evidence(path, start, end)) == data[start:end + 1]
+    with EvidenceReader(path) as reader:
+        reader.seek(start)
+        assert reader.read(end - start + 1) == data[start:end + 1]
+        reader.seek(-3, os.SEEK_END)
+        assert reader.read() == data[-3:]
+
+def test_truncated_at_chunk_boundary_is_rejected(tmp_path, master_key):
+    path = tmp_path / "evidence.bin"
+    write_evidence(path, os.urandom(2 * CHUNK + 100))
+    # Drop the whole last chunk: the remaining chunks all authenticate, but the new last one was not sealed as last
+    with open(path, "r+b") as f:
+        f.truncate(EVIDENCE_HEADER.size + 2 * (CHUNK + EVIDENCE_TAG_SIZE))
+    with pytest.raises(EvidenceIntegrityError):
+        read_all(path)
+
+def test_truncated_mid_chunk_is_rejected(tmp_path, master_key):
+    path = tmp_path / "evidence.bin"
+    write_evidence(path, os.urandom(CHUNK + 100))
+    with open(path, "r+b") as f:
+        f.truncate(path.stat().st_size - 7)
+    with pytest.raises(EvidenceIntegrityError):
+        read_all(path)
+
+def test_tampered_chunk_is_rejected(tmp_path, master_key):
+    data = os.urandom(2 * CHUNK)
+    path = tmp_path / "evidence.bin"
+    write_evidence(path, data)
+    position = EVIDENCE_HEADER.size + CHUNK + EVIDENCE_TAG_SIZE + 1234  # inside the second chunk
+    with open(path, "r+b") as f:
+        f.seek(position)
+        byte = f.read(1)
+        f.seek(position)
+        f.write(bytes([byte[0] ^ 1]))
+    
+    with EvidenceReader(path) as reader:
+        assert reader.read(CHUNK) == data[:CHUNK]  # the first chunk is intact
+        with pytest.raises(EvidenceIntegrityError):
+            reader.read()
+
+def test_renamed_file_is_rejected(tmp_path, master_key):
+    path = tmp_path / "a.bin"
+    write_evidence(path, b"statement")
+    path.rename(tmp_path / "b.bin")
+    with pytest.raises(EvidenceIntegrityError):
+        EvidenceReader(tmp_path / "b.bin")
+    # Files written under a temporary name carry their final name as context
+    with EvidenceWriter(tmp_path / "c.tmp", context="c.bin") as out:
+        out.write(b"statement")
+    (tmp_path / "c.tmp").rename(tmp_path / "c.bin")
+    assert read_all(tmp_path / "c.bin") == b"statement"
+
+def test_unknown_master_key_is_rejected(tmp_path, master_key, monkeypatch):
+    path = tmp_path / "evidence.bin"
+    write_evidence(path, b"statement")
+    monkeypatch.setattr(server, "evidence_master_keys", {})
+    with pytest.raises(EvidenceIntegrityError):
+        EvidenceReader(path)
+
+def test_rotated_key_still_reads(tmp_path, master_key, monkeypatch):
+    path = tmp_path / "evidence.bin"
+    write_evidence(path, b"statement")
+    new_key = os.urandom(32)
+    old_keys = dict(server.evidence_master_keys)
+    monkeypatch.setattr(server, "evidence_master_keys", {**old_keys, server.master_key_id(new_key): AESGCM(new_key)})
+    monkeypatch.setattr(server, "evidence_key_id", server.master_key_id(new_key))
+    assert read_all(path) == b"statement"
+
+def test_legacy_plaintext_files_are_read_as_is(tmp_path, master_key):
+    data = os.urandom(CHUNK + 10)
+    path = tmp_path / "legacy.jpg"
+    path.write_bytes(data)
+    with EvidenceReader(path) as reader:
+        assert not reader.encrypted
+        assert reader.size == len(data)
+        assert reader.read() == data
+        reader.seek(CHUNK)
+        assert reader.read() == data[CHUNK:]
+    assert b"".join(iter_evidence(path, 3, 9)) == data[3:10]
+
+def test_without_master_key_files_stay_plaintext(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "evidence_key_id", None)
+    path = tmp_path / "evidence.bin"
+    write_evidence(path, b"statement")
+    assert path.read_bytes() == b"statement"
+    assert read_all(path) == b"statement"
+
+def test_master_keys_must_be_32_bytes(monkeypatch):
+    monkeypatch.setattr(server, "EVIDENCE_MASTER_KEY", base64.b64encode(os.urandom(16)).decode())
+    with pytest.raises(RuntimeError):
+        server.load_master_keys()
+
+@pytest.mark.parametrize("header,expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=500-400", "bytes=0-1,5-9", "items=0-1", "bytes=-"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(HTTPException) as exc:
+        parse_range(header, 1000)
+    assert exc.value.status_code == 416
+    assert exc.value.headers["Content-Range"] == "bytes */1000"
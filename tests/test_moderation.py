@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from server import AhoCorasick, ModerationEngine, find_emails, find_phone_numbers
+
+def test_finds_overlapping_and_nested_terms():
+    automaton = AhoCorasick({"he": "a", "she": "a", "his": "b", "hers": "b"})
+    found = sorted((start, end, term) for start, end, term, _ in automaton.search("ushers"))
+    assert found == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+
+def test_failure_links_recover_after_a_partial_match():
+    automaton = AhoCorasick({"abcd": "x", "bce": "y"})
+    assert [(term, start) for start, _, term, _ in automaton.search("abce")] == [("bce", 1)]
+
+def test_empty_automaton_finds_nothing():
+    assert list(AhoCorasick({}).search("anything at all")) == []
+
+@pytest.fixture
+def engine(tmp_path):
+    path = tmp_path / "terms.json"
+    path.write_text(json.dumps({
+        "categories": {
+            "doxxing": {"severity": 3, "terms": ["lives at", "Home Address"]},
+            "victim_blaming": {"severity": 2, "terms": ["asked for it"]},
+            "slur": {"severity": 2, "terms": ["rat"]},
+        },
+        "detect_phone_numbers": True,
+        "detect_emails": True,
+    }))
+    engine = ModerationEngine(path)
+    engine.reload()
+    return engine
+
+def test_scan_matches_terms_case_insensitively(engine):
+    matches = engine.scan("He LIVES AT the corner; post her home address")
+    assert [(m["category"], m["term"]) for m in matches] == [("doxxing", "lives at"), ("doxxing", "home address")]
+    assert engine.priority(matches) == 3
+
+def test_scan_matches_whole_words_only(engine):
+    assert engine.scan("The pirate ratified it") == []
+    assert [m["term"] for m in engine.scan("what a rat.")] == ["rat"]
+
+def test_scan_flags_contact_details(engine):
+    matches = engine.scan("Call me on +1 (555) 123-4567 or mail jane.doe@example.com")
+    assert [(m["category"], m["term"]) for m in matches] == [
+        ("phone_number", "+1 (555) 123-4567"), ("email", "jane.doe@example.com")
+    ]
+
+def test_clean_text_has_no_matches(engine):
+    assert engine.scan("Stay safe, everyone. The helpline was very supportive.") == []
+    assert engine.priority([]) == 0
+
+@pytest.mark.parametrize("text,expected", [
+    ("call +44 20 7946 0958 now", ["+44 20 7946 0958"]),
+    ("1-800-555-0199", ["1-800-555-0199"]),
+    ("order 12345", []),
+    ("card 1234 5678 9012 3456 7890", []),  # more than 15 digits
+    ("12/03/2024 10:30 at the park", []),
+    ("on 2024-03-12 1030", []),
+    ("met on 3/4/24 at 1830", []),
+    ("12.03.2024 5551234567", ["5551234567"]),
+])
+def test_phone_numbers(text, expected):
+    assert [text[start:end] for start, end in find_phone_numbers(text)] == expected
+
+@pytest.mark.parametrize("text,expected", [
+    ("write to a.b+tag@mail.example.org.", ["a.b+tag@mail.example.org"]),
+    ("@mention and user@localhost", []),
+    ("two: x@y.io, z@w.co", ["x@y.io", "z@w.co"]),
+])
+def test_emails(text, expected):
+    assert [text[start:end] for start, end in find_emails(text)] == expected
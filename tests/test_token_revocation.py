@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import operator
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import jwt
+import pytest
+
+import server
+from server import JWT_ALGORITHM, JWT_SECRET, BloomFilter, TokenRevocations, create_access_token, decode_access_token
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    keys = [uuid.uuid4().hex for _ in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+
+def test_bloom_filter_false_positive_rate_is_near_the_configured_rate():
+    bloom = BloomFilter(10000, 0.01)
+    for _ in range(10000):
+        bloom.add(uuid.uuid4().hex)
+    false_positives = sum(uuid.uuid4().hex in bloom for _ in range(20000))
+    assert false_positives / 20000 < 0.02
+
+def test_access_tokens_carry_revocation_claims():
+    claims = decode_access_token(create_access_token("u1", "user"))
+    assert claims["user_id"] == "u1" and claims["role"] == "user"
+    assert len(claims["jti"]) == 32
+    assert claims["expires_at"] - claims["issued_at"] == pytest.approx(server.JWT_EXPIRATION * 3600, abs=1)
+
+def test_legacy_tokens_are_identified_by_their_hash():
+    expires = datetime.now(timezone.utc) + timedelta(hours=1)
+    token = jwt.encode({"sub": "u1", "role": "user", "exp": expires}, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    claims = decode_access_token(token)
+    assert claims["jti"] == hashlib.sha256(token.encode()).hexdigest()[:32]
+    assert claims["issued_at"] == int(expires.timestamp()) - server.JWT_EXPIRATION * 3600
+
+OPERATORS = {"$in": lambda value, options: value in options, "$gt": operator.gt, "$gte": operator.ge}
+
+class FakeRevokedTokens:
+    """The slice of a Motor collection that TokenRevocations uses, shared by every fake worker."""
+
+    def __init__(self):
+        self.docs = {}
+        self.finds = 0
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self.docs.get(query["id"])
+        if doc is None:
+            doc = self.docs[query["id"]] = {**query, **update.get("$setOnInsert", {})}
+        doc.update(update.get("$set", {}))
+
+    async def find(self, query, projection):
+        self.finds += 1
+        for doc in list(self.docs.values()):
+            if all(OPERATORS[op](doc.get(field), value)
+                   for field, condition in query.items() for op, value in condition.items()):
+                yield {key: doc[key] for key in projection if key in doc}
+
+@pytest.fixture
+def workers(monkeypatch):
+    # Without change streams, events emitted on one worker never reach the other
+    monkeypatch.setattr(server, "event_bus", SimpleNamespace(emit=lambda *args, **kwargs: None))
+    database = SimpleNamespace(revoked_tokens=FakeRevokedTokens())
+    return TokenRevocations(database), TokenRevocations(database)
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_clean_tokens_skip_the_database_once_the_filter_is_built(workers):
+    worker, _ = workers
+    run(worker.rebuild())
+    finds = worker.db.revoked_tokens.finds
+    assert not run(worker.is_revoked(decode_access_token(create_access_token("u1", "user"))))
+    assert worker.db.revoked_tokens.finds == finds
+
+def test_revocation_on_another_worker_is_seen_after_a_poll(workers):
+    worker_a, worker_b = workers
+    run(worker_a.rebuild())
+    run(worker_b.rebuild())
+    claims = decode_access_token(create_access_token("u1", "user"))
+    run(worker_a.revoke(claims))
+    assert run(worker_a.is_revoked(claims))
+    assert not run(worker_b.is_revoked(claims))
+    run(worker_b.poll())
+    assert run(worker_b.is_revoked(claims))
+
+def test_revoke_all_on_another_worker_is_seen_after_a_poll(workers):
+    worker_a, worker_b = workers
+    run(worker_b.rebuild())
+    before = decode_access_token(create_access_token("u1", "user"))
+    run(worker_a.revoke_user("u1"))
+    run(worker_b.poll())
+    assert run(worker_b.is_revoked(before))
+    assert not run(worker_b.is_revoked(decode_access_token(create_access_token("u1", "user"))))
+
+def test_unbuilt_filter_checks_the_database(workers):
+    worker_a, worker_b = workers
+    claims = decode_access_token(create_access_token("u1", "user"))
+    run(worker_a.revoke(claims))
+    run(worker_b.poll())
+    assert worker_b.bloom is None
+    assert run(worker_b.is_revoked(claims))